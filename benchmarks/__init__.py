@@ -0,0 +1,6 @@
+"""
+Benchmarks for xvalidator. Run from the repository root, e.g.
+
+    python -m benchmarks.run --registers 200 --output results.json
+
+"""
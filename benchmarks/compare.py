@@ -0,0 +1,218 @@
+"""
+Performance regression gate.
+
+Compares benchmark results against a baseline written by benchmarks.run
+and exits with status 1 if a stage got slower, or used more memory, than
+the thresholds allow. Timings are divided by the calibration time measured
+next to each stage, so a slower or busier machine does not count as a
+regression by itself.
+
+    python -m benchmarks.compare                      # run now, compare
+    python -m benchmarks.compare --current new.json   # compare a saved run
+    python -m benchmarks.compare --update             # write a new baseline
+
+Without --current the benchmarks are run with the options stored in the
+baseline, and stages which fail are run again up to --retries times to
+tell regressions from noise. Only the standard library is needed.
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+from collections import OrderedDict
+import json
+import logging
+import os
+import sys
+
+from benchmarks import run as bench
+
+
+__author__ = 'bernd'
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+
+
+def load(file_name):
+    with open(file_name) as input_file:
+        return json.load(input_file, object_pairs_hook=OrderedDict)
+
+
+def save(results, file_name):
+    with open(file_name, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+
+
+def run_like(baseline, repeat=None, memory=True, stages=None):
+    """
+    Runs stages, by default all stages of baseline and those it has no
+    results for yet, with the options baseline was run with.
+    """
+    meta = baseline['meta']
+    argv = ['--keys', str(meta['keys']),
+            '--repeat', str(repeat or meta['repeat'])]
+    for name, value in meta['shape'].items():
+        argv.extend(['--%s' % name.replace('_', '-'), str(value)])
+    if stages is None:
+        stages = list(baseline['stages']) + [stage.name for stage in bench.STAGES
+                                             if stage.name not in baseline['stages']]
+    for name in stages:
+        argv.extend(['--stage', name])
+    if not memory:
+        argv.append('--no-memory')
+    options = bench.argument_parser().parse_args(argv)
+    logging.disable(logging.WARNING)
+    return bench.run(options)
+
+
+class StageComparison(object):
+    """
+    missing is 'baseline' or 'current' for a stage only one of the results
+    has; it is reported but does not fail.
+    """
+
+    def __init__(self, name, time_ratio, memory_ratio, time_limit, memory_limit,
+                 missing=None):
+        self.name = name
+        self.missing = missing
+        self.time_ratio = time_ratio
+        self.memory_ratio = memory_ratio
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+
+    @property
+    def slower(self):
+        return self.time_ratio is not None and self.time_ratio > self.time_limit
+
+    @property
+    def larger(self):
+        return self.memory_ratio is not None and self.memory_ratio > self.memory_limit
+
+    @property
+    def failed(self):
+        return self.slower or self.larger
+
+    def __str__(self):
+        def ratio(value):
+            return '     -' if value is None else '%6.2f' % value
+
+        status = []
+        if self.missing == 'baseline':
+            status.append('NO BASELINE, run --update')
+        elif self.missing == 'current':
+            status.append('NOT RUN')
+        if self.slower:
+            status.append('SLOWER')
+        if self.larger:
+            status.append('MORE MEMORY')
+        return '%-16s time %s (limit %.2f)  memory %s (limit %.2f)  %s' % (
+            self.name, ratio(self.time_ratio), self.time_limit,
+            ratio(self.memory_ratio), self.memory_limit,
+            ', '.join(status) or 'ok')
+
+
+def normalized(results, stage):
+    result = results['stages'][stage]
+    return result['best'] / result['calibration']
+
+
+def compare(baseline, current, threshold=0.5, memory_threshold=0.25,
+            stage_thresholds=None):
+    """
+    Returns a StageComparison for every stage in either result. A ratio of
+    1.0 means unchanged; a stage fails if its ratio exceeds
+    1 + threshold. stage_thresholds overrides threshold per stage name.
+    Stages only one of the results has are returned without ratios.
+    """
+    stage_thresholds = stage_thresholds or {}
+    memory_limit = 1 + memory_threshold
+    result = []
+    for name in baseline['stages']:
+        time_limit = 1 + stage_thresholds.get(name, threshold)
+        if name not in current['stages']:
+            result.append(StageComparison(name, None, None, time_limit, memory_limit,
+                                          'current'))
+            continue
+        base = baseline['stages'][name]
+        new = current['stages'][name]
+        time_ratio = None
+        if base['best']:
+            time_ratio = normalized(current, name) / normalized(baseline, name)
+        memory_ratio = None
+        if base.get('peak_bytes') and new.get('peak_bytes') is not None:
+            memory_ratio = float(new['peak_bytes']) / base['peak_bytes']
+        result.append(StageComparison(name, time_ratio, memory_ratio, time_limit,
+                                      memory_limit))
+    for name in current['stages']:
+        if name not in baseline['stages']:
+            result.append(StageComparison(
+                name, None, None, 1 + stage_thresholds.get(name, threshold),
+                memory_limit, 'baseline'))
+    return result
+
+
+def stage_threshold(text):
+    name, _, value = text.partition('=')
+    return name, float(value)
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--current', help='results of benchmarks.run --output; '
+                                          'the benchmarks are run if omitted')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='allowed relative slowdown, default 0.5')
+    parser.add_argument('--memory-threshold', type=float, default=0.25,
+                        help='allowed relative growth of peak memory')
+    parser.add_argument('--stage-threshold', type=stage_threshold, action='append',
+                        default=[], metavar='STAGE=VALUE',
+                        help='allowed slowdown for one stage')
+    parser.add_argument('--repeat', type=int, help='override the repeat count')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='runs of a failing stage before it counts')
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--update', action='store_true',
+                        help='write the current results as the new baseline')
+    return parser
+
+
+def main(argv=None):
+    options = argument_parser().parse_args(argv)
+    if options.update and not os.path.exists(options.baseline):
+        parser = bench.argument_parser()
+        current = bench.run(parser.parse_args(['--repeat', str(options.repeat or 5)]))
+        save(current, options.baseline)
+        print('Wrote baseline %s' % options.baseline)
+        return 0
+    baseline = load(options.baseline)
+    if options.current:
+        current = load(options.current)
+    else:
+        current = run_like(baseline, options.repeat, not options.no_memory)
+    if options.update:
+        save(current, options.baseline)
+        print('Wrote baseline %s' % options.baseline)
+        return 0
+    thresholds = (options.threshold, options.memory_threshold,
+                  dict(options.stage_threshold))
+    comparisons = compare(baseline, current, *thresholds)
+    for retry in range(0 if options.current else options.retries):
+        failed = [comparison.name for comparison in comparisons if comparison.failed]
+        if not failed:
+            break
+        retried = run_like(baseline, options.repeat, not options.no_memory, failed)
+        for name, result in retried['stages'].items():
+            if normalized(retried, name) < normalized(current, name):
+                current['stages'][name] = result
+        comparisons = compare(baseline, current, *thresholds)
+    for comparison in comparisons:
+        print(comparison)
+    failed = [comparison.name for comparison in comparisons if comparison.failed]
+    if failed:
+        print('Performance regression in: %s' % ', '.join(failed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
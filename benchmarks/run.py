@@ -0,0 +1,344 @@
+"""
+Times the stages of processing a synthetic document:
+
+create_document  xml dict -> Document
+element_schema   ElementSchema.to_python on every leaf element
+sequence_schema  SequenceSchema.to_python of the whole tree with Stores
+match_refs       matching the references collected by sequence_schema
+to_dict          Document.to_dict of the validated document
+key_store        KeyStore.add_values and match_ref with --keys keys
+sqlite_store     the same for SqliteKeyStore
+build_schema     building a schema with schemas of their own for every
+                 register and field, the size counts schemas and validators
+
+Every stage is run --repeat times on fresh input with the garbage
+collector disabled; the best run is reported together with operations per
+second and the cost per node (or key). Peak memory is measured in one
+extra run under tracemalloc where available. Results are written as JSON
+to --output so runs can be compared, see benchmarks.compare.
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+from collections import OrderedDict
+import datetime
+import gc
+import json
+import logging
+import platform
+import sys
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from xvalidator import Stores, SchemaProfiler, create_document
+from xvalidator.constraints import KeyStore, match_refs
+from xvalidator.sqlstores import SqliteStores
+
+from benchmarks.synthetic import component_schema, generate_xml_dict, \
+    iter_elements, count_nodes, build_schema, count_schema_nodes, LEAF_SCHEMAS
+
+
+__author__ = 'bernd'
+
+
+class Stage(object):
+    """
+    setup() returns the argument of run(), which is the timed part. size is
+    the number of nodes or keys one run processes.
+    """
+    name = ''
+
+    def __init__(self, options):
+        self.options = options
+        self.size = 1
+
+    def setup(self):
+        return None
+
+    def run(self, arg):
+        raise NotImplementedError
+
+
+class CreateDocument(Stage):
+    name = 'create_document'
+
+    def __init__(self, options):
+        super(CreateDocument, self).__init__(options)
+        self.xml_dict = generate_xml_dict(**shape(options))
+        self.size = count_nodes(create_document('synthetic', self.xml_dict).root_element)
+
+    def setup(self):
+        return self.xml_dict
+
+    def run(self, xml_dict):
+        create_document('synthetic', xml_dict)
+
+
+class ElementSchemaStage(CreateDocument):
+    name = 'element_schema'
+
+    def setup(self):
+        document = create_document('synthetic', self.xml_dict)
+        leaves = [(LEAF_SCHEMAS[element.tag], element)
+                  for element in iter_elements(document.root_element)
+                  if element.tag in LEAF_SCHEMAS]
+        self.size = len(leaves)
+        return leaves
+
+    def run(self, leaves):
+        stores = Stores()
+        for schema, element in leaves:
+            schema.to_python(element, stores=stores)
+
+
+class SequenceSchemaStage(CreateDocument):
+    name = 'sequence_schema'
+
+    def setup(self):
+        return create_document('synthetic', self.xml_dict).root_element
+
+    def run(self, root):
+        component_schema.validator.to_python(root.value, path=root.path,
+                                              stores=Stores())
+
+
+class MatchRefs(CreateDocument):
+    name = 'match_refs'
+
+    def setup(self):
+        root = create_document('synthetic', self.xml_dict).root_element
+        stores = Stores()
+        component_schema.to_python(root, stores=stores)
+        self.size = len(stores.refStore.refs) + len(stores.idrefStore.refs)
+        return stores
+
+    def run(self, stores):
+        match_refs(stores)
+
+
+class ToDict(CreateDocument):
+    name = 'to_dict'
+
+    def setup(self):
+        document = create_document('synthetic', self.xml_dict)
+        component_schema.to_python(document.root_element, stores=Stores())
+        return document
+
+    def run(self, document):
+        document.to_dict
+
+
+class KeyStoreStage(Stage):
+    name = 'key_store'
+
+    def __init__(self, options):
+        super(KeyStoreStage, self).__init__(options)
+        self.size = options.keys
+
+    def new_store(self):
+        return KeyStore()
+
+    def setup(self):
+        store = self.new_store()
+        store.add_key('key', '/')
+        return store
+
+    def run(self, store):
+        batch = 100000
+        for start in range(0, self.size, batch):
+            store.add_values('key', '/', (('key%d' % index, '/key-%d,' % index)
+                                          for index in range(start, min(start + batch,
+                                                                        self.size))))
+        for index in range(0, self.size, max(1, self.size // 1000)):
+            store.match_ref('key', 'key%d' % index)
+
+
+class SqliteStoreStage(KeyStoreStage):
+    name = 'sqlite_store'
+
+    def new_store(self):
+        return SqliteStores().keyStore
+
+
+class BuildSchema(Stage):
+    name = 'build_schema'
+
+    def __init__(self, options):
+        super(BuildSchema, self).__init__(options)
+        self.size = count_schema_nodes(self.run(None))
+
+    def run(self, arg):
+        options = self.options
+        return build_schema(options.maps, options.registers, options.fields)
+
+
+STAGES = [CreateDocument, ElementSchemaStage, SequenceSchemaStage, MatchRefs,
+          ToDict, KeyStoreStage, SqliteStoreStage, BuildSchema]
+
+
+def shape(options):
+    return dict(maps=options.maps, registers=options.registers,
+                fields=options.fields, values=options.values,
+                description_length=options.description_length,
+                refs=options.refs)
+
+
+def calibrate(repeat=40, loops=50000):
+    """
+    Times a fixed pure Python workload of dict and string operations, like
+    the ones validation spends its time on. Dividing stage timings by it
+    makes results of different machines, or of one machine under different
+    load, comparable. Many short runs give a steadier minimum than a few
+    long ones.
+    """
+    timings = []
+    for index in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = default_timer()
+            counts = {}
+            for value in range(loops):
+                key = 'key%d' % (value & 1023)
+                counts[key] = counts.get(key, 0) + len(key.split('y'))
+            timings.append(default_timer() - start)
+        finally:
+            gc.enable()
+    return min(timings)
+
+
+def time_stage(stage, repeat):
+    """
+    Returns the timings of repeat runs and the calibration time measured in
+    between them, so both see the same machine load.
+    """
+    timings = []
+    calibration = []
+    for index in range(repeat):
+        calibration.append(calibrate(repeat=8))
+        arg = stage.setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = default_timer()
+            stage.run(arg)
+            timings.append(default_timer() - start)
+        finally:
+            gc.enable()
+    return timings, min(calibration)
+
+
+def peak_memory(stage):
+    if tracemalloc is None:
+        return None
+    arg = stage.setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage.run(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_stage(stage, repeat, memory=True):
+    timings, calibration = time_stage(stage, repeat)
+    best = min(timings)
+    return OrderedDict([
+        ('size', stage.size),
+        ('best', best),
+        ('calibration', calibration),
+        ('mean', sum(timings) / len(timings)),
+        ('runs', timings),
+        ('ops_per_sec', 1.0 / best if best else None),
+        ('per_node_us', best * 1e6 / stage.size if stage.size else None),
+        ('peak_bytes', peak_memory(stage) if memory else None),
+    ])
+
+
+def metadata(options):
+    return OrderedDict([
+        ('timestamp', datetime.datetime.utcnow().isoformat() + 'Z'),
+        ('python', platform.python_version()),
+        ('implementation', platform.python_implementation()),
+        ('platform', platform.platform()),
+        ('shape', shape(options)),
+        ('keys', options.keys),
+        ('repeat', options.repeat),
+    ])
+
+
+def run(options):
+    selected = set(options.stage or [stage.name for stage in STAGES])
+    stages = OrderedDict()
+    for stage_class in STAGES:
+        if stage_class.name in selected:
+            stages[stage_class.name] = run_stage(stage_class(options),
+                                                 options.repeat,
+                                                 not options.no_memory)
+    return OrderedDict([('meta', metadata(options)), ('stages', stages)])
+
+
+def profile(options):
+    root = create_document('synthetic', generate_xml_dict(**shape(options))).root_element
+    profiler = SchemaProfiler()
+    component_schema.to_python(root, stores=Stores(), profiler=profiler)
+    return profiler
+
+
+def format_results(results):
+    lines = ['%-16s %10s %12s %12s %14s %12s' % (
+        'stage', 'size', 'best [s]', 'ops/s', 'per node [us]', 'peak [KiB]')]
+    for name, stage in results['stages'].items():
+        peak = stage['peak_bytes']
+        lines.append('%-16s %10d %12.6f %12.2f %14.3f %12s' % (
+            name, stage['size'], stage['best'], stage['ops_per_sec'] or 0,
+            stage['per_node_us'] or 0, '-' if peak is None else peak // 1024))
+    return '\n'.join(lines)
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--maps', type=int, default=2)
+    parser.add_argument('--registers', type=int, default=50)
+    parser.add_argument('--fields', type=int, default=8)
+    parser.add_argument('--values', type=int, default=4,
+                        help='reset values per field')
+    parser.add_argument('--description-length', type=int, default=8,
+                        help='words per description')
+    parser.add_argument('--refs', type=int, default=50,
+                        help='bus interfaces with a key and an ID reference')
+    parser.add_argument('--keys', type=int, default=100000,
+                        help='keys for the key_store and sqlite_store stages, '
+                             'e.g. 10000000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--stage', action='append',
+                        choices=[stage.name for stage in STAGES],
+                        help='run only this stage, may be given more than once')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the tracemalloc run')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--profile', action='store_true',
+                        help='print the hot spots of validating the document')
+    return parser
+
+
+def main(argv=None):
+    options = argument_parser().parse_args(argv)
+    logging.disable(logging.WARNING)
+    results = run(options)
+    print(format_results(results))
+    if options.profile:
+        print()
+        print(profile(options).report(limit=10))
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
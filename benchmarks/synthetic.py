@@ -0,0 +1,213 @@
+"""
+Synthetic IP-XACT like documents for the benchmarks.
+
+A component holds memory maps, memory maps hold registers and registers
+hold fields. The generator schemas only use validators which can build
+values on their own; the skeleton they build is then given unique names,
+IDs and references. The validation schema checks the same documents with
+keys, IDs and key references.
+"""
+from __future__ import unicode_literals
+from collections import OrderedDict
+
+from xvalidator import ElementSchema, SequenceSchema, InitKeyStore, KeyName, \
+    ID, IDREF, NCName, Token, NonNegativeInteger, PositiveInteger, \
+    IntegerValidator, EnumValidator, BooleanValidator, SchemaPurity, create_document
+from xvalidator.constraints import SetupKeyRefsStore
+from xvalidator.element import Document, Element
+
+
+__author__ = 'bernd'
+
+ACCESS = ['read-only', 'write-only', 'read-write', 'writeOnce', 'read-writeOnce']
+
+
+def _field_sequence(name_validator):
+    return [
+        ElementSchema('name', validator=name_validator, minOccurs=1),
+        ElementSchema('description', validator=Token()),
+        ElementSchema('bitOffset', validator=NonNegativeInteger(), minOccurs=1),
+        ElementSchema('bitWidth', validator=PositiveInteger(), minOccurs=1),
+        ElementSchema('access', validator=EnumValidator(options=ACCESS)),
+        ElementSchema('volatile', validator=BooleanValidator()),
+        ElementSchema('resetValues', validator=IntegerValidator(), unbounded=True),
+    ]
+
+
+def _register_sequence(name_validator):
+    return [
+        ElementSchema('name', validator=name_validator, minOccurs=1),
+        ElementSchema('description', validator=Token()),
+        ElementSchema('addressOffset', validator=NonNegativeInteger(), minOccurs=1),
+        ElementSchema('size', validator=PositiveInteger(), minOccurs=1),
+    ]
+
+
+class GeneratorField(SequenceSchema):
+    sequence = _field_sequence(NCName())
+
+
+class GeneratorRegister(SequenceSchema):
+    sequence = _register_sequence(NCName())
+
+
+generator_field = ElementSchema('field', validator=GeneratorField())
+generator_register = ElementSchema('register', validator=GeneratorRegister(),
+                                   attributes=[ElementSchema('id', validator=NCName())])
+
+
+class Field(SequenceSchema):
+    sequence = _field_sequence(KeyName(key_names='fieldKey', level=2))
+
+
+class Register(SequenceSchema):
+    initial = InitKeyStore('fieldKey')
+    sequence = _register_sequence(KeyName(key_names='registerKey', level=2)) + [
+        ElementSchema('field', validator=Field(), unbounded=True),
+    ]
+
+
+class MemoryMap(SequenceSchema):
+    initial = InitKeyStore('registerKey')
+    sequence = [
+        ElementSchema('name', validator=KeyName(key_names='memoryMapKey', level=2),
+                      minOccurs=1),
+        ElementSchema('register', validator=Register(), unbounded=True,
+                      attributes=[ElementSchema('id', validator=ID())]),
+    ]
+
+
+class BusInterface(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+        ElementSchema('memoryMapRef', validator=SetupKeyRefsStore('memoryMapKey'),
+                      minOccurs=1),
+        ElementSchema('registerRef', validator=IDREF()),
+    ]
+
+
+class Component(SequenceSchema):
+    initial = InitKeyStore('memoryMapKey')
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+        ElementSchema('memoryMap', validator=MemoryMap(), unbounded=True),
+        ElementSchema('busInterface', validator=BusInterface(), unbounded=True),
+    ]
+
+
+component_schema = ElementSchema('component', validator=Component())
+
+
+def build_schema(maps=2, registers=50, fields=8):
+    """
+    Returns a component schema with schemas of their own for every memory
+    map, register and field, like schemas generated from register
+    descriptions, built from instances with keyword arguments.
+    """
+    memory_maps = []
+    for map_index in range(maps):
+        register_schemas = []
+        for index in range(registers):
+            field_schemas = [
+                ElementSchema('field', unbounded=True, validator=SequenceSchema(
+                    sequence=_field_sequence(KeyName(key_names='fieldKey', level=2))))
+                for field_index in range(fields)]
+            register_schemas.append(ElementSchema(
+                'register', unbounded=True,
+                attributes=[ElementSchema('id', validator=ID())],
+                validator=SequenceSchema(
+                    initial=InitKeyStore('fieldKey'),
+                    sequence=_register_sequence(
+                        KeyName(key_names='registerKey', level=2)) + field_schemas)))
+        memory_maps.append(ElementSchema('memoryMap', unbounded=True, validator=SequenceSchema(
+            initial=InitKeyStore('registerKey'),
+            sequence=[ElementSchema('name', validator=KeyName(key_names='memoryMapKey',
+                                                              level=2), minOccurs=1)] +
+            register_schemas)))
+    return ElementSchema('component', validator=SequenceSchema(
+        initial=InitKeyStore('memoryMapKey'),
+        sequence=[ElementSchema('name', validator=NCName(), minOccurs=1)] + memory_maps))
+
+
+def count_schema_nodes(schema):
+    """
+    Returns the number of schemas and validators reachable from schema.
+    """
+    return len(SchemaPurity(schema).nodes)
+
+
+LEAF_SCHEMAS = OrderedDict((schema.tag, schema)
+                           for schema in _field_sequence(NCName())[1:] +
+                           _register_sequence(NCName())[1:])
+
+
+def _set_child(element, tag, value):
+    for child in element.value:
+        if child.tag == tag:
+            child.value = value
+            return
+    element.value.append(Element(tag, value=value))
+
+
+def generate_element(maps=2, registers=50, fields=8, values=4,
+                     description_length=8, refs=50):
+    """
+    Returns the root Element of a component with maps memory maps of
+    registers registers with fields fields each. Every field has values
+    reset values. refs bus interfaces refer to a memory map and a register
+    each.
+    """
+    description = ' '.join(['word'] * description_length)
+    memory_maps = []
+    register_index = 0
+    for map_index in range(maps):
+        map_value = [Element('name', value='map%d' % map_index)]
+        for index in range(registers):
+            register = generator_register.build()
+            register.attributes['id'] = 'ID%d' % register_index
+            _set_child(register, 'name', 'reg%d' % index)
+            _set_child(register, 'description', description)
+            _set_child(register, 'addressOffset', str(4 * index))
+            for field_index in range(fields):
+                field = generator_field.build(maxOccurs=values)
+                _set_child(field, 'name', 'field%d' % field_index)
+                _set_child(field, 'description', description)
+                _set_child(field, 'bitOffset', str(field_index))
+                _set_child(field, 'resetValues',
+                           [str(value) for value in range(values)])
+                register.value.append(field)
+            map_value.append(register)
+            register_index += 1
+        memory_maps.append(Element('memoryMap', value=map_value))
+    bus_interfaces = [Element('busInterface', value=[
+        Element('name', value='bus%d' % index),
+        Element('memoryMapRef', value='map%d' % (index % maps)),
+        Element('registerRef', value='ID%d' % (index % register_index))])
+        for index in range(refs if register_index else 0)]
+    return Element('component', value=[Element('name', value='component')] +
+                   memory_maps + bus_interfaces)
+
+
+def generate_xml_dict(**kwargs):
+    return Document('synthetic', [], generate_element(**kwargs)).to_dict
+
+
+def generate_document(**kwargs):
+    return create_document('synthetic', generate_xml_dict(**kwargs))
+
+
+def iter_elements(element):
+    """
+    Yields element and all its descendants, depth first.
+    """
+    stack = [element]
+    while stack:
+        element = stack.pop()
+        yield element
+        if isinstance(element.value, list) and element.value and \
+                isinstance(element.value[0], Element):
+            stack.extend(reversed(element.value))
+
+
+def count_nodes(element):
+    return sum(1 for item in iter_elements(element))
@@ -0,0 +1,77 @@
+"""
+Microbenchmark of the Token whitespace check on long text values:
+
+    python -m benchmarks.tokens --length 4000 --values 1000
+
+Times Token.to_python per value, Token.to_python_many for the whole list
+and, for comparison, the split and join check Token used before. Every
+case is run on values without whitespace at the ends, with a trailing
+newline and with non-ASCII text.
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+from timeit import default_timer
+
+from xvalidator import Token
+
+
+__author__ = 'bernd'
+
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing')
+
+
+def text(length, suffix='', words=WORDS):
+    result = []
+    size = 0
+    index = 0
+    while size < length:
+        word = words[index % len(words)]
+        result.append(word)
+        size += len(word) + 1
+        index += 1
+    return ' '.join(result) + suffix
+
+
+def split_join(value):
+    return ' '.join(value.split()) == value.strip()
+
+
+def best(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = default_timer()
+        function()
+        timings.append(default_timer() - start)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--length', type=int, default=4000,
+                        help='characters per value (default: %(default)s)')
+    parser.add_argument('--values', type=int, default=1000,
+                        help='values per run (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs per case, the best is reported (default: %(default)s)')
+    options = parser.parse_args(argv)
+    token = Token()
+    cases = [
+        ('plain', text(options.length)),
+        ('trailing newline', text(options.length, '\n')),
+        ('non-ascii', text(options.length, words=('gr\xfc\xdfe', 'stra\xdfe', 'caf\xe9'))),
+    ]
+    print('%-18s %14s %14s %14s' % ('case', 'to_python', 'to_python_many',
+                                    'split/join'))
+    for name, value in cases:
+        values = [value] * options.values
+        timings = [
+            best(lambda: [token.to_python(item) for item in values], options.repeat),
+            best(lambda: token.to_python_many(values), options.repeat),
+            best(lambda: [split_join(item) for item in values], options.repeat),
+        ]
+        print('%-18s %s' % (name, ' '.join('%11.2f us' % (timing / options.values * 1e6)
+                                           for timing in timings)))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ from nose.tools import raises
 
 from xvalidator.constraints import Stores, ID
 from xvalidator.element import Element
+from xvalidator.reporting import CollectingReporter
 from xvalidator import utils
 from xvalidator.schemas import ElementSchema, SequenceSchema
 from xvalidator.validators import PositiveInteger, NCName
@@ -72,6 +73,12 @@ def test_element_schema_args_validator_pass():
     nose.tools.eq_(actual, [test_validator_instance.__class__, 0, False, []])
 
 
+def test_element_schema_validator_shared_pass():
+    validator = PositiveInteger()
+    es = ElementSchema('testable', validator=validator)
+    nose.tools.eq_(es.validator is validator, True)
+
+
 def test_element_schema_validate_pass():
     es = ElementSchema('testable', validator=PositiveInteger())
     # noinspection PyProtectedMember
@@ -166,6 +173,16 @@ def test_element_schema_to_python_int_list_pass():
     nose.tools.eq_(actual, expected)
 
 
+def test_element_schema_to_python_int_list_errors_pass():
+    es = ElementSchema('numbers', validator=PositiveInteger())
+    element = Element('numbers', value=['1', 'x', '0', '4'], path='/top-0,name')
+    reporter = CollectingReporter()
+    actual = es.to_python(element, reporter=reporter)
+    utils.msg_counter.reset()
+    nose.tools.eq_([actual.value, [record.value for record in reporter.records]],
+                   [[1, None, None, 4], ['x', '0']])
+
+
 def test_element_schema_to_python_sequence_schema_pass():
     class TestSchema(SequenceSchema):
         sequence = [ElementSchema('name', validator=NCName()),
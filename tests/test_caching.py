@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+
+import nose
+from nose.tools import raises
+
+from xvalidator import ElementSchema, Element, EnumValidator, NCName, \
+    PositiveInteger, CachedValidator, ID, CollectingReporter
+from xvalidator import utils
+from xvalidator.validators import ValidationException
+
+
+__author__ = 'bernd'
+
+
+class DriverType(EnumValidator):
+    options = ['clock', 'singleShot', 'any']
+
+
+def test_cached_validator_hits_pass():
+    validator = CachedValidator(PositiveInteger(), maxsize=2)
+    results = [validator.to_python(value) for value in ('1', '2', '1', '1', '3', '2')]
+    nose.tools.eq_([results, validator.hits, validator.misses, validator.evictions,
+                    validator.size, validator.hit_rate],
+                   [[1, 2, 1, 1, 3, 2], 2, 4, 2, 2, 2 / 6.0])
+
+
+def test_cached_validator_type_key_pass():
+    validator = CachedValidator(PositiveInteger())
+    validator.to_python('1')
+    validator.to_python(1)
+    nose.tools.eq_(validator.misses, 2)
+
+
+def test_cached_validator_failure_pass():
+    validator = CachedValidator(NCName())
+    messages = []
+    for value in ('1a', '1a'):
+        try:
+            validator.to_python(value)
+        except ValidationException as e:
+            messages.append((e._msg, e._value))
+    nose.tools.eq_([messages[0], validator.hits], [messages[1], 1])
+
+
+def test_cached_validator_warning_not_cached_pass():
+    validator = CachedValidator(DriverType())
+    reporter = CollectingReporter()
+    for value in ('CLOCK', 'CLOCK', 'clock', 'clock'):
+        validator.to_python(value, path='/a-0,', reporter=reporter)
+    utils.msg_counter.reset()
+    nose.tools.eq_([len(reporter.records), validator.hits, validator.size], [2, 1, 1])
+
+
+def test_cached_validator_element_schema_pass():
+    validator = CachedValidator(PositiveInteger())
+    schema = ElementSchema('values', validator=validator)
+    element = schema.to_python(Element('values', value=['1', '1', '0'], path='/v-0,'))
+    utils.msg_counter.reset()
+    nose.tools.eq_([element.value, validator.stats()['hits']], [[1, 1, None], 1])
+
+
+@raises(AssertionError)
+def test_cached_validator_side_effects_fail():
+    CachedValidator(ID())
@@ -209,6 +209,19 @@ def test_check_keys_single_key_build_no_value_refer_key_pass():
     nose.tools.eq_(ck.build(path=field.path, stores=stores), 'ReferKey0')
 
 
+def test_build_keeps_validators_unchanged_pass():
+    stores = constraints.Stores()
+    path = "/register-0,reg6"
+    constraints.InitKeyStore('FieldKey').build(path=path, stores=stores)
+    validators = [constraints.CheckKeys(key_names='FieldKey', level=1),
+                  constraints.SetupKeyRefsStore('FieldKey'), constraints.ID()]
+    before = [dict(validator.__dict__) for validator in validators]
+    actual = [validator.build(path=path + '/field-0,', stores=stores)
+              for validator in validators]
+    nose.tools.eq_([actual, [validator.__dict__ for validator in validators]],
+                   [['FieldKey0', 'FieldKey0', 'testId0'], before])
+
+
 def test_check_uniques_empty_value_pass():
     stores = constraints.Stores()
     ks = constraints.InitUniqueStore('FieldKey')
@@ -523,3 +536,213 @@ def test_key_sub_class_name_two_keys_pass():
         constraints.KeyRef(key_name='referKey', key_value='prefixed:name', ref_path='/root-0,/child-1,prefixed:name')])
 
 
+def test_ancestor_path_chain_pass():
+    ancestors = ('/root-0,/register-0,reg6', ('/root-0,', None))
+    path = '/root-0,/register-0,reg6/field-2,field22@name'
+    nose.tools.eq_([constraints.ancestor_path(path, 1, ancestors),
+                    constraints.ancestor_path(path, 2, ancestors)],
+                   ['/root-0,/register-0,reg6', '/root-0,'])
+
+
+def test_ancestor_path_no_chain_pass():
+    path = '/root-0,/register-0,reg6/field-2,field22'
+    nose.tools.eq_([constraints.ancestor_path(path, 1),
+                    constraints.ancestor_path(path, 2)],
+                   ['/root-0,/register-0,reg6', '/root-0,'])
+
+
+def test_ancestor_path_short_chain_pass():
+    ancestors = ('/root-0,/register-0,reg6', None)
+    path = '/root-0,/register-0,reg6/field-2,field22'
+    nose.tools.eq_(constraints.ancestor_path(path, 2, ancestors), '/root-0,')
+
+
+def test_check_keys_ancestors_pass():
+    stores = constraints.Stores()
+    constraints.InitKeyStore('FieldKey').to_python(None, path='/register-0,reg6',
+                                                   stores=stores)
+    ck = constraints.CheckKeys(key_names='FieldKey', level=1)
+    ck.to_python('field22', path='/register-0,reg6/field-2,field22',
+                 ancestors=('/register-0,reg6', None), stores=stores)
+    nose.tools.eq_(stores.keyStore.keys, {'FieldKey:/register-0,reg6': {
+        'field22': '/register-0,reg6/field-2,field22'}})
+
+
+def composite_element(path, name, group=None, id_value=None):
+    children = [Element('name', value=name, path=path + '/name-0,')]
+    if group is not None:
+        children.append(Element('group', value=group, path=path + '/group-0,'))
+    attributes = dict(id=id_value) if id_value else None
+    return Element('port', value=children, attributes=attributes, path=path)
+
+
+def test_field_values_pass():
+    el = composite_element('/c-0,/port-0,p', 'p', group='g', id_value='ID1')
+    actual = constraints.field_values(el, ['name', '@id', 'group', 'missing'])
+    nose.tools.eq_(actual, ('p', 'ID1', 'g', None))
+
+
+def test_check_composite_keys_pass():
+    stores = constraints.Stores()
+    constraints.InitKeyStore('portKey').to_python(None, path='/c-0,', stores=stores)
+    ck = constraints.CheckCompositeKeys(key_names='portKey', fields=['name', 'group'],
+                                        level=1)
+    for index, group in enumerate(['g0', 'g1']):
+        el = composite_element('/c-0,/port-%d,p' % index, 'p', group=group)
+        ck.to_python(el, path=el.path, stores=stores)
+    nose.tools.eq_(stores.keyStore.keys, {'portKey:/c-0,': {
+        ('p', 'g0'): '/c-0,/port-0,p', ('p', 'g1'): '/c-0,/port-1,p'}})
+
+
+@raises(ValidationException)
+def test_check_composite_keys_duplicate_fail():
+    stores = constraints.Stores()
+    constraints.InitKeyStore('portKey').to_python(None, path='/c-0,', stores=stores)
+    ck = constraints.CheckCompositeKeys(key_names='portKey', fields=['name', 'group'],
+                                        level=1)
+    for index in range(2):
+        el = composite_element('/c-0,/port-%d,p' % index, 'p', group='g')
+        ck.to_python(el, path=el.path, stores=stores)
+
+
+@raises(ValidationException)
+def test_check_composite_keys_missing_field_fail():
+    stores = constraints.Stores()
+    constraints.InitKeyStore('portKey').to_python(None, path='/c-0,', stores=stores)
+    ck = constraints.CheckCompositeKeys(key_names='portKey', fields=['name', 'group'],
+                                        level=1)
+    el = composite_element('/c-0,/port-0,p', 'p')
+    ck.to_python(el, path=el.path, stores=stores)
+
+
+def test_check_composite_uniques_empty_pass():
+    stores = constraints.Stores()
+    constraints.InitUniqueStore('portKey').to_python(None, path='/c-0,', stores=stores)
+    cu = constraints.CheckCompositeUniques(key_names='portKey', fields=['@id', 'group'],
+                                           level=1)
+    el = composite_element('/c-0,/port-0,p', 'p')
+    nose.tools.eq_(cu.to_python(el, path=el.path, stores=stores), None)
+
+
+def test_check_composite_uniques_pass():
+    stores = constraints.Stores()
+    constraints.InitUniqueStore('portKey').to_python(None, path='/c-0,', stores=stores)
+    cu = constraints.CheckCompositeUniques(key_names='portKey', fields=['@id', 'group'],
+                                           level=1)
+    el = composite_element('/c-0,/port-0,p', 'p', group='g', id_value='ID1')
+    cu.to_python(el, path=el.path, stores=stores)
+    nose.tools.eq_(stores.uniquesStore.key_value_count('portKey', '/c-0,'), 1)
+
+
+def test_composite_key_ref_match_refs_pass():
+    stores = constraints.Stores()
+    constraints.InitKeyStore('portKey').to_python(None, path='/c-0,', stores=stores)
+    ck = constraints.CheckCompositeKeys(key_names='portKey', fields=['name', 'group'],
+                                        level=1)
+    key_el = composite_element('/c-0,/port-0,p', 'p', group='g')
+    ck.to_python(key_el, path=key_el.path, stores=stores)
+    kr = constraints.AddCompositeKeyRef('portKey', ['name', 'group'])
+    ref_el = composite_element('/c-0,/portRef-0,p', 'p', group='g')
+    kr.to_python(ref_el, path=ref_el.path, stores=stores)
+    constraints.match_refs(stores)
+    nose.tools.eq_(stores.refStore.targets, {'/c-0,/portRef-0,p': '/c-0,/port-0,p'})
+
+
+@raises(ValidationException)
+def test_composite_key_ref_no_match_fail():
+    stores = constraints.Stores()
+    constraints.InitKeyStore('portKey').to_python(None, path='/c-0,', stores=stores)
+    kr = constraints.AddCompositeKeyRef('portKey', ['name', 'group'])
+    ref_el = composite_element('/c-0,/portRef-0,p', 'p', group='g')
+    kr.to_python(ref_el, path=ref_el.path, stores=stores)
+    constraints.match_refs(stores)
+
+
+def test_composite_build_pass():
+    el = composite_element('/c-0,/port-0,p', 'p', group='g')
+    validators = [
+        constraints.CheckCompositeKeys(key_names='portKey', fields=['name', 'group'], level=1),
+        constraints.CheckCompositeUniques(key_names='portKey', fields=['name'], level=1),
+        constraints.AddCompositeKeyRef('portKey', ['name', 'group'])]
+    nose.tools.eq_([[validator.build(el) for validator in validators],
+                    [validator.build() for validator in validators]],
+                   [[el] * 3, [None] * 3])
+
+
+def test_in_subtree_pass():
+    nose.tools.eq_([constraints.in_subtree('/c-0,/m-0,a', '/c-0,/m-0,a'),
+                    constraints.in_subtree('/c-0,/m-0,a/name-0,', '/c-0,/m-0,a'),
+                    constraints.in_subtree('/c-0,/m-0,a@id', '/c-0,/m-0,a'),
+                    constraints.in_subtree('/c-0,/m-0,ab/name-0,', '/c-0,/m-0,a')],
+                   [True, True, True, False])
+
+
+def retract_stores():
+    stores = constraints.Stores()
+    constraints.InitKeyStore('mapKey').to_python(None, path='/c-0,', stores=stores)
+    check = constraints.CheckKeys(key_names='mapKey', level=2)
+    for name in ('m0', 'm1'):
+        constraints.InitKeyStore('regKey').to_python(
+            None, path='/c-0,/map-0,%s' % name, stores=stores)
+        check.to_python(name, path='/c-0,/map-0,%s/name-0,' % name, stores=stores)
+    constraints.SetupKeyRefsStore('mapKey').to_python(
+        'm1', path='/c-0,/map-0,m0/ref-0,', stores=stores)
+    constraints.match_refs(stores)
+    return stores
+
+
+def test_key_store_retract_pass():
+    stores = retract_stores()
+    removed = stores.keyStore.retract('/c-0,/map-0,m1')
+    nose.tools.eq_([removed, sorted(stores.keyStore.keys.keys())],
+                   [[('mapKey', 'm1', '/c-0,/map-0,m1/name-0,')],
+                    ['mapKey:/c-0,', 'regKey:/c-0,/map-0,m0']])
+
+
+@raises(ValidationException)
+def test_key_store_retract_match_ref_fail():
+    stores = retract_stores()
+    stores.keyStore.retract('/c-0,/map-0,m1')
+    stores.keyStore.match_ref('mapKey', 'm1')
+
+
+def test_stores_retract_pass():
+    stores = retract_stores()
+    cleared = stores.retract('/c-0,/map-0,m1')
+    nose.tools.eq_([cleared, stores.refStore.targets, stores.refStore.ref_count()],
+                   [['/c-0,/map-0,m0/ref-0,'], {}, 1])
+    stores.retract('/c-0,/map-0,m0')
+    nose.tools.eq_(stores.refStore.ref_count(), 0)
+
+
+def test_key_store_retract_shadowed_value_pass():
+    stores = retract_stores()
+    stores.keyStore.add_key('mapKey', '/d-0,')
+    stores.keyStore.add_value('mapKey', '/d-0,', 'm1', '/d-0,/map-0,m1/name-0,')
+    stores.keyStore.retract('/c-0,/map-0,m1')
+    nose.tools.eq_(stores.keyStore.match_ref('mapKey', 'm1'), '/d-0,/map-0,m1/name-0,')
+
+
+def test_key_store_retract_after_retract_pass():
+    stores = retract_stores()
+    stores.keyStore.retract('/c-0,/map-0,m1')
+    stores.keyStore.add_key('regKey', '/c-0,/map-0,m1')
+    stores.keyStore.add_value('mapKey', '/c-0,', 'm1', '/c-0,/map-0,m1/name-0,')
+    removed = stores.keyStore.retract('/c-0,/map-0,m1')
+    nose.tools.eq_([removed, sorted(stores.keyStore.keys.keys())],
+                   [[('mapKey', 'm1', '/c-0,/map-0,m1/name-0,')],
+                    ['mapKey:/c-0,', 'regKey:/c-0,/map-0,m0']])
+
+
+def test_ref_store_retract_clear_targets_pass():
+    stores = retract_stores()
+    stores.refStore.add_key_ref('mapKey', 'm0', '/c-0,/map-0,m1/ref-0,')
+    stores.refStore.set_target('/c-0,/map-0,m1/ref-0,', '/c-0,/map-0,m0/name-0,')
+    cleared = stores.refStore.clear_targets({'/c-0,/map-0,m1/name-0,'})
+    removed = stores.refStore.retract('/c-0,/map-0,m1')
+    stores.refStore.add_key_ref('mapKey', 'm0', '/c-0,/map-0,m1/ref-0,')
+    nose.tools.eq_([cleared, [ref.ref_path for ref in removed],
+                    [ref.key_value for ref in stores.refStore.refs],
+                    stores.refStore.clear_targets({'/c-0,/map-0,m0/name-0,'})],
+                   [['/c-0,/map-0,m0/ref-0,'], ['/c-0,/map-0,m1/ref-0,'], ['m1', 'm0'],
+                    []])
@@ -0,0 +1,247 @@
+from __future__ import unicode_literals
+from collections import OrderedDict
+import os
+import shutil
+import tempfile
+
+import nose
+
+from xvalidator import InitKeyStore, KeyName, ID, IDREF, NCName, InMemoryMetrics
+from xvalidator.constraints import SetupKeyRefsStore
+from xvalidator.corpus import Corpus, qualify_path, split_path
+from xvalidator.schemas import ElementSchema, SequenceSchema
+from xvalidator.sqlstores import SqliteStores
+
+
+__author__ = 'bernd'
+
+
+class MemoryMap(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=KeyName(key_names='memoryMapKey', level=2),
+                      minOccurs=1),
+    ]
+
+
+class Component(SequenceSchema):
+    initial = InitKeyStore('memoryMapKey')
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+        ElementSchema('memoryMap', validator=MemoryMap()),
+        ElementSchema('memoryMapRef', validator=SetupKeyRefsStore('memoryMapKey')),
+        ElementSchema('id', validator=ID()),
+        ElementSchema('idRef', validator=IDREF()),
+    ]
+
+
+component_schema = ElementSchema('component', validator=Component())
+
+
+def component(name, memory_map=None, memory_map_ref=None, id_value=None,
+              id_ref=None):
+    value = OrderedDict([('name', name)])
+    if memory_map:
+        value['memoryMap'] = OrderedDict([('name', memory_map)])
+    if memory_map_ref:
+        value['memoryMapRef'] = memory_map_ref
+    if id_value:
+        value['id'] = id_value
+    if id_ref:
+        value['idRef'] = id_ref
+    return OrderedDict([('component', value)])
+
+
+def test_qualify_path_split_path_pass():
+    qualified = qualify_path('c1.xml', '/component-0,c1')
+    nose.tools.eq_(split_path(qualified), ('c1.xml', '/component-0,c1'))
+
+
+def test_corpus_local_ref_pass():
+    corpus = Corpus(component_schema)
+    corpus.add('c1.xml', component('c1', memory_map='mm1', memory_map_ref='mm1'))
+    report = corpus.resolve()['c1.xml']
+    nose.tools.eq_(report.targets, {
+        '/component-0,c1/memoryMapRef-0,':
+            'c1.xml#/component-0,c1/memoryMap-0,mm1/name-0,'})
+    assert report.valid
+
+
+def test_corpus_cross_document_ref_pass():
+    corpus = Corpus(component_schema)
+    corpus.add('c1.xml', component('c1', memory_map_ref='mm2'))
+    nose.tools.eq_(len(corpus.resolve()['c1.xml'].unresolved), 1)
+    corpus.add('c2.xml', component('c2', memory_map='mm2'))
+    report = corpus.resolve()['c1.xml']
+    nose.tools.eq_([report.unresolved, list(report.targets.values())],
+                   [[], ['c2.xml#/component-0,c2/memoryMap-0,mm2/name-0,']])
+
+
+def test_corpus_cross_document_idref_pass():
+    corpus = Corpus(component_schema)
+    corpus.add_many([('c1.xml', component('c1', id_ref='ID2')),
+                     ('c2.xml', component('c2', id_value='ID2'))])
+    report = corpus.resolve()['c1.xml']
+    nose.tools.eq_(list(report.targets.values()),
+                   ['c2.xml#/component-0,c2/id-0,'])
+
+
+def test_corpus_unchanged_document_skipped_pass():
+    corpus = Corpus(component_schema)
+    corpus.add('c1.xml', component('c1', memory_map='mm1'))
+    actual = corpus.add_many([('c1.xml', component('c1', memory_map='mm1'))])
+    nose.tools.eq_([list(actual.keys()), corpus.sources], [[], ['c1.xml']])
+
+
+def test_corpus_changed_document_pass():
+    corpus = Corpus(component_schema)
+    corpus.add_many([('c1.xml', component('c1', memory_map_ref='mm2')),
+                     ('c2.xml', component('c2', memory_map='mm2'))])
+    assert corpus.resolve()['c1.xml'].valid
+    corpus.add('c2.xml', component('c2', memory_map='mm3'))
+    report = corpus.resolve()['c1.xml']
+    nose.tools.eq_([ref.key_value for ref in report.unresolved], ['mm2'])
+
+
+def test_corpus_remove_document_pass():
+    corpus = Corpus(component_schema)
+    corpus.add_many([('c1.xml', component('c1', memory_map_ref='mm2')),
+                     ('c2.xml', component('c2', memory_map='mm2'))])
+    corpus.resolve()
+    corpus.remove('c2.xml')
+    reports = corpus.resolve()
+    nose.tools.eq_([list(reports.keys()), len(reports['c1.xml'].unresolved)],
+                   [['c1.xml'], 1])
+
+
+def test_corpus_duplicate_id_across_documents_fail():
+    corpus = Corpus(component_schema)
+    corpus.add_many([('c1.xml', component('c1', id_value='ID1')),
+                     ('c2.xml', component('c2', id_value='ID1'))])
+    reports = corpus.resolve()
+    nose.tools.eq_([reports['c1.xml'].valid, len(reports['c2.xml'].messages)],
+                   [True, 1])
+
+
+def test_corpus_validation_errors_counted_pass():
+    corpus = Corpus(component_schema)
+    report = corpus.add('c1.xml', component('1nvalid'))
+    nose.tools.eq_(report.errors, 1)
+
+
+def test_corpus_keep_documents_pass():
+    corpus = Corpus(component_schema, keep_documents=True)
+    corpus.add('c1.xml', component('c1'))
+    nose.tools.eq_(corpus.document('c1.xml').root_element.path, '/component-0,c1')
+
+
+def test_corpus_workers_pass():
+    items = [('c%d.xml' % index, component('c%d' % index,
+                                           memory_map='mm%d' % index,
+                                           memory_map_ref='mm%d' % (index + 1)))
+             for index in range(4)]
+    corpus = Corpus(component_schema, workers=2)
+    corpus.add_many(items)
+    reports = corpus.resolve()
+    nose.tools.eq_([len(report.unresolved) for report in reports.values()],
+                   [0, 0, 0, 1])
+
+
+def test_corpus_workers_instance_validators_pass():
+    schema = ElementSchema('component', validator=Component(), attributes=[
+        ElementSchema('version', validator=NCName())])
+    items = [('c%d.xml' % index, component('c%d' % index, memory_map='mm%d' % index))
+             for index in range(2)]
+    corpus = Corpus(schema, workers=2)
+    corpus.add_many(items)
+    nose.tools.eq_([report.valid for report in corpus.resolve().values()], [True, True])
+
+
+def test_corpus_sqlite_stores_pass():
+    corpus = Corpus(component_schema, stores_factory=SqliteStores)
+    corpus.add_many([('c1.xml', component('c1', memory_map_ref='mm2')),
+                     ('c2.xml', component('c2', memory_map='mm2'))])
+    assert corpus.resolve()['c1.xml'].valid
+    corpus.add('c2.xml', component('c2', memory_map='mm3'))
+    nose.tools.eq_(len(corpus.resolve()['c1.xml'].unresolved), 1)
+
+
+def test_corpus_reference_graph_pass():
+    corpus = Corpus(component_schema)
+    corpus.add_many([('c1.xml', component('c1', memory_map='mm1',
+                                          memory_map_ref='mm2')),
+                     ('c2.xml', component('c2', memory_map='mm2',
+                                          memory_map_ref='mm1'))])
+    corpus.resolve()
+    graph = corpus.reference_graph(node_key=lambda path: path.split('#')[0])
+    nose.tools.eq_(graph.cycles(), [['c1.xml', 'c2.xml']])
+
+
+def test_corpus_metrics_pass():
+    metrics = InMemoryMetrics()
+    corpus = Corpus(component_schema, metrics=metrics)
+    corpus.add_many([('c1.xml', component('c1', memory_map_ref='mm2', id_ref='ID9')),
+                     ('c2.xml', component('c2', memory_map='mm2'))])
+    corpus.resolve()
+    nose.tools.eq_([metrics.counter('documents_validated_total'),
+                    metrics.counter('nodes_validated_total'),
+                    metrics.counter('refs_resolved_total'),
+                    metrics.counter('refs_unresolved_total'),
+                    metrics.histogram('stage_seconds', stage='validate')[2],
+                    metrics.gauge('store_values', store='keyStore')],
+                   [2, 8, 1, 1, 2, 1])
+
+
+def test_corpus_max_errors_pass():
+    corpus = Corpus(component_schema, max_errors=1)
+    value = component('c1', memory_map='1mm', id_value='1id')
+    report = corpus.add('c1.xml', value)
+    nose.tools.eq_([report.errors, report.complete, report.valid,
+                    report.stopped_at], [1, False, False, '/component-0,c1/id-0,'])
+
+
+def test_corpus_timeout_pass():
+    corpus = Corpus(component_schema, timeout=-1)
+    report = corpus.add('c1.xml', component('c1', memory_map='mm1', id_value='id1'))
+    nose.tools.eq_([report.complete, report.valid, report.stopped_at is not None,
+                    report.cancelled.startswith('Validation cancelled')],
+                   [False, False, True, True])
+
+
+def test_corpus_remove_duplicate_id_pass():
+    corpus = Corpus(component_schema)
+    corpus.add_many([('c1.xml', component('c1', id_value='ID1')),
+                     ('c2.xml', component('c2', id_value='ID1')),
+                     ('c3.xml', component('c3', id_ref='ID1'))])
+    corpus.resolve()
+    corpus.remove('c1.xml')
+    reports = corpus.resolve()
+    nose.tools.eq_([reports['c2.xml'].messages, list(reports['c3.xml'].targets.values())],
+                   [[], ['c2.xml#/component-0,c2/id-0,']])
+
+
+def test_corpus_duplicate_id_own_document_first_pass():
+    corpus = Corpus(component_schema)
+    corpus.add_many([('c1.xml', component('c1', id_value='ID1')),
+                     ('c2.xml', component('c2', id_value='ID1', id_ref='ID1'))])
+    reports = corpus.resolve()
+    nose.tools.eq_([len(reports['c2.xml'].messages), list(reports['c2.xml'].targets.values())],
+                   [1, ['c2.xml#/component-0,c2/id-0,']])
+
+
+def test_corpus_sqlite_database_file_pass():
+    directory = tempfile.mkdtemp()
+    try:
+        database = os.path.join(directory, 'corpus.db')
+        items = [('c1.xml', component('c1', memory_map='mm1', id_value='ID1')),
+                 ('c2.xml', component('c2', memory_map_ref='mm1', id_ref='ID1'))]
+        reports = []
+        for _ in range(2):
+            stores = SqliteStores(database)
+            corpus = Corpus(component_schema, stores_factory=lambda: stores)
+            corpus.add_many(items)
+            reports.append(corpus.resolve())
+            stores.close()
+        nose.tools.eq_([[report.valid for report in run.values()] for run in reports],
+                       [[True, True], [True, True]])
+    finally:
+        shutil.rmtree(directory)
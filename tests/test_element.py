@@ -249,3 +249,12 @@ def test_document_to_dict_two_levels_top_attribute_round_trip_pass():
     xml_dict = doc.to_dict
     doc_new = create_document('test', xml_dict)
     nose.tools.eq_(doc.__dict__.items(), doc_new.__dict__.items())
+
+
+def test_element_mark_changed_pass():
+    child = Element('name', value='n', path='/a-0,/name-0,')
+    element = Element('a', value=[child], path='/a-0,')
+    element.isValidated = True
+    element.mark_changed()
+    nose.tools.eq_([element.isValidated, element.children, child.children],
+                   [False, [child], []])
@@ -0,0 +1,110 @@
+from __future__ import unicode_literals
+from collections import OrderedDict
+
+import nose
+
+from xvalidator import ElementSchema, SequenceSchema, Element, Stores, NCName, \
+    PositiveInteger, BooleanValidator, InitKeyStore, KeyName, CollectingReporter
+from xvalidator import utils
+from xvalidator.memo import SubtreeMemo
+
+
+__author__ = 'bernd'
+
+
+class Field(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+        ElementSchema('width', validator=PositiveInteger(), minOccurs=1),
+        ElementSchema('volatile', validator=BooleanValidator()),
+        ElementSchema('resets', validator=PositiveInteger(), unbounded=True),
+    ]
+
+
+class Register(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=KeyName(key_names='registerKey', level=2),
+                      minOccurs=1),
+        ElementSchema('field', validator=Field(), unbounded=True,
+                      attributes=[ElementSchema('kind', validator=NCName())]),
+    ]
+
+
+class Block(SequenceSchema):
+    initial = InitKeyStore('registerKey')
+    sequence = [ElementSchema('register', validator=Register(), unbounded=True)]
+
+
+block_schema = ElementSchema('block', validator=Block())
+
+
+def field(path, name='f', width='8', kind='plain'):
+    return Element('field', path=path, attributes=OrderedDict([('kind', kind)]), value=[
+        Element('name', value=name, path=path + '/name-0,'),
+        Element('width', value=width, path=path + '/width-0,'),
+        Element('volatile', value='true', path=path + '/volatile-0,'),
+        Element('resets', value=['1', '2'], path=path + '/resets-0,'),
+    ])
+
+
+def block(widths):
+    registers = []
+    for index, register_widths in enumerate(widths):
+        path = '/block-0,/register-%d,r%d' % (index, index)
+        registers.append(Element('register', path=path, value=[
+            Element('name', value='r%d' % index, path=path + '/name-0,')] + [
+            field(path + '/field-%d,f' % field_index, width=width)
+            for field_index, width in enumerate(register_widths)]))
+    return Element('block', value=registers, path='/block-0,')
+
+
+def validated(element, **kwargs):
+    reporter = CollectingReporter()
+    stores = Stores()
+    result = block_schema.to_python(element, stores=stores, reporter=reporter, **kwargs)
+    utils.msg_counter.reset()
+    return result, stores, [(record.code, record.path) for record in reporter.records]
+
+
+def test_subtree_memo_same_result_pass():
+    widths = [['8', '8'], ['8', '4'], ['8', '0'], ['8', '0']]
+    memo = SubtreeMemo(block_schema)
+    expected = validated(block(widths))
+    actual = validated(block(widths), memo=memo)
+    nose.tools.eq_([actual[0], actual[1].keyStore.keys, actual[2]],
+                   [expected[0], expected[1].keyStore.keys, expected[2]])
+
+
+def test_subtree_memo_stats_pass():
+    memo = SubtreeMemo(block_schema)
+    validated(block([['8', '8'], ['8', '4'], ['8', '0']]), memo=memo)
+    nose.tools.eq_([memo.hits, memo.misses, memo.not_memoized], [9, 9, 2])
+
+
+def test_subtree_memo_paths_pass():
+    memo = SubtreeMemo(block_schema)
+    element = validated(block([['8', '8']]), memo=memo)[0]
+    second = element.value[0].value[2]
+    nose.tools.eq_([second.path, second.value[0].path, second.value[0].value,
+                    second.value[3].value, second.attributes],
+                   ['/block-0,/register-0,r0/field-1,f',
+                    '/block-0,/register-0,r0/field-1,f/name-0,', 'f', [1, 2],
+                    OrderedDict([('kind', 'plain')])])
+
+
+def test_subtree_memo_warning_pass():
+    memo = SubtreeMemo(block_schema)
+    element = block([['8', '8']])
+    for field_element in element.value[0].value[1:]:
+        field_element.value.reverse()
+    records = validated(element, memo=memo)[2]
+    nose.tools.eq_([records, memo.not_memoized],
+                   [[('key_order', '/block-0,/register-0,r0/field-0,f'),
+                     ('key_order', '/block-0,/register-0,r0/field-1,f')], 2])
+
+
+def test_subtree_memo_reused_pass():
+    memo = SubtreeMemo(block_schema)
+    validated(block([['8']]), memo=memo)
+    validated(block([['8']]), memo=memo)
+    nose.tools.eq_([memo.hits, len(memo)], [1, 5])
@@ -0,0 +1,86 @@
+from __future__ import unicode_literals
+
+import nose
+
+from xvalidator import Stores, InMemoryMetrics, MetricsSink, render_prometheus
+from xvalidator import constraints
+from xvalidator.metrics import record_store_sizes, record_messages, timed
+
+
+__author__ = 'bernd'
+
+
+def test_metrics_sink_noop_pass():
+    sink = MetricsSink()
+    sink.increment('documents_validated_total')
+    sink.observe('stage_seconds', 0.1, stage='validate')
+    sink.set_gauge('nodes_per_second', 10)
+
+
+def test_in_memory_counter_pass():
+    metrics = InMemoryMetrics()
+    metrics.increment('messages_total', kind='invalid_value')
+    metrics.increment('messages_total', 2, kind='invalid_value')
+    metrics.increment('messages_total', kind='key_order')
+    nose.tools.eq_([metrics.counter('messages_total', kind='invalid_value'),
+                    metrics.counter('messages_total', kind='key_order'),
+                    metrics.counter('messages_total', kind='constraint')], [3, 1, 0])
+
+
+def test_in_memory_histogram_pass():
+    metrics = InMemoryMetrics(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        metrics.observe('stage_seconds', value, stage='validate')
+    nose.tools.eq_(metrics.histogram('stage_seconds', stage='validate'),
+                   ([2, 3, 4], 2.65, 4))
+
+
+def test_render_prometheus_pass():
+    metrics = InMemoryMetrics(buckets=(1.0,))
+    metrics.increment('documents_validated_total', 2)
+    metrics.set_gauge('store_values', 5, store='idStore')
+    metrics.observe('stage_seconds', 0.5, stage='resolve')
+    nose.tools.eq_(render_prometheus(metrics).split('\n'), [
+        '# HELP xvalidator_documents_validated_total Documents validated.',
+        '# TYPE xvalidator_documents_validated_total counter',
+        'xvalidator_documents_validated_total 2',
+        '# HELP xvalidator_store_values Key values, IDs or references of a store.',
+        '# TYPE xvalidator_store_values gauge',
+        'xvalidator_store_values{store="idStore"} 5',
+        '# HELP xvalidator_stage_seconds Time per processing stage.',
+        '# TYPE xvalidator_stage_seconds histogram',
+        'xvalidator_stage_seconds_bucket{stage="resolve",le="1.0"} 1',
+        'xvalidator_stage_seconds_bucket{stage="resolve",le="+Inf"} 1',
+        'xvalidator_stage_seconds_sum{stage="resolve"} 0.5',
+        'xvalidator_stage_seconds_count{stage="resolve"} 1',
+        ''])
+
+
+def test_render_prometheus_escape_pass():
+    metrics = InMemoryMetrics()
+    metrics.increment('custom', kind='a "b"\n')
+    nose.tools.eq_(metrics.render(prefix='').split('\n')[2],
+                   'custom{kind="a \\"b\\"\\n"} 1')
+
+
+def test_record_store_sizes_pass():
+    stores = Stores()
+    constraints.InitKeyStore('mapKey').to_python(None, path='/c-0,', stores=stores)
+    constraints.CheckKeys(key_names='mapKey', level=2).to_python(
+        'm0', path='/c-0,/map-0,m0/name-0,', stores=stores)
+    constraints.IDREF().to_python('ID1', path='/c-0,/ref-0,', stores=stores)
+    metrics = InMemoryMetrics()
+    record_store_sizes(metrics, stores)
+    nose.tools.eq_([metrics.gauge('store_targets', store='keyStore'),
+                    metrics.gauge('store_values', store='keyStore'),
+                    metrics.gauge('store_values', store='idStore'),
+                    metrics.gauge('store_values', store='idrefStore')], [1, 1, 0, 1])
+
+
+def test_record_messages_timed_pass():
+    metrics = InMemoryMetrics()
+    record_messages(metrics, {'invalid_value': 2})
+    with timed(metrics, 'validate'):
+        pass
+    nose.tools.eq_([metrics.counter('messages_total', kind='invalid_value'),
+                    metrics.histogram('stage_seconds', stage='validate')[2]], [2, 1])
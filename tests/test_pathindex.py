@@ -0,0 +1,24 @@
+from __future__ import unicode_literals
+
+import nose
+
+from xvalidator.pathindex import PathIndex, path_segments
+
+
+__author__ = 'bernd'
+
+
+def test_path_segments_pass():
+    nose.tools.eq_([path_segments('/c-0,/m-0,a@id'), path_segments('c1.xml#/c-0,')],
+                   [['c-0,', 'm-0,a', '@id'], ['c1.xml#', 'c-0,']])
+
+
+def test_path_index_pop_subtree_pass():
+    index = PathIndex()
+    for path in ('/c-0,', '/c-0,/m-0,m1', '/c-0,/m-0,m1@id', '/c-0,/m-0,m1/n-0,',
+                 '/c-0,/m-1,m10/n-0,'):
+        index.add(path, path)
+    nose.tools.eq_([sorted(index.pop_subtree('/c-0,/m-0,m1')), len(index),
+                    index.items('/c-0,'), index.pop_subtree('/c-0,/m-0,m1')],
+                   [['/c-0,/m-0,m1', '/c-0,/m-0,m1/n-0,', '/c-0,/m-0,m1@id'], 2,
+                    ['/c-0,'], []])
@@ -0,0 +1,103 @@
+from __future__ import unicode_literals
+from itertools import count
+import json
+
+import nose
+
+from xvalidator import ElementSchema, SequenceSchema, Element, NCName, \
+    IntegerValidator, Stores, SchemaProfiler
+from xvalidator import utils
+
+
+__author__ = 'bernd'
+
+
+class Item(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+        ElementSchema('values', validator=IntegerValidator(), unbounded=True),
+    ]
+
+
+item_schema = ElementSchema('item', validator=Item())
+
+
+def item_element(name='item1', values=('1', '2', '3')):
+    return Element('item', value=[Element('name', value=name, path='/item-0,/name-0,'),
+                                  Element('values', value=list(values),
+                                          path='/item-0,/values-0,')],
+                   path='/item-0,')
+
+
+def profiled(element):
+    ticks = count()
+    profiler = SchemaProfiler(timer=lambda: float(next(ticks)))
+    item_schema.to_python(element, stores=Stores(), profiler=profiler)
+    return profiler
+
+
+def test_profiler_counts_pass():
+    profiler = profiled(item_element())
+    nose.tools.eq_([(name, stat.calls, stat.values, stat.errors)
+                    for name, stat in sorted(profiler.tags.items())],
+                   [('item', 1, 1, 0), ('name', 1, 1, 0), ('values', 1, 3, 0)])
+    nose.tools.eq_([(name, stat.calls, stat.values)
+                    for name, stat in sorted(profiler.validators.items())],
+                   [('IntegerValidator', 1, 3), ('Item', 1, 1), ('NCName', 1, 1)])
+
+
+def test_profiler_own_time_pass():
+    profiler = profiled(item_element())
+    item = profiler.tags['item']
+    nose.tools.eq_(item.own, item.total - profiler.validators['Item'].total)
+    nose.tools.eq_(item.total, sum(stat.own for stat in profiler.tags.values()) +
+                   sum(stat.own for stat in profiler.validators.values()))
+
+
+def test_profiler_errors_pass():
+    profiler = profiled(item_element(values=('1', 'x', 'y')))
+    utils.msg_counter.reset()
+    nose.tools.eq_([profiler.tags['values'].errors, profiler.tags['item'].errors,
+                    profiler.validators['IntegerValidator'].errors], [2, 0, 2])
+
+
+def test_profiler_report_pass():
+    profiler = profiled(item_element())
+    lines = profiler.report(sort='calls').split('\n')
+    nose.tools.eq_([lines[0].split()[0], lines[1].split()[0],
+                    lines[5].split()[0], lines[6].split()[0]],
+                   ['tag', 'item', 'validator', 'IntegerValidator'])
+
+
+def test_profiler_json_pass():
+    profiler = profiled(item_element())
+    result = json.loads(profiler.to_json(sort='values', limit=1))
+    nose.tools.eq_([result['tags'][0]['name'], result['tags'][0]['values'],
+                    len(result['validators'])], ['values', 3, 1])
+
+
+def test_profiler_optional_pass():
+    element = item_schema.to_python(item_element(), stores=Stores())
+    nose.tools.eq_(element.value[1].value, [1, 2, 3])
+
+
+class Failing(NCName):
+    def to_python(self, value, **kwargs):
+        raise RuntimeError(value)
+
+
+def test_profiler_exception_pass():
+    ticks = count()
+    profiler = SchemaProfiler(timer=lambda: float(next(ticks)))
+    schema = ElementSchema('item', validator=SequenceSchema(sequence=[
+        ElementSchema('name', validator=Failing(), minOccurs=1)]))
+    nose.tools.assert_raises(RuntimeError, schema.to_python, item_element(),
+                             stores=Stores(), profiler=profiler)
+    nose.tools.eq_([(name, stat.calls) for name, stat in sorted(profiler.tags.items())] +
+                   [(name, stat.calls) for name, stat in sorted(profiler.validators.items())],
+                   [('item', 1), ('name', 1), ('Failing', 1), ('SequenceSchema', 1)])
+
+
+@nose.tools.raises(AssertionError)
+def test_profiler_sort_fail():
+    SchemaProfiler().report(sort='name')
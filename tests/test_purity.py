@@ -0,0 +1,109 @@
+from __future__ import unicode_literals
+
+import nose
+
+from xvalidator import ElementSchema, SequenceSchema, Element, Stores, NCName, \
+    PositiveInteger, InitKeyStore, KeyName, ID, CachedValidator
+from xvalidator.purity import SchemaPurity, is_pure, cache_pure_validators
+
+
+__author__ = 'bernd'
+
+
+class Register(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=KeyName(key_names='registerKey', level=2),
+                      minOccurs=1),
+        ElementSchema('size', validator=PositiveInteger()),
+    ]
+
+
+class Field(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+        ElementSchema('width', validator=PositiveInteger()),
+    ]
+
+
+class Block(SequenceSchema):
+    initial = InitKeyStore('registerKey')
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+        ElementSchema('register', validator=Register(), unbounded=True),
+        ElementSchema('field', validator=Field(), attributes=[
+            ElementSchema('id', validator=NCName())]),
+    ]
+
+
+class Group(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+    ]
+
+Group.sequence.append(ElementSchema('group', validator=Group(), unbounded=True))
+
+
+block_schema = ElementSchema('block', validator=Block())
+
+
+def tags(element_schemas):
+    return sorted(element_schema.tag for element_schema in element_schemas)
+
+
+def test_schema_purity_pass():
+    purity = SchemaPurity(block_schema)
+    nose.tools.eq_([tags(purity.element_schemas()), tags(purity.element_schemas(False))],
+                   [['field', 'id', 'name', 'name', 'size', 'width'],
+                    ['block', 'name', 'register']])
+
+
+def test_schema_purity_validators_pass():
+    purity = SchemaPurity(block_schema)
+    register = block_schema.validator.sequence[1]
+    field = block_schema.validator.sequence[2]
+    nose.tools.eq_([purity.is_pure(register.validator), purity.is_pure(field.validator),
+                    purity.is_pure(block_schema.validator.initial)],
+                   [False, True, False])
+
+
+def test_schema_purity_recursive_pass():
+    group = ElementSchema('group', validator=Group())
+    nose.tools.eq_(is_pure(group), True)
+
+
+def test_schema_purity_recursive_side_effects_pass():
+    class IdGroup(SequenceSchema):
+        sequence = [ElementSchema('name', validator=NCName())]
+
+    group = ElementSchema('group', validator=IdGroup())
+    IdGroup.sequence.append(group)
+    IdGroup.sequence.append(ElementSchema('id', validator=ID()))
+    purity = SchemaPurity(group)
+    nose.tools.eq_([purity.is_pure(group), purity.is_pure(IdGroup.sequence[0])],
+                   [False, True])
+
+
+def test_cache_pure_validators_pass():
+    class Item(SequenceSchema):
+        sequence = [
+            ElementSchema('name', validator=KeyName(key_names='itemKey', level=2)),
+            ElementSchema('kind', validator=NCName()),
+            ElementSchema('values', validator=PositiveInteger(), unbounded=True),
+        ]
+
+    class Items(SequenceSchema):
+        initial = InitKeyStore('itemKey')
+        sequence = [ElementSchema('item', validator=Item(), unbounded=True)]
+
+    schema = ElementSchema('items', validator=Items())
+    cached = cache_pure_validators(schema)
+    items = [Element('item', path='/items-0,/item-%d,' % index, value=[
+        Element('name', value='i%d' % index, path='/items-0,/item-%d,/name-0,' % index),
+        Element('kind', value='plain', path='/items-0,/item-%d,/kind-0,' % index)])
+        for index in range(3)]
+    stores = Stores()
+    schema.to_python(Element('items', value=items, path='/items-0,'), stores=stores)
+    nose.tools.eq_([[str(validator) for validator in cached], cached[0].hits,
+                    isinstance(Item.sequence[0].validator, CachedValidator),
+                    stores.keyStore.key_value_count('itemKey', '/items-0,')],
+                   [['NCName'], 2, False, 3])
@@ -0,0 +1,83 @@
+from __future__ import unicode_literals
+
+import nose
+
+from xvalidator import constraints
+from xvalidator.refgraph import ReferenceGraph, owner_path
+
+
+__author__ = 'bernd'
+
+
+def linked_stores():
+    stores = constraints.Stores()
+    constraints.InitKeyStore('mapKey').to_python(None, path='/c-0,', stores=stores)
+    check = constraints.CheckKeys(key_names='mapKey', level=2)
+    for name in ('m0', 'm1', 'm2'):
+        check.to_python(name, path='/c-0,/map-0,%s/name-0,' % name, stores=stores)
+    refs = constraints.SetupKeyRefsStore('mapKey')
+    refs.to_python('m1', path='/c-0,/map-0,m0/mapRef-0,', stores=stores)
+    refs.to_python('m0', path='/c-0,/map-0,m1/mapRef-0,', stores=stores)
+    refs.to_python('m1', path='/c-0,/bus-0,/mapRef-0,', stores=stores)
+    constraints.ID().to_python('ID1', path='/c-0,/port-0,@id', stores=stores)
+    constraints.match_refs(stores)
+    return stores
+
+
+def test_owner_path_pass():
+    nose.tools.eq_([owner_path()('/c-0,/port-0,@id'),
+                    owner_path(1)('/c-0,/map-0,m0/name-0,')],
+                   ['/c-0,/port-0,', '/c-0,/map-0,m0'])
+
+
+def test_reference_graph_referrers_pass():
+    graph = ReferenceGraph.from_stores(linked_stores())
+    nose.tools.eq_(graph.referrers('/c-0,/map-0,m1/name-0,'),
+                   ['/c-0,/bus-0,/mapRef-0,', '/c-0,/map-0,m0/mapRef-0,'])
+
+
+def test_reference_graph_references_pass():
+    graph = ReferenceGraph.from_stores(linked_stores())
+    nose.tools.eq_(graph.references('/c-0,/bus-0,/mapRef-0,'),
+                   ['/c-0,/map-0,m1/name-0,'])
+
+
+def test_reference_graph_unreferenced_keys_pass():
+    graph = ReferenceGraph.from_stores(linked_stores())
+    nose.tools.eq_(graph.unreferenced_keys(),
+                   ['/c-0,/map-0,m2/name-0,', '/c-0,/port-0,@id'])
+
+
+def test_reference_graph_no_cycles_pass():
+    graph = ReferenceGraph.from_stores(linked_stores())
+    nose.tools.eq_([graph.cycles(), graph.edge_count], [[], 3])
+
+
+def test_reference_graph_owner_cycles_pass():
+    graph = ReferenceGraph.from_stores(linked_stores(), node_key=owner_path(1))
+    nose.tools.eq_(graph.cycles(), [['/c-0,/map-0,m0', '/c-0,/map-0,m1']])
+
+
+def test_reference_graph_self_loop_pass():
+    graph = ReferenceGraph()
+    graph.add_edge('/a', '/a')
+    graph.add_edge('/a', '/b')
+    nose.tools.eq_(graph.cycles(), [['/a']])
+
+
+def test_reference_graph_components_pass():
+    graph = ReferenceGraph.from_stores(linked_stores(), node_key=owner_path(1))
+    nose.tools.eq_(graph.components(), [
+        ['/c-0,/bus-0,', '/c-0,/map-0,m0', '/c-0,/map-0,m1'],
+        ['/c-0,/map-0,m2'], ['/c-0,']])
+
+
+def test_reference_graph_long_chain_pass():
+    graph = ReferenceGraph()
+    length = 20000
+    for index in range(length):
+        graph.add_edge('/n%d' % index, '/n%d' % (index + 1))
+    graph.add_edge('/n%d' % length, '/n0')
+    cycles = graph.cycles()
+    nose.tools.eq_([len(cycles), len(cycles[0]), len(graph.components())],
+                   [1, length + 1, 1])
@@ -0,0 +1,169 @@
+from __future__ import unicode_literals
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import nose
+
+from xvalidator import ElementSchema, SequenceSchema, Element, NCName, \
+    IntegerValidator, EnumValidator, Stores
+from xvalidator import utils
+from xvalidator.reporting import ErrorRecord, CollectingReporter, \
+    JsonLinesReporter, LoggingReporter, AggregatingReporter, read_json_lines, \
+    schema_node
+
+
+__author__ = 'bernd'
+
+
+class Item(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+        ElementSchema('size', validator=IntegerValidator()),
+        ElementSchema('access', validator=EnumValidator(options=['read-only'])),
+    ]
+
+
+item_schema = ElementSchema('item', validator=Item())
+
+
+def item_element(*children):
+    return Element('item', value=[Element(tag, value=value, path='/item-0,/%s-0,' % tag)
+                                  for tag, value in children], path='/item-0,')
+
+
+def collect(element):
+    reporter = CollectingReporter()
+    utils.reset_message_counters()
+    item_schema.to_python(element, stores=Stores(), reporter=reporter)
+    return reporter.records
+
+
+def test_error_record_message_pass():
+    record = ErrorRecord('missing_element', '/a-0,', 'b', 'Missing required key: %s', ('b',))
+    nose.tools.eq_([record.message, record.as_dict()['code']],
+                   ['Missing required key: b', 'missing_element'])
+
+
+def test_reporter_invalid_value_pass():
+    records = collect(item_element(('name', 'n1'), ('size', 'x')))
+    nose.tools.eq_([(record.code, record.path, record.value) for record in records],
+                   [('invalid_value', '/item-0,/size-0,', 'x')])
+    nose.tools.eq_([utils.msg_counter.errors, utils.msg_counter.kinds],
+                   [1, {'invalid_value': 1}])
+    utils.reset_message_counters()
+
+
+def test_reporter_sequence_records_pass():
+    records = collect(item_element(('size', '1'), ('extra', 'e')))
+    nose.tools.eq_([(record.code, record.path, record.value) for record in records],
+                   [('missing_element', '/item-0,', 'name'),
+                    ('unexpected_element', '/item-0,', ['extra'])])
+    utils.reset_message_counters()
+
+
+def test_reporter_warnings_pass():
+    records = collect(item_element(('size', '1'), ('name', 'n1'), ('access', 'Read-Only')))
+    nose.tools.eq_([(record.code, record.severity) for record in records],
+                   [('key_order', 'warning'), ('enum_spelling', 'warning')])
+    nose.tools.eq_(utils.msg_counter.warnings, 2)
+    utils.reset_message_counters()
+
+
+def test_json_lines_reporter_pass():
+    directory = tempfile.mkdtemp()
+    try:
+        file_name = os.path.join(directory, 'errors.jsonl')
+        with JsonLinesReporter(file_name, buffer_size=2) as reporter:
+            for index in range(3):
+                reporter.report(ErrorRecord('invalid_value', '/a-%d,' % index, index,
+                                            'Bad value %r', (index,)))
+            nose.tools.eq_(len(read_json_lines(file_name)), 2)
+        records = read_json_lines(file_name)
+        nose.tools.eq_([(record['path'], record['value'], record['message'])
+                        for record in records],
+                       [('/a-0,', 0, 'Bad value 0'), ('/a-1,', 1, 'Bad value 1'),
+                        ('/a-2,', 2, 'Bad value 2')])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_json_lines_reporter_stream_pass():
+    stream = io.StringIO()
+    reporter = JsonLinesReporter(stream)
+    reporter.report(ErrorRecord('constraint', '/a-0,', ('x', object), '%s', ('c',)))
+    reporter.close()
+    record = json.loads(stream.getvalue())
+    nose.tools.eq_([record['code'], record['value'][0]], ['constraint', 'x'])
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelname, record.getMessage()))
+
+
+def test_logging_reporter_pass():
+    log = logging.getLogger('test_logging_reporter_pass')
+    handler = ListHandler()
+    log.addHandler(handler)
+    reporter = LoggingReporter(log)
+    reporter.report(ErrorRecord('key_order', '/a-0,', None, 'order %s', ('a',), 'warning'))
+    reporter.report(ErrorRecord('invalid_value', '/a-0,', 1, 'value %s', (1,)))
+    log.removeHandler(handler)
+    nose.tools.eq_(handler.messages, [('WARNING', 'order a'), ('ERROR', 'value 1')])
+
+
+def test_schema_node_pass():
+    nose.tools.eq_([schema_node('/component-0,c/memoryMap-12,mm/name-0,'),
+                    schema_node('/component-0,c/register-3,r@id'), schema_node(None)],
+                   ['/component/memoryMap/name', '/component/register@id', None])
+
+
+def enum_records(count):
+    return [ErrorRecord('enum_spelling', '/c-0,/field-%d,f%d/access-0,' % (index, index),
+                        'Read-Only', 'Found incorrect spelling of option "%s"',
+                        ('Read-Only',), 'warning') for index in range(count)]
+
+
+def test_aggregating_reporter_pass():
+    forward = CollectingReporter()
+    reporter = AggregatingReporter(sample_size=2, reporter=forward)
+    for record in enum_records(1000) + [ErrorRecord('invalid_value', '/c-0,/size-0,',
+                                                    'x', 'bad %s', ('x',))]:
+        reporter.report(record)
+    groups = reporter.summary()
+    nose.tools.eq_([(group.node, group.count, len(group.sample)) for group in groups],
+                   [('/c/field/access', 1000, 2), ('/c/size', 1, 1)])
+    nose.tools.eq_([len(forward.records), reporter.count], [2, 1001])
+    nose.tools.eq_(reporter.report_text().split('\n')[0],
+                   '    1000 x warning enum_spelling in /c/field/access: '
+                   'Found incorrect spelling of option "Read-Only"')
+
+
+def test_aggregating_reporter_max_groups_pass():
+    reporter = AggregatingReporter(max_groups=1)
+    reporter.report(ErrorRecord('invalid_value', '/a-0,', 1, 'a %s', (1,)))
+    reporter.report(ErrorRecord('invalid_value', '/b-0,', 1, 'b %s', (1,)))
+    reporter.report(ErrorRecord('invalid_value', '/a-1,', 2, 'a %s', (2,)))
+    result = reporter.as_dict()
+    nose.tools.eq_([result['count'], result['dropped'], result['groups'][0]['count']],
+                   [3, 1, 2])
+
+
+def test_aggregating_reporter_schema_pass():
+    reporter = AggregatingReporter()
+    utils.reset_message_counters()
+    for index in range(3):
+        item_schema.to_python(item_element(('name', 'n%d' % index), ('size', 'x%d' % index)),
+                              stores=Stores(), reporter=reporter)
+    utils.reset_message_counters()
+    nose.tools.eq_([(group.code, group.count, [value for path, value in group.sample])
+                    for group in reporter.summary()],
+                   [('invalid_value', 3, ['x0', 'x1', 'x2'])])
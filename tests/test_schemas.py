@@ -414,3 +414,33 @@ def test_sequence_schema_initial_pass():
     Register().to_python(register.value, path=register.path,
         stores=stores)
     nose.tools.eq_(utils.error_count, 0)
+
+
+def test_element_schema_composite_key_duplicate_fail():
+    from xvalidator.constraints import CheckCompositeKeys
+
+    class Port(SequenceSchema):
+        sequence = [ElementSchema('name', minOccurs=1),
+                    ElementSchema('group', minOccurs=1)]
+
+    class Component(SequenceSchema):
+        initial = InitKeyStore('portKey')
+        sequence = [ElementSchema('port', validator=Port(), constraints=[
+            CheckCompositeKeys(key_names='portKey', fields=['name', 'group'],
+                               level=1)])]
+
+    def port(index, name, group):
+        path = '/component-0,/port-%d,%s' % (index, name)
+        return Element('port', path=path, value=[
+            Element('name', value=name, path=path + '/name-0,'),
+            Element('group', value=group, path=path + '/group-0,')])
+
+    utils.reset_message_counters()
+    component = Element('component', path='/component-0,', value=[
+        port(0, 'p', 'g0'), port(1, 'p', 'g1'), port(2, 'p', 'g0')])
+    stores = Stores()
+    ElementSchema('component', validator=Component()).to_python(
+        component, stores=stores)
+    nose.tools.eq_([utils.error_count,
+                    stores.keyStore.key_value_count('portKey', '/component-0,')],
+                   [1, 2])
@@ -0,0 +1,211 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+
+import nose
+from nose.tools import raises
+
+from xvalidator import constraints
+from xvalidator.sqlstores import SqliteStores, SqliteKeyStore, connect
+from xvalidator.validators import ValidationException
+
+
+__author__ = 'bernd'
+
+
+def test_sqlite_stores_is_stores_pass():
+    stores = SqliteStores()
+    assert isinstance(stores, constraints.Stores)
+
+
+def test_sqlite_key_store_add_value_pass():
+    stores = SqliteStores()
+    constraints.InitKeyStore('TestKey').to_python(None, path='/', stores=stores)
+    stores.keyStore.add_value('TestKey', '/', 'key_value', '/ads/cgfh')
+    expected = {'TestKey:/': {'key_value': '/ads/cgfh'}}
+    nose.tools.eq_(stores.keyStore.keys, expected)
+
+
+def test_key_stores_match_ref_target_order_pass():
+    results = []
+    for stores in [constraints.Stores(), SqliteStores()]:
+        key_store = stores.keyStore
+        key_store.add_key('mapKey', '/a-0,')
+        key_store.add_key('mapKey', '/b-0,')
+        key_store.add_value('mapKey', '/b-0,', 'm1', '/b-0,/map-0,m1')
+        key_store.add_value('mapKey', '/a-0,', 'm1', '/a-0,/map-0,m1')
+        first = key_store.match_ref('mapKey', 'm1')
+        key_store.retract('/a-0,')
+        second = key_store.match_ref('mapKey', 'm1')
+        key_store.add_key('mapKey', '/a-0,')
+        key_store.add_value('mapKey', '/a-0,', 'm1', '/a-0,/map-0,m1')
+        results.append([first, second, key_store.match_ref('mapKey', 'm1')])
+    nose.tools.eq_(results, [['/a-0,/map-0,m1', '/b-0,/map-0,m1', '/b-0,/map-0,m1']] * 2)
+
+
+def test_key_stores_match_ref_prefix_pass():
+    results = []
+    for stores in [constraints.Stores(), SqliteStores()]:
+        key_store = stores.keyStore
+        for target_path in ('/a-0,', '/b-0,', '/c-0,'):
+            key_store.add_key('mapKey', target_path)
+            key_store.add_value('mapKey', target_path, 'm1', target_path + '/map-0,m1')
+        results.append([key_store.match_ref('mapKey', 'm1', prefix=prefix)
+                        for prefix in (None, '/c-0,', '/b-0,')])
+    nose.tools.eq_(results, [['/a-0,/map-0,m1', '/c-0,/map-0,m1', '/b-0,/map-0,m1']] * 2)
+
+
+@raises(ValidationException)
+def test_sqlite_key_store_add_duplicate_key_name_fail():
+    stores = SqliteStores()
+    ks = constraints.InitKeyStore('TestKeys')
+    ks.to_python(None, path='/root-0,', stores=stores)
+    ks.to_python(None, path='/root-0,', stores=stores)
+
+
+@raises(ValidationException)
+def test_sqlite_key_store_add_duplicate_value_fail():
+    stores = SqliteStores()
+    constraints.InitKeyStore('TestKey').to_python(None, path='/', stores=stores)
+    stores.keyStore.add_value('TestKey', '/', 'key_value', '/a')
+    stores.keyStore.add_value('TestKey', '/', 'key_value', '/b')
+
+
+@raises(ValidationException)
+def test_sqlite_key_store_add_value_no_target_fail():
+    stores = SqliteStores()
+    stores.keyStore.add_value('TestKey', '/', 'key_value', '/a')
+
+
+def test_sqlite_key_store_add_values_pass():
+    stores = SqliteStores()
+    stores.keyStore.add_key('TestKey', '/')
+    count = stores.keyStore.add_values('TestKey', '/', [
+        ('key%d' % index, '/key-%d,' % index) for index in range(100)])
+    nose.tools.eq_([count, stores.keyStore.key_value_count('TestKey', '/')],
+                   [100, 100])
+
+
+def test_sqlite_key_store_add_values_duplicate_fail():
+    stores = SqliteStores()
+    stores.keyStore.add_key('TestKey', '/')
+    values = [('key0', '/a'), ('key1', '/b'), ('key0', '/c')]
+    try:
+        stores.keyStore.add_values('TestKey', '/', values)
+    except ValidationException as e:
+        nose.tools.eq_(e._value, 'key0')
+    else:
+        assert False, 'Duplicate key value not detected.'
+    nose.tools.eq_(stores.keyStore.key_value_count('TestKey', '/'), 2)
+
+
+def test_sqlite_key_store_stores_are_separate_pass():
+    stores = SqliteStores()
+    constraints.InitUniqueStore('TestKey').to_python(None, path='/', stores=stores)
+    stores.uniquesStore.add_value('TestKey', '/', 'unique', '/u')
+    nose.tools.eq_(stores.keyStore.key_value_count('TestKey', '/'), 0)
+
+
+def test_sqlite_match_refs_pass():
+    stores = SqliteStores()
+    constraints.InitKeyStore('memoryMapKey').to_python(
+        None, path='/component-0,test', stores=stores)
+    constraints.CheckKeys(key_names='memoryMapKey', level=2).to_python(
+        'myMemoryMap', path='/component-0,test/memoryMap-0,myMemoryMap/name-0,',
+        stores=stores)
+    constraints.SetupKeyRefsStore('memoryMapKey').to_python(
+        'myMemoryMap', path='/component-0,test/busInterface-0,/memoryMapRef-0,',
+        stores=stores)
+    constraints.match_refs(stores)
+    nose.tools.eq_(stores.refStore.targets, {
+        '/component-0,test/busInterface-0,/memoryMapRef-0,':
+            '/component-0,test/memoryMap-0,myMemoryMap/name-0,'})
+
+
+@raises(ValidationException)
+def test_sqlite_match_ref_no_key_fail():
+    stores = SqliteStores()
+    stores.keyStore.match_ref('missingKey', 'value')
+
+
+@raises(ValidationException)
+def test_sqlite_match_ref_value_not_found_fail():
+    stores = SqliteStores()
+    stores.keyStore.add_key('TestKey', '/')
+    stores.keyStore.match_ref('TestKey', 'value')
+
+
+def test_sqlite_id_store_pass():
+    stores = SqliteStores()
+    constraints.ID().to_python('ID42', path='/field-0,@id', stores=stores)
+    constraints.IDREF().to_python('ID42', path='/ref-0,', stores=stores)
+    constraints.match_refs(stores)
+    nose.tools.eq_([stores.idStore.id_count(), stores.idrefStore.targets],
+                   [1, {'/ref-0,': '/field-0,@id'}])
+
+
+def test_sqlite_key_store_transaction_rollback_pass():
+    connection = connect()
+    store = SqliteKeyStore(connection)
+    store.add_key('TestKey', '/')
+    store.commit()
+    try:
+        with store.transaction():
+            store.add_value('TestKey', '/', 'key_value', '/a')
+            raise RuntimeError('abort')
+    except RuntimeError:
+        pass
+    nose.tools.eq_(store.key_value_count('TestKey', '/'), 0)
+
+
+def test_sqlite_stores_persistent_pass():
+    directory = tempfile.mkdtemp()
+    try:
+        database = os.path.join(directory, 'keys.db')
+        stores = SqliteStores(database)
+        stores.keyStore.add_key('TestKey', '/doc1')
+        stores.keyStore.add_value('TestKey', '/doc1', 'key_value', '/doc1/a')
+        constraints.ID().to_python('ID42', path='/doc1/field-0,@id', stores=stores)
+        stores.close()
+        stores = SqliteStores(database)
+        actual = [stores.keyStore.match_ref('TestKey', 'key_value'),
+                  stores.idStore.match_id('ID42')]
+        stores.close()
+        nose.tools.eq_(actual, ['/doc1/a', '/doc1/field-0,@id'])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_sqlite_key_store_composite_value_pass():
+    stores = SqliteStores()
+    stores.keyStore.add_key('TestKey', '/')
+    stores.keyStore.add_value('TestKey', '/', ('a', 'b'), '/a-0,')
+    actual = [stores.keyStore.match_ref('TestKey', ('a', 'b')),
+              stores.keyStore.keys]
+    nose.tools.eq_(actual, ['/a-0,', {'TestKey:/': {('a', 'b'): '/a-0,'}}])
+
+
+@raises(ValidationException)
+def test_sqlite_key_store_composite_duplicate_fail():
+    stores = SqliteStores()
+    stores.keyStore.add_key('TestKey', '/')
+    stores.keyStore.add_value('TestKey', '/', ('a', 'b'), '/a-0,')
+    stores.keyStore.add_value('TestKey', '/', ('a', 'b'), '/a-1,')
+
+
+def test_sqlite_key_store_retract_pass():
+    store = SqliteStores().keyStore
+    store.add_key('mapKey', '/c-0,')
+    store.add_key('regKey', '/c-0,/map-0,m1')
+    store.add_values('mapKey', '/c-0,', [('m0', '/c-0,/map-0,m0/name-0,'),
+                                          ('m1', '/c-0,/map-0,m1/name-0,'),
+                                          ('m10', '/c-0,/map-0,m10/name-0,')])
+    store.add_value('regKey', '/c-0,/map-0,m1', 'r0', '/c-0,/map-0,m1/reg-0,r0/name-0,')
+    removed = store.retract('/c-0,/map-0,m1')
+    nose.tools.eq_([sorted(removed), sorted(store.keys.keys()),
+                    store.key_value_count('mapKey', '/c-0,')],
+                   [[('mapKey', 'm1', '/c-0,/map-0,m1/name-0,'),
+                     ('regKey', 'r0', '/c-0,/map-0,m1/reg-0,r0/name-0,')],
+                    ['mapKey:/c-0,'], 2])
+    store.add_key('regKey', '/c-0,/map-0,m1')
@@ -86,3 +86,11 @@ def test_message_count_info_errors_abort():
                              abort_on_errors=True)
 
 
+def test_message_kinds_pass():
+    utils.reset_message_counters()
+    utils.error(logger, 'test_message_kinds_pass', 'invalid_value')
+    utils.error(logger, 'test_message_kinds_pass')
+    utils.warning(logger, 'test_message_kinds_pass', 'key_order')
+    nose.tools.eq_(utils.msg_counter.kinds,
+                   {'invalid_value': 1, 'error': 1, 'key_order': 1})
+    utils.reset_message_counters()
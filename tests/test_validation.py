@@ -0,0 +1,268 @@
+from __future__ import unicode_literals
+
+import nose
+
+from xvalidator import ElementSchema, SequenceSchema, Element, NCName, \
+    IntegerValidator, ID, IDREF, CollectingReporter, validate, ValidationBudget, \
+    ValidationCancelled, InMemoryMetrics
+from xvalidator import constraints, validation
+from xvalidator.validators import ValidationException
+from xvalidator import utils
+
+
+__author__ = 'bernd'
+
+
+class Item(SequenceSchema):
+    sequence = [
+        ElementSchema('name', validator=NCName(), minOccurs=1),
+        ElementSchema('values', validator=IntegerValidator(), unbounded=True),
+        ElementSchema('id', validator=ID()),
+        ElementSchema('ref', validator=IDREF()),
+    ]
+
+
+class Items(SequenceSchema):
+    sequence = [
+        ElementSchema('item', validator=Item(), unbounded=True),
+    ]
+
+
+items_schema = ElementSchema('items', validator=Items())
+
+
+def items_element(count, values=('1', '2'), ref='ID0'):
+    items = []
+    for index in range(count):
+        path = '/items-0,/item-%d,i%d' % (index, index)
+        items.append(Element('item', path=path, value=[
+            Element('name', value='i%d' % index, path=path + '/name-0,'),
+            Element('values', value=list(values), path=path + '/values-0,'),
+            Element('id', value='ID%d' % index, path=path + '/id-0,'),
+            Element('ref', value=ref, path=path + '/ref-0,')]))
+    return Element('items', value=items, path='/items-0,')
+
+
+def run(element, **kwargs):
+    reporter = CollectingReporter()
+    utils.reset_message_counters()
+    report = validate(items_schema, element, reporter=reporter, **kwargs)
+    utils.reset_message_counters()
+    return report, reporter.records
+
+
+def test_validate_valid_pass():
+    report, records = run(items_element(3))
+    nose.tools.eq_([report.valid, report.complete, report.errors, records], [True, True, 0, []])
+    nose.tools.eq_(report.stores.idrefStore.targets,
+                   {'/items-0,/item-%d,i%d/ref-0,' % (index, index): '/items-0,/item-0,i0/id-0,'
+                    for index in range(3)})
+
+
+def test_validate_all_errors_pass():
+    report, records = run(items_element(5, values=('x', 'y')))
+    nose.tools.eq_([report.complete, report.errors, len(records)], [True, 10, 10])
+
+
+def test_validate_fail_fast_pass():
+    element = items_element(5, values=('x', 'y'))
+    report, records = run(element, max_errors=1)
+    nose.tools.eq_([report.valid, report.complete, report.errors, report.stopped_at],
+                   [False, False, 1, '/items-0,/item-0,i0/values-0,'])
+    nose.tools.eq_([len(element.value), element.value[0].value[1].value,
+                    element.value[1].isValidated], [5, [None, 'y'], False])
+
+
+def test_validate_budget_pass():
+    report, records = run(items_element(5, values=('1', 'x')), max_errors=3)
+    nose.tools.eq_([report.complete, report.errors, report.stopped_at],
+                   [False, 3, '/items-0,/item-2,i2/id-0,'])
+
+
+def test_validate_unresolved_refs_pass():
+    report, records = run(items_element(2, ref='ID9'))
+    nose.tools.eq_([report.valid, [ref.ref_path for ref in report.unresolved],
+                    [record.code for record in records]],
+                   [False, ['/items-0,/item-0,i0/ref-0,', '/items-0,/item-1,i1/ref-0,'],
+                    ['unresolved_ref', 'unresolved_ref']])
+
+
+def test_validate_budget_skips_refs_pass():
+    report, records = run(items_element(1, values=('x',), ref='ID9'), max_errors=1)
+    nose.tools.eq_([report.complete, report.stopped_at, report.unresolved],
+                   [False, '/items-0,/item-0,i0/id-0,', []])
+
+
+class InterleavingReporter(CollectingReporter):
+    """
+    Runs another validation at the first record, as another request of a
+    service would.
+    """
+
+    def __init__(self, other):
+        super(InterleavingReporter, self).__init__()
+        self.other = other
+
+    def report(self, record):
+        super(InterleavingReporter, self).report(record)
+        if self.other is not None:
+            other, self.other = self.other, None
+            other()
+
+
+def test_validate_interleaved_budgets_pass():
+    others = []
+    reporter = InterleavingReporter(lambda: others.append(validate(
+        items_schema, items_element(3, values=('x',)), reporter=CollectingReporter(),
+        max_errors=10)))
+    report = validate(items_schema, items_element(5, values=('x', 'y')),
+                      reporter=reporter, max_errors=4)
+    alone, records = run(items_element(5, values=('x', 'y')), max_errors=4)
+    nose.tools.eq_([report.errors, report.budget.errors, report.stopped_at,
+                    others[0].errors, others[0].complete],
+                   [4, 4, alone.stopped_at, 3, True])
+
+
+class ResettingReporter(CollectingReporter):
+    def report(self, record):
+        super(ResettingReporter, self).report(record)
+        utils.reset_message_counters()
+
+
+def test_validate_reset_message_counters_pass():
+    report = validate(items_schema, items_element(5, values=('x', 'y')),
+                      reporter=ResettingReporter(), max_errors=3)
+    nose.tools.eq_([report.errors, report.complete], [3, False])
+
+
+@nose.tools.raises(AssertionError)
+def test_validation_budget_fail():
+    ValidationBudget(max_errors=0)
+
+
+def ticking_timer(step=1.0):
+    ticks = [0.0]
+
+    def timer():
+        ticks[0] += step
+        return ticks[0]
+
+    return timer
+
+
+def test_validate_timeout_pass():
+    utils.reset_message_counters()
+    budget = ValidationBudget(timeout=10, interval=4, timer=ticking_timer())
+    try:
+        validate(items_schema, items_element(20), budget=budget)
+    except ValidationCancelled as e:
+        nose.tools.eq_([e.path, e.checked, e.report.complete, e.report.valid],
+                       ['/items-0,/item-5,i5/id-0,', 41, False, False])
+    else:
+        raise AssertionError('ValidationCancelled not raised')
+    finally:
+        utils.reset_message_counters()
+
+
+def test_validate_deadline_not_reached_pass():
+    report, records = run(items_element(3), timeout=60)
+    nose.tools.eq_([report.valid, report.cancelled], [True, None])
+
+
+@nose.tools.raises(ValidationCancelled)
+def test_match_refs_deadline_fail():
+    report, records = run(items_element(3))
+    budget = ValidationBudget(deadline=0, interval=1, timer=ticking_timer())
+    constraints.match_refs(report.stores, budget)
+
+
+def test_locate_pass():
+    element = items_element(3)
+    schema, located, ancestors = validation.locate(
+        items_schema, element, '/items-0,/item-1,i1/values-0,')
+    nose.tools.eq_([schema.tag, located is element.value[1].value[1], ancestors],
+                   ['values', True, ('/items-0,/item-1,i1', ('/items-0,', None))])
+
+
+@nose.tools.raises(ValidationException)
+def test_locate_fail():
+    validation.locate(items_schema, items_element(1), '/items-0,/item-0,i0/other-0,')
+
+
+def test_changed_elements_pass():
+    element = items_element(3)
+    run(element)
+    element.value[1].mark_changed()
+    element.value[1].value[0].mark_changed()
+    element.value[2].value[1].mark_changed()
+    nose.tools.eq_([changed.path for changed in validation.changed_elements(element)],
+                   ['/items-0,/item-1,i1', '/items-0,/item-2,i2/values-0,'])
+
+
+def test_revalidate_value_pass():
+    element = items_element(3)
+    report, records = run(element)
+    values = element.value[1].value[1]
+    values.value = ['3', 'x']
+    values.mark_changed()
+    reporter = CollectingReporter()
+    utils.reset_message_counters()
+    report = validation.revalidate(items_schema, element, report.stores, reporter=reporter)
+    utils.reset_message_counters()
+    nose.tools.eq_([report.errors, [record.path for record in reporter.records],
+                    values.value, values.isValidated],
+                   [1, ['/items-0,/item-1,i1/values-0,'], [3, None], True])
+
+
+def test_revalidate_refs_pass():
+    element = items_element(3)
+    report, records = run(element)
+    stores = report.stores
+    target = element.value[0].value[2]
+    target.value = 'ID7'
+    target.mark_changed()
+    utils.reset_message_counters()
+    report = validation.revalidate(items_schema, element, stores)
+    nose.tools.eq_([report.errors, len(report.unresolved), stores.idrefStore.targets], [3, 3, {}])
+    ref = element.value[2].value[3]
+    ref.value = 'ID7'
+    ref.mark_changed()
+    report = validation.revalidate(items_schema, element, stores)
+    utils.reset_message_counters()
+    nose.tools.eq_([ref.ref_path for ref in report.unresolved],
+                   ['/items-0,/item-0,i0/ref-0,', '/items-0,/item-1,i1/ref-0,'])
+    nose.tools.eq_(stores.idrefStore.targets,
+                   {'/items-0,/item-2,i2/ref-0,': '/items-0,/item-0,i0/id-0,'})
+
+
+def test_revalidate_subtree_pass():
+    element = items_element(2)
+    report, records = run(element)
+    item = element.value[1]
+    item.value[2].value = 'ID0'
+    item.mark_changed()
+    reporter = CollectingReporter()
+    utils.reset_message_counters()
+    report = validation.revalidate(items_schema, element, report.stores,
+                                   changed=[item, item.value[0]], reporter=reporter)
+    utils.reset_message_counters()
+    nose.tools.eq_([record.path for record in reporter.records], ['/items-0,/item-1,i1/id-0,'])
+
+
+def test_validate_metrics_pass():
+    metrics = InMemoryMetrics()
+    element = items_element(2, values=('1', 'x'), ref='ID9')
+    report, records = run(element, metrics=metrics)
+    values = element.value[1].value[1]
+    values.value = ['3', 'y']
+    values.mark_changed()
+    validation.revalidate(items_schema, element, report.stores, metrics=metrics)
+    utils.reset_message_counters()
+    nose.tools.eq_([metrics.counter('documents_validated_total'),
+                    metrics.counter('nodes_validated_total'),
+                    metrics.counter('refs_unresolved_total'),
+                    metrics.counter('messages_total', kind='invalid_value'),
+                    metrics.histogram('stage_seconds', stage='validate')[2],
+                    metrics.histogram('stage_seconds', stage='revalidate')[2],
+                    metrics.gauge('store_values', store='idStore')],
+                   [1, 12, 2, 3, 1, 1, 2])
@@ -1,12 +1,23 @@
 from __future__ import unicode_literals
+from collections import namedtuple
+import decimal
+import io
+import os
+import pickle
 import random
+import shutil
+import tempfile
 import nose
 from nose.tools import raises
 
 from xvalidator.validators import Token, Name, NCName, Language, \
     NMTOKEN, IntegerValidator, NonNegativeInteger, PositiveInteger, \
     NegativeInteger, FloatValidator, NonNegativeFloat, BooleanValidator, \
-    EnumValidator, ValidationException
+    EnumValidator, ValidationException, whitespace_collapsed, string_facets, \
+    StringValidator, RegexValidator, DecimalValidator, parse_integer, parse_decimal, \
+    parse_float, adopt
+from xvalidator import utils, vectorized
+from xvalidator.py2to3 import casefold
 
 
 __author__ = 'bernd'
@@ -17,6 +28,21 @@ def test_validation_exception__str__pass():
     nose.tools.eq_(str(iv), 'message, value:42')
 
 
+def test_adopt_pass():
+    validator = Token()
+    options = ['a', 'b']
+    nose.tools.eq_([adopt(validator) is validator, adopt(options) == options,
+                    adopt(options) is options, adopt('a')],
+                   [True, True, False, 'a'])
+
+
+def test_validator_kwargs_list_copied_pass():
+    options = ['a', 'b']
+    enum = EnumValidator(options=options)
+    options.append('c')
+    nose.tools.eq_(enum.options, ['a', 'b'])
+
+
 def test_token_build_value_pass():
     value = ' Test string with collapsed whitespace.'
     actual = Token().build(value)
@@ -47,6 +73,43 @@ def test_token_whitespace_fail():
     tk.to_python(value)
 
 
+def test_whitespace_collapsed_pass():
+    for value in ['', ' ', 'a', ' a b\n', '\ta b c ', 'gr\xfc\xdfe stra\xdfe']:
+        nose.tools.eq_(whitespace_collapsed(value), True, repr(value))
+
+
+def test_whitespace_collapsed_fail():
+    for value in ['a  b', 'a\tb', ' a\nb ', 'a\xa0b', 'a \u2003b', 'a\r\nb']:
+        nose.tools.eq_(whitespace_collapsed(value), False, repr(value))
+
+
+def test_whitespace_collapsed_split_join_pass():
+    rnd = random.Random(47)
+    alphabet = 'ab \t\n\xa0\u2003\xe9'
+    for _ in range(2000):
+        value = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 8)))
+        nose.tools.eq_(whitespace_collapsed(value),
+                       ' '.join(value.split()) == value.strip(), repr(value))
+
+
+def test_token_to_python_many_pass():
+    values = ['a b', ' c ', 'd' * 5000]
+    actual = Token().to_python_many(values)
+    nose.tools.eq_(actual, (values, []))
+
+
+def test_token_to_python_many_fail():
+    results, errors = Token().to_python_many(['a b', 'a  b', 21, 'c'])
+    nose.tools.eq_(results, ['a b', None, None, 'c'])
+    nose.tools.eq_([index for index, exc in errors], [1, 2])
+
+
+def test_token_to_python_many_length_fail():
+    results, errors = Token(maxLength=3).to_python_many(['abc', 'abcd'])
+    nose.tools.eq_(results, ['abc', None])
+    nose.tools.eq_([index for index, exc in errors], [1])
+
+
 @raises(ValidationException)
 def test_token_value_type_fail():
     tk = Token()
@@ -283,6 +346,96 @@ def test_float_build_value_pass():
     nose.tools.eq_(actual, 33)
 
 
+def test_parse_integer_pass():
+    values = ['0', '00033', '-7', '+7', ' 12\n', '0x1F', '-0X10', '\t0xff ']
+    nose.tools.eq_([parse_integer(value) for value in values],
+                   [0, 33, -7, 7, 12, 31, -16, 255])
+
+
+def test_parse_integer_fail():
+    values = ['', ' ', '1_000', '1.0', '\u0663', '12\xa0', '0x', '0x1G', '--1', '1e3', '0b101']
+    nose.tools.eq_([parse_integer(value) for value in values], [None] * len(values))
+
+
+def test_parse_integer_hexadecimal_fail():
+    nose.tools.eq_(parse_integer('0x10', hexadecimal=False), None)
+
+
+def test_parse_decimal_pass():
+    values = ['1', '-1.50', '.5', '5.', ' +0.10 ']
+    nose.tools.eq_([parse_decimal(value) for value in values],
+                   [decimal.Decimal(value.strip()) for value in values])
+
+
+def test_parse_decimal_fail():
+    values = ['', '.', '1e3', 'NaN', 'INF', '1,5', '1_0']
+    nose.tools.eq_([parse_decimal(value) for value in values], [None] * len(values))
+
+
+def test_parse_float_pass():
+    values = ['1', '-1.5E3', '.5e-1', '5.', 'INF', '-INF', ' 2 ']
+    nose.tools.eq_([parse_float(value) for value in values],
+                   [1.0, -1500.0, 0.05, 5.0, float('inf'), float('-inf'), 2.0])
+    nan = parse_float('NaN')
+    nose.tools.eq_(nan != nan, True)
+
+
+def test_parse_float_fail():
+    values = ['', 'inf', 'nan', 'Infinity', '1_0', '1e', 'e3', '0x10', '1.5f']
+    nose.tools.eq_([parse_float(value) for value in values], [None] * len(values))
+
+
+def test_integer_hexadecimal_pass():
+    nose.tools.eq_(PositiveInteger().to_python('0x20'), 32)
+
+
+@raises(ValidationException)
+def test_integer_hexadecimal_fail():
+    IntegerValidator(hexadecimal=False).to_python('0x20')
+
+
+@raises(ValidationException)
+def test_integer_underscore_fail():
+    IntegerValidator().to_python('1_000')
+
+
+@raises(ValidationException)
+def test_integer_none_fail():
+    IntegerValidator().to_python(None)
+
+
+def test_integer_many_digits_pass():
+    values = ['1' * 100000, '1']
+    results, errors = IntegerValidator().to_python_many(values)
+    nose.tools.eq_([len(results), len(errors) <= 1], [2, True])
+
+
+@raises(ValidationException)
+def test_float_lower_case_inf_fail():
+    FloatValidator().to_python('inf')
+
+
+def test_decimal_pass():
+    values = ['-1.50', 3, 0.1, decimal.Decimal('2.5')]
+    nose.tools.eq_([DecimalValidator().to_python(value) for value in values],
+                   [decimal.Decimal('-1.50'), 3, decimal.Decimal('0.1'), decimal.Decimal('2.5')])
+
+
+def test_decimal_fail():
+    messages = []
+    for value in ['1e3', float('nan'), decimal.Decimal('Infinity'), None]:
+        try:
+            DecimalValidator().to_python(value)
+        except ValidationException as e:
+            messages.append(e._msg)
+    nose.tools.eq_(messages, ['Please enter a decimal number.'] * 4)
+
+
+@raises(ValidationException)
+def test_decimal_range_fail():
+    DecimalValidator(min=0).to_python('-0.5')
+
+
 @raises(ValidationException)
 def test_float_range_fail():
     value = '00abc'
@@ -421,3 +574,251 @@ def test_enum_init_pass():
     actual = validator_inst.to_python('singleShot')
     nose.tools.eq_(actual, 'singleShot')
 
+
+def test_integer_to_python_many_pass():
+    nose.tools.eq_(NonNegativeInteger().to_python_many(['1', '22', '0']),
+                   ([1, 22, 0], []))
+
+
+def test_integer_to_python_many_fail():
+    results, errors = NonNegativeInteger().to_python_many(['1', 'x', '-1'])
+    nose.tools.eq_([results, [index for index, e in errors]], [[1, None, None], [1, 2]])
+
+
+def test_float_to_python_many_fail():
+    results, errors = NonNegativeFloat().to_python_many(['1.5', '-1'])
+    nose.tools.eq_([results, [index for index, e in errors]], [[1.5, None], [1]])
+
+
+def test_integer_to_python_many_hexadecimal_pass():
+    nose.tools.eq_(IntegerValidator().to_python_many(['0x10', '3', 4]), ([16, 3, 4], []))
+
+
+def test_integer_to_python_many_lexical_fail():
+    results, errors = IntegerValidator().to_python_many(['1', '1_0', ' 2 '])
+    nose.tools.eq_([results, [index for index, e in errors]], [[1, None, 2], [1]])
+
+
+def test_float_to_python_many_lexical_fail():
+    results, errors = FloatValidator().to_python_many(['1.5', 'nan', 'INF'])
+    nose.tools.eq_([results, [index for index, e in errors]], [[1.5, None, float('inf')], [1]])
+
+
+def test_integer_to_python_many_vectorized_lexical_fail():
+    results, errors = IntegerValidator().to_python_many(numpy_values(['1', '1_0']))
+    nose.tools.eq_([results[:2], [index for index, e in errors[:2]]], [[1, None], [1, 3]])
+
+
+def test_regex_to_python_many_pass():
+    results, errors = NCName().to_python_many(['a1', 'b_2', '1c'])
+    nose.tools.eq_([results, [index for index, e in errors]], [['a1', 'b_2', None], [2]])
+
+
+def test_name_to_python_many_fail():
+    results, errors = Name().to_python_many(['a:b', 'a:b:c'])
+    nose.tools.eq_([results, [index for index, e in errors]], [['a:b', None], [1]])
+
+
+def test_string_facets_pass():
+    check = string_facets(2, 4, r'^[a-z]+$', False)
+    nose.tools.eq_([check(value) for value in ['ab', 'abcd', 'a', 'abcde', 'aB', 21]],
+                   [True, True, False, False, False, False])
+
+
+def test_string_facets_shared_pass():
+    nose.tools.eq_(NCName()._check is NCName()._check, True)
+
+
+def test_string_facets_collapse_pass():
+    check = string_facets(collapse=True)
+    nose.tools.eq_([check(value) for value in [' a b ', 'a  b', None]], [True, False, False])
+
+
+def test_string_validator_pickle_pass():
+    validator = pickle.loads(pickle.dumps(RegexValidator(regex=r'^\d+$', maxLength=3)))
+    nose.tools.eq_([validator.to_python('123'), validator._check('1234'),
+                    validator._check is string_facets(None, 3, r'^\d+$', False)],
+                   ['123', False, True])
+
+
+def test_string_validator_facet_order_fail():
+    messages = []
+    validator = RegexValidator(regex=r'^\d+$', minLength=3)
+    for value in [21, 'a', 'abc', '123']:
+        try:
+            validator.to_python(value)
+        except ValidationException as e:
+            messages.append(e._msg)
+    nose.tools.eq_(messages, ['Expecting value of type six.string_types.',
+                              ('Expecting value greater than %d', 3),
+                              'The input is not valid'])
+
+
+def test_string_validator_to_python_many_fail():
+    results, errors = StringValidator(maxLength=3).to_python_many(['abc', 'abcd', None])
+    nose.tools.eq_([results, [index for index, e in errors]], [['abc', None, None], [1, 2]])
+
+
+def test_enum_to_python_many_pass():
+    results, errors = DriverType().to_python_many(['clock', 'CLOCK', 'other'])
+    nose.tools.eq_([results, [index for index, e in errors]],
+                   [['clock', 'clock', None], [2]])
+
+
+def numpy_values(values):
+    from xvalidator import vectorized
+    if vectorized.numpy is None:
+        raise nose.SkipTest('NumPy is not installed.')
+    return values * vectorized.MIN_VALUES
+
+
+def test_integer_to_python_many_vectorized_fail():
+    results, errors = NonNegativeInteger().to_python_many(numpy_values(['1', '-2']))
+    nose.tools.eq_([results[:2], [index for index, e in errors[:2]], len(errors),
+                    errors[0][1]._value, type(results[0])],
+                   [[1, None], [1, 3], len(results) // 2, -2, int])
+
+
+def test_float_to_python_many_vectorized_pass():
+    results, errors = NonNegativeFloat().to_python_many(numpy_values(['1.5', '2']))
+    nose.tools.eq_([results[:2], errors], [[1.5, 2.0], []])
+
+
+def test_float_to_python_many_vectorized_none_fail():
+    results, errors = FloatValidator().to_python_many(numpy_values(['1.5', None]))
+    nose.tools.eq_([results[:2], errors[0][0]], [[1.5, None], 1])
+
+
+StubDtype = namedtuple('StubDtype', 'kind')
+
+
+class StubArray(list):
+    """
+    The part of a NumPy array vectorized uses, so its branch of
+    to_python_many is tested without NumPy.
+    """
+
+    def __init__(self, values, kind):
+        super(StubArray, self).__init__(values)
+        self.dtype = StubDtype(kind)
+
+    def tolist(self):
+        return list(self)
+
+    def __lt__(self, other):
+        return StubArray([value < other for value in self], 'b')
+
+    def __gt__(self, other):
+        return StubArray([value > other for value in self], 'b')
+
+    def __or__(self, other):
+        return StubArray([a or b for a, b in zip(self, other)], 'b')
+
+
+class StubNumpy(object):
+    arrays = 0
+
+    @classmethod
+    def array(cls, values, dtype):
+        cls.arrays += 1
+        if dtype == 'int64':
+            return StubArray([int(value) for value in values], 'i')
+        return StubArray([float('nan') if value is None else float(value)
+                          for value in values], 'f')
+
+    @staticmethod
+    def isnan(array):
+        return StubArray([value != value for value in array], 'b')
+
+    @staticmethod
+    def flatnonzero(array):
+        return StubArray([index for index, value in enumerate(array) if value], 'i')
+
+    @staticmethod
+    def zeros(length, dtype):
+        return StubArray([False] * length, 'b')
+
+
+def test_to_python_many_vectorized_stub_fail():
+    numpy = vectorized.numpy
+    vectorized.numpy = StubNumpy
+    StubNumpy.arrays = 0
+    try:
+        results = [validator.to_python_many(values * vectorized.MIN_VALUES)
+                   for validator, values in [(NonNegativeInteger(), ['1', '-2']),
+                                             (NonNegativeFloat(), ['1.5', '-2']),
+                                             (FloatValidator(), ['1.5', None])]]
+    finally:
+        vectorized.numpy = numpy
+    nose.tools.eq_([[(values[:2], [index for index, e in errors[:2]], len(errors))
+                     for values, errors in results], StubNumpy.arrays],
+                   [[([1, None], [1, 3], 1000), ([1.5, None], [1, 3], 1000),
+                     ([1.5, None], [1, 3], 1000)], 3])
+
+
+def test_integer_to_python_many_without_numpy_pass():
+    from xvalidator import vectorized
+    numpy = vectorized.numpy
+    vectorized.numpy = None
+    try:
+        results, errors = PositiveInteger().to_python_many(['1', '0'] * 1000)
+    finally:
+        vectorized.numpy = numpy
+    nose.tools.eq_([results[:2], len(errors)], [[1, None], 1000])
+
+
+def test_enum_class_tables_shared_pass():
+    nose.tools.eq_(DriverType().lookup_lower is DriverType().lookup_lower, True)
+
+
+def test_build_keeps_validators_unchanged_pass():
+    validators = [EnumValidator(options=['a', 'b']), BooleanValidator()]
+    before = [dict(validator.__dict__) for validator in validators]
+    actual = [validator.build() for validator in validators]
+    nose.tools.eq_([actual[0] in ('a', 'b'), actual[1] in (True, False),
+                    [validator.__dict__ for validator in validators]],
+                   [True, True, before])
+
+
+def test_enum_casefold_pass():
+    if casefold('\xdf') == '\xdf':
+        raise nose.SkipTest('str.casefold is not available.')
+    validator_inst = EnumValidator(options=['stra\xdfe'])
+    actual = validator_inst.to_python('STRASSE')
+    utils.msg_counter.reset()
+    nose.tools.eq_(actual, 'stra\xdfe')
+
+
+@raises(ValidationException)
+def test_enum_match_lower_false_fail():
+    EnumValidator(options=['clock'], matchLower=False).to_python('CLOCK')
+
+
+def test_enum_large_message_pass():
+    validator_inst = EnumValidator(options=['v%d' % index for index in range(30000)])
+    try:
+        validator_inst.to_python('other')
+    except ValidationException as e:
+        message = e._msg
+    nose.tools.eq_(message.endswith('v19; ... (29980 more) (not %r)' % 'other'), True)
+
+
+def test_enum_non_ascii_message_pass():
+    try:
+        EnumValidator(options=['stra\xdfe'], matchLower=False).to_python('other')
+    except ValidationException as e:
+        message = e._msg
+    nose.tools.eq_(message, 'Value must be one of: stra\xdfe (not %r)' % 'other')
+
+
+def test_enum_from_file_pass():
+    directory = tempfile.mkdtemp()
+    try:
+        file_name = os.path.join(directory, 'vendors.txt')
+        with io.open(file_name, 'w', encoding='utf-8') as options_file:
+            options_file.write('# vendors\nacme\n\nglobex \n')
+        validator_inst = EnumValidator.from_file(file_name)
+        nose.tools.eq_([validator_inst.options, validator_inst.to_python('globex')],
+                       [['acme', 'globex'], 'globex'])
+    finally:
+        shutil.rmtree(directory)
@@ -17,12 +17,25 @@ __license__ = 'BSD 3-Clause'
 __copyright__ = 'Copyright 2014 Bernd Meyer'
 
 from .constraints import Stores,InitKeyStore, InitUniqueStore, \
-    ID, IDREF, KeyName, UniqueName
+    ID, IDREF, KeyName, UniqueName, CheckCompositeKeys, CheckCompositeUniques, \
+    AddCompositeKeyRef
 from .element import Element, create_element, Document, create_document
 from .schemas import ElementSchema, SequenceSchema
+from .sqlstores import SqliteStores
+from .corpus import Corpus
+from .refgraph import ReferenceGraph
+from .profiling import SchemaProfiler
+from .caching import CachedValidator
+from .purity import SchemaPurity, is_pure, cache_pure_validators
+from .memo import SubtreeMemo
+from .metrics import MetricsSink, InMemoryMetrics, render_prometheus
+from .reporting import ErrorRecord, CollectingReporter, LoggingReporter, \
+    JsonLinesReporter, AggregatingReporter
+from .validation import validate, revalidate, ValidationBudget, \
+    ValidationReport, ValidationCancelled
 from .validators import StringValidator, Token, Name, NCName, Language, \
     NMTOKEN, IntegerValidator, NonNegativeInteger, PositiveInteger, \
-    NegativeInteger, FloatValidator, NonNegativeFloat, BooleanValidator, \
-    EnumValidator, RegexValidator, ValidationException, Validator
+    NegativeInteger, FloatValidator, NonNegativeFloat, DecimalValidator, \
+    BooleanValidator, EnumValidator, RegexValidator, ValidationException, Validator
 from .schemas import Choice, ElementSchema, SequenceSchema, SELF
 #import element, utils
\ No newline at end of file
@@ -0,0 +1,107 @@
+from __future__ import unicode_literals
+from collections import OrderedDict
+
+from xvalidator import utils
+from xvalidator.validators import Validator, ValidationException
+
+
+__author__ = 'bernd'
+
+
+class CachedValidator(Validator):
+    """
+    Wraps a validator without side effects and caches its results by value,
+    so repeated values like enum strings, names or small numbers are only
+    converted once:
+
+        ElementSchema('name', validator=CachedValidator(NCName(), maxsize=4096))
+
+    Values failing validation are cached with their message and raise the
+    same ValidationException again. Results are only cached if the call
+    reported no error or warning, like the spelling warning of
+    EnumValidator, so those are reported for every occurrence. Unhashable
+    values are not cached. The least recently used values are evicted once
+    maxsize values are cached.
+    """
+
+    def __init__(self, validator, maxsize=1024):
+        assert isinstance(validator, Validator), \
+            'validator:%r must be an instance of xvalidator.Validator' % validator
+        assert not validator.has_side_effects, \
+            '%s has side effects and can not be cached.' % validator
+        assert maxsize > 0, 'maxsize must be positive'
+        self.validator = validator
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __str__(self):
+        return '%s' % self.validator
+
+    def to_python(self, value, **kwargs):
+        try:
+            key = (type(value), value)
+            entry = self._cache.pop(key)
+        except TypeError:
+            return self.validator.to_python(value, **kwargs)
+        except KeyError:
+            self.misses += 1
+            return self._convert(key, value, **kwargs)
+        self.hits += 1
+        self._cache[key] = entry
+        result, error = entry
+        if error is not None:
+            raise ValidationException(error, value)
+        return result
+
+    def _convert(self, key, value, **kwargs):
+        messages = utils.msg_counter.errors + utils.msg_counter.warnings
+        entry = None
+        try:
+            result = self.validator.to_python(value, **kwargs)
+            entry = (result, None)
+        except ValidationException as e:
+            entry = (None, e._msg)
+            raise
+        finally:
+            if entry is not None and \
+                    utils.msg_counter.errors + utils.msg_counter.warnings == messages:
+                self._store(key, entry)
+        return result
+
+    def _store(self, key, entry):
+        self._cache[key] = entry
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def size(self):
+        return len(self._cache)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups:
+            return self.hits / float(lookups)
+        return None
+
+    def stats(self):
+        return OrderedDict([
+            ('validator', '%s' % self.validator),
+            ('maxsize', self.maxsize),
+            ('size', self.size),
+            ('hits', self.hits),
+            ('misses', self.misses),
+            ('evictions', self.evictions),
+            ('hit_rate', self.hit_rate),
+        ])
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def build(self, *args, **kwargs):
+        return self.validator.build(*args, **kwargs)
@@ -1,10 +1,11 @@
 from __future__ import unicode_literals
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 import logging
 
 import utils
 from py2to3 import string_types
 
+from xvalidator.pathindex import PathIndex
 from xvalidator.validators import Validator, ValidationException, NCName, Name
 
 
@@ -13,10 +14,37 @@ logger = logging.getLogger(__name__)
 KeyRef = namedtuple('KeyRef', 'key_name key_value ref_path')
 
 
+def in_subtree(path, prefix):
+    """
+    True if path is prefix or the path of an element or attribute below it.
+    """
+    return path == prefix or path.startswith((prefix + '/', prefix + '@'))
+
+
 class KeyStore(object):
+    """
+    Key values can be strings or, for keys combining several fields, tuples.
+    _target_order numbers the targets, by 'key_name:target_path', in the
+    order their keys were added and _target_values maps the numbers to the
+    values of the targets. _value_index maps (key_name, key_value) to the
+    number of the target added first holding the value, the one match_ref
+    returns, so it does not have to scan all targets; the numbers of other
+    targets holding it are kept in _shadowed.
+
+    _paths is a PathIndex of the targets and values by path, which makes
+    retract proportional to what the subtree contributed. It is only built
+    by the first retract and kept up to date from then on.
+    """
+
     def __init__(self):
         self._key_index = {}
         self._keys = {}
+        self._value_index = {}
+        self._shadowed = {}
+        self._target_order = {}
+        self._target_values = {}
+        self._next_target = 0
+        self._paths = None
 
     def add_key(self, key_names, target_path):
         if isinstance(key_names, list):
@@ -29,10 +57,14 @@ class KeyStore(object):
                 raise ValidationException('Key %s does already exist.' % key,
                                           target_path)
             if not key_name in self._key_index:
-                self._key_index[key_name] = [target_path]
+                self._key_index[key_name] = OrderedDict([(target_path, True)])
             else:
-                self._key_index[key_name].append(target_path)
-            self._keys[key] = {}
+                self._key_index[key_name][target_path] = True
+            self._keys[key] = self._target_values[self._next_target] = {}
+            self._target_order[key] = self._next_target
+            self._next_target += 1
+            if self._paths is not None:
+                self._paths.add(target_path, (key_name, target_path, None))
 
     def in_keys(self, key_name, target_path):
         return '%s:%s' % (key_name, target_path) in self._keys
@@ -50,23 +82,64 @@ class KeyStore(object):
                                                                    key_name,
                                                                    key_path)
                     raise ValidationException(msg, key_value)
-                self._keys[key][key_value] = key_path
+                values = self._keys[key]
+                values[key_value] = key_path
+                index_key = (key_name, key_value)
+                target = self._target_order[key]
+                first = self._value_index.get(index_key)
+                if first is None:
+                    self._value_index[index_key] = target
+                else:
+                    if target < first:
+                        self._value_index[index_key], target = target, first
+                    self._shadowed.setdefault(index_key, []).append(target)
+                if self._paths is not None:
+                    self._paths.add(key_path, (key_name, target_path, key_value))
                 return True
         msg = 'Could not find target path %s for key name(s) %s' % (target_path,
                                                                     ', '.join(key_names_list))
         raise ValidationException(msg, key_value)
 
-    def match_ref(self, key_name, ref_key_value):
+    def add_values(self, key_names, target_path, values):
+        """
+        Adds (key_value, key_path) pairs under the same target path. Values
+        preceding a duplicate remain in the store.
+        """
+        count = 0
+        for key_value, key_path in values:
+            self.add_value(key_names, target_path, key_value, key_path)
+            count += 1
+        return count
+
+    def key_targets(self):
+        """
+        Yields (key_name, target_path, {key_value: key_path}) in the order
+        the keys were added.
+        """
+        for key_name, target_paths in self._key_index.items():
+            for target_path in target_paths:
+                yield key_name, target_path, self._keys['%s:%s' % (key_name, target_path)]
+
+    def match_ref(self, key_name, ref_key_value, prefix=None):
+        """
+        Returns the key path of ref_key_value in the target added first.
+        With prefix only key paths in the subtree at prefix are matched.
+        """
         if not key_name in self._key_index:
             raise ValidationException('No key for %s exists' % key_name,
                                       key_name)
-        for key_path in self._key_index[key_name]:
-            key = '%s:%s' % (key_name, key_path)
-            for key_value, instance_path in self._keys[key].items():
-                if key_value == ref_key_value:
-                    return instance_path
-        raise ValidationException('Could not match ref %s for %s' % (
-            ref_key_value, key_name), ref_key_value)
+        index_key = (key_name, ref_key_value)
+        target = self._value_index.get(index_key)
+        targets = self._target_values
+        if target is not None and prefix is not None and \
+                not in_subtree(targets[target][ref_key_value], prefix):
+            target = min([item for item in self._shadowed.get(index_key, ())
+                          if in_subtree(targets[item][ref_key_value], prefix)]
+                         or [None])
+        if target is None:
+            raise ValidationException('Could not match ref %s for %s' % (
+                ref_key_value, key_name), ref_key_value)
+        return targets[target][ref_key_value]
 
     def key_value_count(self, key_name, target_path):
         key = '%s:%s' % (key_name, target_path)
@@ -74,6 +147,80 @@ class KeyStore(object):
             return len(self._keys[key])
         return 0
 
+    def target_count(self):
+        return len(self._keys)
+
+    def _build_paths(self):
+        self._paths = PathIndex()
+        for key_name, target_path, values in self.key_targets():
+            self._paths.add(target_path, (key_name, target_path, None))
+            for key_value, key_path in values.items():
+                self._paths.add(key_path, (key_name, target_path, key_value))
+
+    def retract(self, prefix):
+        """
+        Removes the keys with a target path and the values with a key path
+        in the subtree at prefix. Returns the removed (key_name, key_value,
+        key_path) triples.
+        """
+        if self._paths is None:
+            self._build_paths()
+        contributions = self._paths.pop_subtree(prefix)
+        removed = []
+        unindexed = []
+        removed_targets = []
+        for key_name, target_path, key_value in contributions:
+            if key_value is not None:
+                continue
+            key = '%s:%s' % (key_name, target_path)
+            values = self._keys.pop(key, None)
+            if values is None:
+                continue
+            target = self._target_order.pop(key)
+            removed_targets.append(target)
+            removed.extend((key_name, value, key_path)
+                           for value, key_path in values.items())
+            unindexed.extend((key_name, value, target) for value in values)
+            target_paths = self._key_index[key_name]
+            del target_paths[target_path]
+            if not target_paths:
+                del self._key_index[key_name]
+        for key_name, target_path, key_value in contributions:
+            if key_value is None:
+                continue
+            key = '%s:%s' % (key_name, target_path)
+            values = self._keys.get(key)
+            if values is None or not in_subtree(values.get(key_value, ''), prefix):
+                continue
+            removed.append((key_name, key_value, values.pop(key_value)))
+            unindexed.append((key_name, key_value, self._target_order[key]))
+        for key_name, key_value, target in unindexed:
+            self._unindex(key_name, key_value, target)
+        for target in removed_targets:
+            del self._target_values[target]
+        return removed
+
+    def _unindex(self, key_name, key_value, target):
+        """
+        Removes key_value of the target numbered target from the index.
+        """
+        index_key = (key_name, key_value)
+        shadowed = self._shadowed.get(index_key)
+        if self._value_index.get(index_key) == target:
+            if shadowed:
+                first = min(shadowed)
+                shadowed.remove(first)
+                self._value_index[index_key] = first
+            else:
+                del self._value_index[index_key]
+        elif shadowed:
+            shadowed[:] = [item for item in shadowed if item != target]
+        if index_key in self._shadowed and not shadowed:
+            del self._shadowed[index_key]
+
+    def total_value_count(self):
+        return sum(len(values) for values in self._keys.values())
+
     @property
     def keys(self):
         return {key: value for key, value in self._keys.items()}
@@ -88,34 +235,93 @@ class IDStore(KeyStore):
         super(IDStore, self).add_key(self.key_name, self.path)
 
     def add_id(self, key_value, key_path):
-        super(IDStore, self).add_value(self.key_name, self.path,
-                                       key_value, key_path)
+        self.add_value(self.key_name, self.path, key_value, key_path)
 
     def match_id(self, ref_key_value):
-        return super(IDStore, self).match_ref(self.key_name, ref_key_value)
+        return self.match_ref(self.key_name, ref_key_value)
 
     def id_count(self):
-        return super(IDStore, self).key_value_count(self.key_name, self.path)
+        return self.key_value_count(self.key_name, self.path)
 
 
 class RefStore(object):
+    """
+    References in the order they were added. Like KeyStore it builds a
+    PathIndex of the references and an index of ref paths by target on the
+    first retract or clear_targets, so later ones only touch the references
+    concerned.
+    """
+
     def __init__(self):
-        self._refs = []
+        self._refs = OrderedDict()
         self._targets = {}
+        self._next = 0
+        self._paths = None
+        self._by_target = None
 
     def add_key_ref(self, key_name, key_value, ref_path):
         if not key_value:
             raise ValidationException('key value is required', key_value)
-        self._refs.append(KeyRef(key_name, key_value, ref_path))
+        self._refs[self._next] = KeyRef(key_name, key_value, ref_path)
+        if self._paths is not None:
+            self._paths.add(ref_path, self._next)
+        self._next += 1
 
     def set_target(self, ref_path, target_path):
         if ref_path in self._targets:
             raise ValidationException('Target for ref_path already exists.', ref_path)
         self._targets[ref_path] = target_path
+        if self._by_target is not None:
+            self._by_target.setdefault(target_path, []).append(ref_path)
+
+    def ref_count(self):
+        return len(self._refs)
+
+    def has_target(self, ref_path):
+        return ref_path in self._targets
+
+    def _forget_target(self, ref_path):
+        target_path = self._targets.pop(ref_path, None)
+        if target_path is not None and self._by_target is not None:
+            ref_paths = self._by_target[target_path]
+            ref_paths.remove(ref_path)
+            if not ref_paths:
+                del self._by_target[target_path]
+
+    def retract(self, prefix):
+        """
+        Removes the references with a ref path in the subtree at prefix and
+        returns them.
+        """
+        if self._paths is None:
+            self._paths = PathIndex()
+            for index, ref in self._refs.items():
+                self._paths.add(ref.ref_path, index)
+        removed = [self._refs.pop(index) for index in
+                   sorted(self._paths.pop_subtree(prefix))]
+        for ref in removed:
+            self._forget_target(ref.ref_path)
+        return removed
+
+    def clear_targets(self, target_paths):
+        """
+        Forgets the targets of references matched with one of target_paths
+        and returns the ref paths concerned.
+        """
+        if self._by_target is None:
+            self._by_target = {}
+            for ref_path, target_path in self._targets.items():
+                self._by_target.setdefault(target_path, []).append(ref_path)
+        cleared = []
+        for target_path in target_paths:
+            for ref_path in self._by_target.pop(target_path, ()):
+                del self._targets[ref_path]
+                cleared.append(ref_path)
+        return cleared
 
     @property
     def refs(self):
-        return [ref for ref in self._refs]
+        return list(self._refs.values())
 
     @property
     def targets(self):
@@ -137,6 +343,41 @@ class Stores(object):
         self.refStore = RefStore()
         self.idrefStore = IDREFStore()
 
+    def retract(self, prefix):
+        """
+        Removes everything the subtree at prefix added to the stores and
+        clears the targets of references matched with its keys and IDs.
+        Returns the ref paths whose targets were cleared.
+        """
+        self.uniquesStore.retract(prefix)
+        self.refStore.retract(prefix)
+        self.idrefStore.retract(prefix)
+        cleared = self.refStore.clear_targets(set(
+            key_path for _, _, key_path in self.keyStore.retract(prefix)))
+        cleared.extend(self.idrefStore.clear_targets(set(
+            key_path for _, _, key_path in self.idStore.retract(prefix))))
+        return cleared
+
+
+def ancestor_path(path, level, ancestors=None):
+    """
+    Returns the path of the ancestor level steps above path.
+
+    ancestors is the (parent_path, grand_parent_ancestors) chain
+    SequenceSchema passes down with the kwargs, so the ancestor is found by
+    following level links. Without a chain, or if the chain is shorter than
+    level, the ancestor path is derived from path itself.
+    """
+    node = ancestors
+    if level > 0:
+        for step in range(level - 1):
+            if node is None:
+                break
+            node = node[1]
+        if node is not None:
+            return node[0]
+    return '/'.join(path.split('/')[:-level])
+
 
 def get_value_path_stores(value, **kwargs):
     messages = dict(
@@ -158,6 +399,7 @@ class InitStores(Validator):
     Creates an empty dict under
     stores.keyStore[keyName:keyTargetInstancePath]
     """
+    has_side_effects = True
     key_names = None
     unique_names = None
     messages = dict(
@@ -201,6 +443,7 @@ class InitUniqueStore(InitKeyStore):
 class AddKeyRef(Validator):
     """
     """
+    has_side_effects = True
     string_validator_instance = None
     refer_key_name = None
     messages = dict(
@@ -218,7 +461,8 @@ class AddKeyRef(Validator):
         return string_value
 
     def build(self, *args, **kwargs):
-        self.default_build_value = self.refer_key_name + '0'
+        if not args:
+            args = (self.refer_key_name + '0',)
         return super(AddKeyRef, self).build(*args, **kwargs)
 
 
@@ -247,6 +491,7 @@ class CheckKeys(Validator):
     present (duplicate error). If not it adds the element.value as key
     and element.path as value.
     """
+    has_side_effects = True
     not_empty = True
     string_validator_instance = None
     key_names = None
@@ -286,7 +531,7 @@ class CheckKeys(Validator):
             string_value = self.string_validator_instance.to_python(key_value)
         else:
             string_value = key_value
-        target_path = '/'.join(path.split('/')[:-self.level])
+        target_path = ancestor_path(path, self.level, kwargs.get('ancestors'))
         if self.refer_key_name:
             stores.refStore.add_key_ref(self.refer_key_name, key_value, path)
         self.add_value(stores, target_path, string_value, path)
@@ -296,10 +541,10 @@ class CheckKeys(Validator):
         if self.key_names:
             stores.keyStore.add_value(self.key_names, target_path, value, path)
 
-    def gen_key_value(self, store, path):
+    def gen_key_value(self, store, path, ancestors=None):
         suffix = '0'
         name = ''
-        target_path = '/'.join(path.split('/')[:-self.level])
+        target_path = ancestor_path(path, self.level, ancestors)
         for key_name in self.key_names:
             if store.in_keys(key_name, target_path):
                 name = key_name
@@ -309,12 +554,13 @@ class CheckKeys(Validator):
             return self.refer_key_name + suffix
         return name + suffix
 
-    def gen_default_build_value(self, stores, path):
-        return self.gen_key_value(stores.keyStore, path)
+    def gen_default_build_value(self, stores, path, ancestors=None):
+        return self.gen_key_value(stores.keyStore, path, ancestors)
 
     def build(self, *args, **kwargs):
-        key_value, path, stores = get_value_path_stores(None, **kwargs)
-        self.default_build_value = self.gen_default_build_value(stores, path)
+        if not args:
+            key_value, path, stores = get_value_path_stores(None, **kwargs)
+            args = (self.gen_default_build_value(stores, path, kwargs.get('ancestors')),)
         return super(CheckKeys, self).build(*args, **kwargs)
 
 
@@ -326,8 +572,9 @@ class CheckUniques(CheckKeys):
         if self.key_names:
             stores.uniquesStore.add_value(self.key_names, target_path, value, path)
 
-    def gen_default_build_value(self, stores, path):
-        return super(CheckUniques, self).gen_key_value(stores.uniquesStore, path)
+    def gen_default_build_value(self, stores, path, ancestors=None):
+        return super(CheckUniques, self).gen_key_value(stores.uniquesStore,
+                                                       path, ancestors)
 
 
 class KeyName(CheckKeys):
@@ -348,6 +595,144 @@ class UniqueName(CheckUniques):
     string_validator_instance = Name()
 
 
+def field_values(element, fields):
+    """
+    Returns the values of fields as a tuple. A field is either the tag of a
+    child element or an attribute name prefixed with @. Missing fields are
+    None.
+    """
+    attributes = element.attributes or {}
+    children = {}
+    if isinstance(element.value, list):
+        for child in reversed(element.value):
+            tag = getattr(child, 'tag', None)
+            if tag is not None:
+                children[tag] = child.value
+    return tuple(attributes.get(field[1:]) if field[0] == '@'
+                 else children.get(field) for field in fields)
+
+
+class CheckCompositeKeys(Validator):
+    """
+    Key made of several fields of an element, like an xs:key with more than
+    one xs:field. The field values are combined into a tuple which is stored
+    in stores.keyStore under the ancestor level steps above the element, so
+    duplicates are found with one dict lookup per element.
+
+    Unlike CheckKeys it is applied to the whole element after its children
+    and attributes were validated, through ElementSchema(constraints=[...]).
+    """
+    has_side_effects = True
+    not_empty = True
+    key_names = None
+    fields = None
+    refer_key_name = None
+    level = None
+    messages = dict(
+        names='key_names (type list of strings or string) is required.',
+        fields='fields (type list of strings) is required.',
+        missing='Missing field(s) %(fields)s for key %(key)s.',
+    )
+
+    def __init__(self, **kwargs):
+        super(CheckCompositeKeys, self).__init__(**kwargs)
+        assert self.key_names, self.messages['names']
+        if isinstance(self.key_names, string_types):
+            self.key_names = [self.key_names]
+        for name in self.key_names:
+            assert isinstance(name, string_types), self.messages['names']
+        assert self.fields and isinstance(self.fields, list), self.messages['fields']
+        for field in self.fields:
+            assert field and isinstance(field, string_types), self.messages['fields']
+        assert isinstance(self.level, int)
+
+    def __str__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(self.key_names))
+
+    def key_value(self, element):
+        key_value = field_values(element, self.fields)
+        missing = [field for field, value in zip(self.fields, key_value)
+                   if value is None or value == '']
+        if missing:
+            if len(missing) == len(self.fields) and not self.not_empty:
+                return None
+            raise ValidationException(self.messages['missing'] % dict(
+                fields=', '.join(missing), key=', '.join(self.key_names)),
+                key_value)
+        return key_value
+
+    def to_python(self, element, **kwargs):
+        ignored, path, stores = get_value_path_stores(element, **kwargs)
+        key_value = self.key_value(element)
+        if key_value is None:
+            return key_value
+        target_path = ancestor_path(path, self.level, kwargs.get('ancestors'))
+        if self.refer_key_name:
+            stores.refStore.add_key_ref(self.refer_key_name, key_value, path)
+        self.add_value(stores, target_path, key_value, path)
+        return key_value
+
+    def add_value(self, stores, target_path, value, path):
+        stores.keyStore.add_value(self.key_names, target_path, value, path)
+
+    def build(self, element=None, **kwargs):
+        """
+        The key is made of the fields built for the element, so it is
+        returned as it is.
+        """
+        return element
+
+
+class CheckCompositeUniques(CheckCompositeKeys):
+    """
+    Like CheckCompositeKeys but stored in stores.uniquesStore. Elements
+    without any of the fields are ignored.
+    """
+    not_empty = False
+
+    def add_value(self, stores, target_path, value, path):
+        stores.uniquesStore.add_value(self.key_names, target_path, value, path)
+
+
+class AddCompositeKeyRef(Validator):
+    """
+    Reference to a CheckCompositeKeys key, like an xs:keyref with more than
+    one xs:field. The field values are matched as a tuple by match_refs.
+    """
+    has_side_effects = True
+    refer_key_name = None
+    fields = None
+    messages = dict(
+        name='refer_key_name (string) is required.',
+        fields='fields (type list of strings) is required.',
+        missing='Missing field(s) %(fields)s for reference to %(key)s.',
+    )
+
+    def __init__(self, refer_key_name, fields, **kwargs):
+        super(AddCompositeKeyRef, self).__init__(**kwargs)
+        assert refer_key_name and isinstance(refer_key_name, string_types), \
+            self.messages['name']
+        assert fields and isinstance(fields, list), self.messages['fields']
+        self.refer_key_name = refer_key_name
+        self.fields = fields
+
+    def __str__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.refer_key_name)
+
+    def to_python(self, element, **kwargs):
+        ignored, path, stores = get_value_path_stores(element, **kwargs)
+        key_value = field_values(element, self.fields)
+        missing = [field for field, value in zip(self.fields, key_value)
+                   if value is None or value == '']
+        if missing:
+            raise ValidationException(self.messages['missing'] % dict(
+                fields=', '.join(missing), key=self.refer_key_name), key_value)
+        stores.refStore.add_key_ref(self.refer_key_name, key_value, path)
+        return key_value
+
+    def build(self, element=None, **kwargs):
+        return element
+
 
 class ID(NCName):
     """
@@ -358,6 +743,7 @@ class ID(NCName):
     must be unique within an XML instance, regardless of the attribute's name
     or its element name.
     """
+    has_side_effects = True
     not_empty = True
 
     def to_python(self, value, **kwargs):
@@ -367,8 +753,9 @@ class ID(NCName):
         return value
 
     def build(self, *args, **kwargs):
-        key_value, path, stores = get_value_path_stores(None, **kwargs)
-        self.default_build_value = 'testId' + str(stores.idStore.id_count())
+        if not args:
+            key_value, path, stores = get_value_path_stores(None, **kwargs)
+            args = ('testId' + str(stores.idStore.id_count()),)
         return super(ID, self).build(*args, **kwargs)
 
 
@@ -381,6 +768,7 @@ class IDREF(NCName):
     must be unique within an XML instance, regardless of the attribute's name
     or its element name.
     """
+    has_side_effects = True
     default_build_value = 'testId0'
     not_empty = True
 
@@ -391,9 +779,17 @@ class IDREF(NCName):
         return value
 
 
-def match_refs(stores):
+def match_refs(stores, budget=None):
+    """
+    Sets the targets of all references in stores and raises
+    ValidationException for the first one without a key or ID. With a
+    ValidationBudget the deadline is checked every budget.interval
+    references.
+    """
     def match_store_refs(key_store, ref_store):
-        for ref in ref_store.refs:
+        for index, ref in enumerate(ref_store.refs):
+            if budget is not None and not index % budget.interval:
+                budget.check_deadline(ref.ref_path)
             instance_path = key_store.match_ref(ref.key_name, ref.key_value)
             ref_store.set_target(ref.ref_path, instance_path)
             logger.debug('Successfully matched "%s/%s", got: %r'
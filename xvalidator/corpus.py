@@ -0,0 +1,402 @@
+from __future__ import unicode_literals
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+from multiprocessing import Pool
+from timeit import default_timer
+
+from xvalidator import utils
+from xvalidator.constraints import Stores
+from xvalidator.element import count_elements, create_document
+from xvalidator.metrics import timed, record_messages, record_store_sizes
+from xvalidator.refgraph import ReferenceGraph
+from xvalidator.validation import ValidationBudget, ValidationCancelled
+from xvalidator.validators import ValidationException
+
+
+__author__ = 'bernd'
+
+logger = logging.getLogger(__name__)
+
+SOURCE_SEPARATOR = '#'
+
+
+def qualify_path(source, path):
+    return '%s%s%s' % (source, SOURCE_SEPARATOR, path)
+
+
+def split_path(qualified_path):
+    source, _, path = qualified_path.partition(SOURCE_SEPARATOR)
+    return source, path
+
+
+def document_digest(xml_dict):
+    return hashlib.sha1(json.dumps(xml_dict).encode('utf-8')).hexdigest()
+
+
+def _validate_source(args):
+    """
+    Validates a single document against its own Stores. Module level so it
+    can be sent to worker processes. Returns the key targets of the keyStore
+    and idStore as (store_name, key_name, target_path, [(key_value,
+    key_path), ...]) and the references as (store_name, KeyRef) instead of
+    the Stores. With measure set the measurements item of the result holds
+    the parse and validation times, the element count and the messages by
+    kind; otherwise it is None. With max_errors validation stops after that
+    many errors, with timeout after that many seconds; the path it stopped
+    at and the cancellation message are returned.
+    """
+    schema, source, xml_dict, keep_document, measure, max_errors, timeout = args
+    errors = utils.msg_counter.errors
+    warnings = utils.msg_counter.warnings
+    if measure:
+        kinds = dict(utils.msg_counter.kinds)
+        start = default_timer()
+    document = create_document(source, xml_dict)
+    stores = Stores()
+    if measure:
+        created = default_timer()
+    budget = ValidationBudget(max_errors, timeout)
+    cancelled = None
+    if max_errors or timeout is not None:
+        try:
+            schema.to_python(document.root_element, stores=stores, budget=budget)
+        except ValidationCancelled as e:
+            budget.stopped_at = e.path
+            cancelled = '%s' % e
+    else:
+        schema.to_python(document.root_element, stores=stores)
+    measurements = None
+    if measure:
+        validated = default_timer()
+        measurements = dict(
+            create_document=created - start, validate=validated - created,
+            nodes=count_elements(document.root_element),
+            kinds=dict((kind, count - kinds.get(kind, 0))
+                       for kind, count in utils.msg_counter.kinds.items()
+                       if count != kinds.get(kind, 0)))
+    keys = [(name, key_name, target_path, list(values.items()))
+            for name in ('keyStore', 'idStore')
+            for key_name, target_path, values in getattr(stores, name).key_targets()]
+    refs = [('keyStore', ref) for ref in stores.refStore.refs] + \
+           [('idStore', ref) for ref in stores.idrefStore.refs]
+    return (source, keys, refs, utils.msg_counter.errors - errors,
+            utils.msg_counter.warnings - warnings,
+            document if keep_document else None, measurements,
+            (budget.stopped_at, cancelled))
+
+
+class DocumentReport(object):
+    """
+    Outcome of validating and resolving one document of a Corpus.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.errors = 0
+        self.warnings = 0
+        self.messages = []
+        self.targets = {}
+        self.unresolved = []
+        self.stopped_at = None
+        self.cancelled = None
+
+    def __repr__(self):
+        return 'DocumentReport(source=%r, errors=%d, warnings=%d, ' \
+               'unresolved=%d)' % (self.source, self.errors, self.warnings,
+                                   len(self.unresolved))
+
+    @property
+    def complete(self):
+        return self.stopped_at is None
+
+    @property
+    def valid(self):
+        return self.complete and not (self.errors or self.messages or self.unresolved)
+
+
+class _Entry(object):
+    """
+    What the corpus keeps of a document: its references and their targets
+    and, as (store_name, key_name, target_path, key_value, key_path), the
+    values that clashed with those of other documents. Its other keys and
+    IDs are only kept in the shared index.
+    """
+
+    def __init__(self, source, digest, refs, report, document):
+        self.source = source
+        self.digest = digest
+        self.report = report
+        self.document = document
+        self.refs = refs
+        self.rejected = []
+        self.targets = [None] * len(self.refs)
+        self.pending = set(range(len(self.refs)))
+
+
+class Corpus(object):
+    """
+    Validates many documents against one root ElementSchema and resolves
+    key and ID references across all of them.
+
+    Every document is validated with its own Stores. Its keys and IDs are
+    then merged into the shared stores (self.stores) with paths qualified by
+    the document source; only its references and the values clashing with
+    other documents are kept. resolve() matches each reference against the
+    document's own keys first and the shared index second. Documents whose
+    content did not change are not validated again, and only references
+    that may have been affected by a change are matched again.
+
+    stores_factory creates the shared stores, e.g. SqliteStores, to keep
+    the index out of memory. Keys a source left in persistent shared stores,
+    e.g. SqliteStores with a database file, are replaced when the source is
+    added again. With workers > 1 documents are validated in a
+    multiprocessing Pool, which requires the schema to be picklable.
+    metrics is a MetricsSink receiving document, element, message and
+    reference counts, stage times and the sizes of the shared stores.
+    With max_errors each document is only validated until that many errors
+    were found, with timeout for at most timeout seconds, see
+    ValidationBudget; its report is then not complete.
+    """
+
+    def __init__(self, schema, stores_factory=Stores, workers=0,
+                 keep_documents=False, metrics=None, max_errors=None, timeout=None):
+        self.schema = schema
+        self.max_errors = max_errors
+        self.timeout = timeout
+        self.metrics = metrics
+        self.stores_factory = stores_factory
+        self.stores = stores_factory()
+        self._stale = bool(self.stores.keyStore.target_count() or
+                           self.stores.idStore.total_value_count())
+        self.workers = workers
+        self.keep_documents = keep_documents
+        self._entries = OrderedDict()
+
+    def __contains__(self, source):
+        return source in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def sources(self):
+        return list(self._entries.keys())
+
+    @property
+    def reports(self):
+        return OrderedDict((source, entry.report)
+                           for source, entry in self._entries.items())
+
+    def document(self, source):
+        return self._entries[source].document
+
+    def add(self, source, xml_dict):
+        return self.add_many([(source, xml_dict)])[source]
+
+    def add_many(self, items):
+        """
+        Validates (source, xml_dict) pairs and merges their keys into the
+        shared index. Sources already in the corpus with identical content
+        are skipped. Returns the reports of the validated documents.
+        """
+        jobs = []
+        digests = {}
+        for source, xml_dict in items:
+            assert SOURCE_SEPARATOR not in source, \
+                'source may not contain "%s"' % SOURCE_SEPARATOR
+            digest = document_digest(xml_dict)
+            if source in self._entries and self._entries[source].digest == digest:
+                continue
+            digests[source] = digest
+            jobs.append((self.schema, source, xml_dict, self.keep_documents,
+                         self.metrics is not None, self.max_errors, self.timeout))
+        if self.workers > 1 and len(jobs) > 1:
+            pool = Pool(self.workers)
+            try:
+                results = pool.map(_validate_source, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_validate_source(job) for job in jobs]
+        replaced = [result[0] for result in results
+                    if result[0] in self._entries or self._stale]
+        for source in replaced:
+            self._entries.pop(source, None)
+        if replaced:
+            self._retract(replaced)
+        result = OrderedDict()
+        start = default_timer()
+        for source, keys, refs, errors, warnings, document, measurements, stopped \
+                in results:
+            report = DocumentReport(source)
+            report.errors = errors
+            report.warnings = warnings
+            report.stopped_at, report.cancelled = stopped
+            entry = _Entry(source, digests[source], refs, report, document)
+            self._entries[source] = entry
+            self._merge(entry, keys)
+            result[source] = report
+            if measurements is not None:
+                self._record(measurements)
+        if self.metrics is not None and results:
+            self.metrics.observe('stage_seconds', default_timer() - start, stage='merge')
+        self._invalidate(set(replaced) | set(result.keys()))
+        return result
+
+    def _record(self, measurements):
+        metrics = self.metrics
+        metrics.increment('documents_validated_total')
+        metrics.increment('nodes_validated_total', measurements['nodes'])
+        for stage in ('create_document', 'validate'):
+            metrics.observe('stage_seconds', measurements[stage], stage=stage)
+        if measurements['validate']:
+            metrics.set_gauge('nodes_per_second',
+                              measurements['nodes'] / measurements['validate'])
+        record_messages(metrics, measurements['kinds'])
+
+    def remove(self, source):
+        del self._entries[source]
+        self._retract([source])
+        self._invalidate({source})
+
+    def _retract(self, sources):
+        """
+        Removes the keys and IDs of sources from the shared index. Values of
+        other documents may have clashed with one of them, so these are
+        added again in corpus order.
+        """
+        for source in sources:
+            self.stores.retract(qualify_path(source, ''))
+        for entry in self._entries.values():
+            if not entry.rejected:
+                continue
+            rejected = entry.rejected
+            entry.rejected = []
+            del entry.report.messages[:]
+            for name, key_name, target_path, key_value, key_path in rejected:
+                self._add_values(entry, name, key_name, target_path,
+                                 [(key_value, key_path)])
+        self._commit()
+
+    def _merge(self, entry, keys):
+        for name, key_name, target_path, values in keys:
+            if name == 'keyStore':
+                target_path = qualify_path(entry.source, target_path)
+                self.stores.keyStore.add_key(key_name, target_path)
+            self._add_values(entry, name, key_name, target_path, [
+                (key_value, qualify_path(entry.source, key_path))
+                for key_value, key_path in values])
+        self._commit()
+
+    def _commit(self):
+        commit = getattr(self.stores, 'commit', None)
+        if commit:
+            commit()
+
+    def _add_values(self, entry, name, key_name, target_path, values):
+        """
+        Adds (key_value, key_path) pairs of entry to the shared store name.
+        Values clashing with those of other documents are reported and kept
+        in entry.rejected.
+        """
+        store = getattr(self.stores, name)
+        while values:
+            count = store.key_value_count(key_name, target_path)
+            try:
+                store.add_values(key_name, target_path, values)
+                return
+            except ValidationException as e:
+                entry.report.messages.append(e._msg)
+                added = store.key_value_count(key_name, target_path) - count
+                key_value, key_path = values[added]
+                entry.rejected.append((name, key_name, target_path, key_value, key_path))
+                values = values[added + 1:]
+
+    def _invalidate(self, changed_sources):
+        """
+        Marks references for matching again: all references of the changed
+        documents, references elsewhere that pointed into them and
+        references that could not be resolved so far.
+        """
+        for entry in self._entries.values():
+            if entry.source in changed_sources:
+                entry.pending = set(range(len(entry.refs)))
+                continue
+            for index, target in enumerate(entry.targets):
+                if target is None or split_path(target)[0] in changed_sources:
+                    entry.pending.add(index)
+
+    def _match(self, entry, store_name, ref):
+        """
+        Matches ref against the values of its own document first, in the
+        shared index or, if they clashed, in entry.rejected.
+        """
+        for name, key_name, target_path, key_value, key_path in entry.rejected:
+            if (name, key_name, key_value) == (store_name, ref.key_name, ref.key_value):
+                return key_path
+        store = getattr(self.stores, store_name)
+        try:
+            return store.match_ref(ref.key_name, ref.key_value,
+                                   prefix=qualify_path(entry.source, ''))
+        except ValidationException:
+            return store.match_ref(ref.key_name, ref.key_value)
+
+    def resolve(self):
+        """
+        Matches all pending references and returns the reports of all
+        documents.
+        """
+        if self.metrics is None:
+            return self._resolve(None)
+        with timed(self.metrics, 'resolve'):
+            result = self._resolve(self.metrics)
+        record_store_sizes(self.metrics, self.stores)
+        return result
+
+    def _resolve(self, metrics):
+        for entry in self._entries.values():
+            if not entry.pending:
+                continue
+            report = entry.report
+            for index in sorted(entry.pending):
+                store_name, ref = entry.refs[index]
+                try:
+                    entry.targets[index] = self._match(entry, store_name, ref)
+                except ValidationException as e:
+                    entry.targets[index] = None
+                    logger.debug('Could not resolve "%s/%s" in %s: %s'
+                                 % (ref.key_name, ref.key_value, entry.source,
+                                    e._msg))
+            if metrics is not None:
+                unresolved = sum(1 for index in entry.pending
+                                 if entry.targets[index] is None)
+                metrics.increment('refs_resolved_total', len(entry.pending) - unresolved)
+                metrics.increment('refs_unresolved_total', unresolved)
+            entry.pending = set()
+            report.targets = {}
+            report.unresolved = []
+            for (store_name, ref), target in zip(entry.refs, entry.targets):
+                if target is None:
+                    report.unresolved.append(ref)
+                else:
+                    report.targets[ref.ref_path] = target
+        return self.reports
+
+    def reference_graph(self, node_key=None):
+        """
+        ReferenceGraph of all documents after resolve(), with paths qualified
+        by the document source.
+        """
+        graph = ReferenceGraph(node_key)
+        for store in (self.stores.keyStore, self.stores.idStore):
+            for key_name, target_path, values in store.key_targets():
+                for key_path in values.values():
+                    graph.add_key(key_path)
+        for entry in self._entries.values():
+            for (store_name, ref), target in zip(entry.refs, entry.targets):
+                if target is not None:
+                    graph.add_edge(qualify_path(entry.source, ref.ref_path), target)
+        return graph
@@ -41,6 +41,19 @@ class Element(utils.CommonEqualityMixin):
     def __str__(self):
         return '<%s>' % self.tag
 
+    def mark_changed(self):
+        """
+        Marks the element as modified, so revalidate() validates it again.
+        """
+        self.isValidated = False
+
+    @property
+    def children(self):
+        if isinstance(self.value, list) and self.value and \
+                isinstance(self.value[0], Element):
+            return self.value
+        return []
+
     @property
     def to_dict(self):
         result = OrderedDict()
@@ -71,6 +84,21 @@ class Element(utils.CommonEqualityMixin):
         return value
 
 
+def count_elements(element):
+    """
+    Number of elements in the tree at element, element included.
+    """
+    count = 0
+    stack = [element]
+    while stack:
+        element = stack.pop()
+        count += 1
+        if isinstance(element.value, list) and element.value and \
+                isinstance(element.value[0], Element):
+            stack.extend(element.value)
+    return count
+
+
 def get_result_tag(key):
     result_key = key.replace('@', '')
     return result_key
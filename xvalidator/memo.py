@@ -0,0 +1,177 @@
+from __future__ import unicode_literals
+from collections import OrderedDict
+
+from xvalidator import utils
+from xvalidator.element import Element
+from xvalidator.purity import SchemaPurity
+
+
+__author__ = 'bernd'
+
+
+class SubtreeMemo(object):
+    """
+    Validates identical subtrees only once, passed as the memo keyword
+    argument:
+
+        memo = SubtreeMemo(schema)
+        schema.to_python(root, stores=stores, memo=memo)
+
+    Every Element subtree gets a structural key from its tag, values and
+    attributes and the keys of its children. The keys are numbers handed
+    out for each distinct structure, so equal keys mean equal subtrees,
+    not only equal hashes. For ElementSchemas that SchemaPurity finds pure
+    the first subtree of each key is validated and a snapshot of the
+    result is kept. Later subtrees with the same key get the converted
+    values of the snapshot without being validated again. Paths are not
+    part of the key, each element keeps its own.
+
+    Subtrees whose validation reported an error or a warning are not
+    memoized, so messages with the right path are reported for every
+    occurrence. The memo may be used for several documents; clear()
+    drops the snapshots.
+    """
+
+    def __init__(self, schema):
+        self.purity = SchemaPurity(schema)
+        self._structures = {}
+        self._snapshots = {}
+        self._keys = {}
+        self._results = {}
+        self._depth = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_memoized = 0
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def clear(self):
+        self._structures.clear()
+        self._snapshots.clear()
+        self.hits = self.misses = self.not_memoized = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups:
+            return self.hits / float(lookups)
+        return None
+
+    def stats(self):
+        return OrderedDict([
+            ('snapshots', len(self)),
+            ('hits', self.hits),
+            ('misses', self.misses),
+            ('not_memoized', self.not_memoized),
+            ('hit_rate', self.hit_rate),
+        ])
+
+    def key(self, element):
+        """
+        Returns the structural key of the subtree at element, None if it
+        holds unhashable values.
+        """
+        try:
+            return self._keys[id(element)]
+        except KeyError:
+            pass
+        value = element.value
+        if isinstance(value, list):
+            if value and isinstance(value[0], Element):
+                value = tuple(self.key(child) for child in value)
+                if None in value:
+                    value = None
+            else:
+                value = tuple((type(item), item) for item in value)
+        else:
+            value = (type(value), value)
+        attributes = element.attributes
+        structure = (element.tag, value, tuple(attributes.items()) if attributes else None)
+        try:
+            key = self._structures.setdefault(structure, len(self._structures)) \
+                if value is not None else None
+        except TypeError:
+            key = None
+        self._keys[id(element)] = key
+        return key
+
+    def to_python(self, schema, element, **kwargs):
+        """
+        Called by ElementSchema.to_python in place of validating element.
+        """
+        self._depth += 1
+        try:
+            if schema not in self.purity or not self.purity.is_pure(schema):
+                return schema._profiled_to_python(element, **kwargs)
+            return self._memoized(schema, element, **kwargs)
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self._keys.clear()
+                self._results.clear()
+
+    def _memoized(self, schema, element, **kwargs):
+        key = self.key(element)
+        if key is None:
+            return schema._profiled_to_python(element, **kwargs)
+        snapshot = self._snapshots.get((id(schema), key))
+        if snapshot is not None:
+            self.hits += 1
+            self._results[id(element)] = snapshot
+            return _apply(snapshot, element)
+        self.misses += 1
+        inputs = element.value
+        messages = utils.msg_counter.errors + utils.msg_counter.warnings
+        result = schema._profiled_to_python(element, **kwargs)
+        budget = kwargs.get('budget')
+        if utils.msg_counter.errors + utils.msg_counter.warnings != messages or \
+                (budget is not None and budget.stopped):
+            self.not_memoized += 1
+            return result
+        snapshot = self._snapshot(element, inputs)
+        self._snapshots[(id(schema), key)] = snapshot
+        self._results[id(element)] = snapshot
+        return result
+
+    def _snapshot(self, element, inputs):
+        """
+        Returns (value, attributes, isValidated, children) of a validated
+        element. children are (input index, snapshot) pairs in the order
+        of the validated child elements.
+        """
+        value = element.value
+        children = None
+        if isinstance(value, list):
+            if isinstance(inputs, list) and inputs and isinstance(inputs[0], Element):
+                positions = dict((id(child), index) for index, child in enumerate(inputs))
+                children = tuple((positions[id(child)], self._child_snapshot(child))
+                                 for child in value)
+                value = None
+            else:
+                value = list(value)
+        attributes = element.attributes
+        return (value, tuple(attributes.items()) if attributes else attributes,
+                element.isValidated, children)
+
+    def _child_snapshot(self, child):
+        try:
+            return self._results[id(child)]
+        except KeyError:
+            value = child.value
+            return self._snapshot(child, list(value) if isinstance(value, list) else value)
+
+
+def _apply(snapshot, element):
+    value, attributes, is_validated, children = snapshot
+    if children is not None:
+        inputs = element.value
+        element.value = [_apply(child_snapshot, inputs[index])
+                         for index, child_snapshot in children]
+    elif isinstance(value, list):
+        element.value = list(value)
+    else:
+        element.value = value
+    element.attributes = OrderedDict(attributes) if attributes else attributes
+    element.isValidated = is_validated
+    return element
@@ -0,0 +1,174 @@
+from __future__ import unicode_literals
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+__author__ = 'bernd'
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+METRICS = OrderedDict([
+    ('documents_validated_total', ('counter', 'Documents validated.')),
+    ('nodes_validated_total', ('counter', 'Elements of validated documents.')),
+    ('messages_total', ('counter', 'Validation errors and warnings by kind.')),
+    ('refs_resolved_total', ('counter', 'References matched with a key or ID.')),
+    ('refs_unresolved_total', ('counter', 'References without a key or ID.')),
+    ('stage_seconds', ('histogram', 'Time per processing stage.')),
+    ('nodes_per_second', ('gauge', 'Elements per second of the last validated document.')),
+    ('store_targets', ('gauge', 'Key targets of a store.')),
+    ('store_values', ('gauge', 'Key values, IDs or references of a store.')),
+])
+
+
+class MetricsSink(object):
+    """
+    Receives the metrics of validation. This base class drops everything;
+    subclasses forward to a metrics library or keep the values, like
+    InMemoryMetrics. Labels are passed as keyword arguments.
+    """
+
+    def increment(self, name, value=1, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def set_gauge(self, name, value, **labels):
+        pass
+
+
+class InMemoryMetrics(MetricsSink):
+    """
+    Keeps counters, gauges and histograms in dicts keyed by name and sorted
+    label items, for tests or to be rendered with render_prometheus.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counters = OrderedDict()
+        self.gauges = OrderedDict()
+        self.histograms = OrderedDict()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        try:
+            histogram = self.histograms[key]
+        except KeyError:
+            histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        histogram[0][bisect_left(self.buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def set_gauge(self, name, value, **labels):
+        self.gauges[self._key(name, labels)] = value
+
+    def counter(self, name, **labels):
+        return self.counters.get(self._key(name, labels), 0)
+
+    def gauge(self, name, **labels):
+        return self.gauges.get(self._key(name, labels))
+
+    def histogram(self, name, **labels):
+        """
+        Returns (cumulative bucket counts, sum, count) with the last bucket
+        being +Inf.
+        """
+        counts, total, count = self.histograms.get(
+            self._key(name, labels), [[0] * (len(self.buckets) + 1), 0.0, 0])
+        cumulative = []
+        for value in counts:
+            cumulative.append(value + (cumulative[-1] if cumulative else 0))
+        return cumulative, total, count
+
+    def render(self, prefix='xvalidator_'):
+        return render_prometheus(self, prefix)
+
+
+def _escape(value):
+    return ('%s' % value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(items):
+    if not items:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in items)
+
+
+def _number(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return '%d' % value
+
+
+def render_prometheus(metrics, prefix='xvalidator_'):
+    """
+    Renders an InMemoryMetrics in the Prometheus text exposition format.
+    """
+    families = OrderedDict()
+    for kind, values in (('counter', metrics.counters), ('gauge', metrics.gauges),
+                         ('histogram', metrics.histograms)):
+        for name, labels in values.keys():
+            families.setdefault(name, (kind, []))[1].append(labels)
+    lines = []
+    for name, (kind, label_sets) in families.items():
+        full_name = prefix + name
+        lines.append('# HELP %s %s' % (full_name, METRICS.get(name, (kind, name))[1]))
+        lines.append('# TYPE %s %s' % (full_name, kind))
+        for labels in label_sets:
+            if kind == 'counter':
+                lines.append('%s%s %s' % (full_name, _labels(labels),
+                                          _number(metrics.counters[(name, labels)])))
+            elif kind == 'gauge':
+                lines.append('%s%s %s' % (full_name, _labels(labels),
+                                          _number(metrics.gauges[(name, labels)])))
+            else:
+                cumulative, total, count = metrics.histogram(name, **dict(labels))
+                for bound, value in zip(metrics.buckets + (float('inf'),), cumulative):
+                    lines.append('%s_bucket%s %d' % (
+                        full_name, _labels(labels + (('le', _number(float(bound))),)), value))
+                lines.append('%s_sum%s %s' % (full_name, _labels(labels), _number(total)))
+                lines.append('%s_count%s %d' % (full_name, _labels(labels), count))
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def timed(sink, stage, **labels):
+    """
+    Observes the time spent in the with block as stage_seconds{stage=stage}.
+    """
+    start = default_timer()
+    try:
+        yield
+    finally:
+        sink.observe('stage_seconds', default_timer() - start, stage=stage, **labels)
+
+
+def record_messages(sink, kinds, **labels):
+    for kind, count in kinds.items():
+        sink.increment('messages_total', count, kind=kind, **labels)
+
+
+def record_store_sizes(sink, stores, **labels):
+    """
+    Sets store_targets and store_values gauges for the stores of a Stores
+    instance.
+    """
+    for name in ('keyStore', 'uniquesStore', 'idStore'):
+        store = getattr(stores, name)
+        sink.set_gauge('store_targets', store.target_count(), store=name, **labels)
+        sink.set_gauge('store_values', store.total_value_count(), store=name, **labels)
+    for name in ('refStore', 'idrefStore'):
+        sink.set_gauge('store_values', getattr(stores, name).ref_count(),
+                       store=name, **labels)
@@ -0,0 +1,94 @@
+from __future__ import unicode_literals
+
+
+__author__ = 'bernd'
+
+
+def path_segments(path):
+    """
+    Splits an element or attribute path into the segments of a PathIndex:
+    '/c-0,/m-0,a@id' gives ['c-0,', 'm-0,a', '@id'], 'c1.xml#/c-0,' gives
+    ['c1.xml#', 'c-0,'].
+    """
+    element_path, at, attribute = path.partition('@')
+    segments = element_path.split('/')
+    if element_path.startswith('/'):
+        segments = segments[1:]
+    if at:
+        segments.append('@' + attribute)
+    return segments
+
+
+class PathIndex(object):
+    """
+    Trie over paths holding the items added at each path, so that all items
+    in the subtree below a path are found and removed in time proportional
+    to their number instead of the number of all items. Nodes are dicts of
+    child segments with the items of the node itself kept under None.
+    """
+
+    def __init__(self):
+        self._root = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, path, item):
+        node = self._root
+        for segment in path_segments(path):
+            try:
+                node = node[segment]
+            except KeyError:
+                child = node[segment] = {}
+                node = child
+        try:
+            node[None].append(item)
+        except KeyError:
+            node[None] = [item]
+        self.count += 1
+
+    def _node(self, path):
+        node = self._root
+        for segment in path_segments(path):
+            node = node.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def items(self, path):
+        """
+        Returns the items added exactly at path.
+        """
+        node = self._node(path)
+        if node is None:
+            return []
+        return list(node.get(None, []))
+
+    def pop_subtree(self, prefix):
+        """
+        Removes the items at prefix and below it and returns them.
+        """
+        segments = path_segments(prefix)
+        parent = None
+        node = self._root
+        for segment in segments:
+            parent = node
+            node = node.get(segment)
+            if node is None:
+                return []
+        if parent is None:
+            self._root = {}
+        else:
+            del parent[segments[-1]]
+        result = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for segment, child in node.items():
+                if segment is None:
+                    result.extend(child)
+                else:
+                    stack.append(child)
+        self.count -= len(result)
+        return result
@@ -0,0 +1,135 @@
+from __future__ import unicode_literals
+from collections import OrderedDict
+import json
+from timeit import default_timer
+
+
+__author__ = 'bernd'
+
+SORT_KEYS = ('own', 'total', 'calls', 'values', 'errors')
+
+
+class ProfileStat(object):
+    """
+    Statistics of one ElementSchema tag or Validator class. total is the
+    inclusive time, own the time not spent in nested profiled calls. For
+    recursive schemas total counts nested calls of the same name more than
+    once, own does not.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.values = 0
+        self.errors = 0
+        self.total = 0.0
+        self.own = 0.0
+
+    @property
+    def values_per_second(self):
+        if self.total:
+            return self.values / self.total
+        return None
+
+    def as_dict(self):
+        return OrderedDict([
+            ('name', self.name),
+            ('calls', self.calls),
+            ('values', self.values),
+            ('errors', self.errors),
+            ('total', self.total),
+            ('own', self.own),
+            ('values_per_second', self.values_per_second),
+        ])
+
+
+class SchemaProfiler(object):
+    """
+    Opt-in timing of validation, passed as the profiler keyword argument:
+
+        profiler = SchemaProfiler()
+        schema.to_python(root, stores=stores, profiler=profiler)
+        print(profiler.report())
+
+    ElementSchema records every to_python call under its tag and every
+    validator, attribute validator and constraint call under the class
+    name of the validator. A ValidationException raised by a validator
+    counts as an error of the validator and of the tag being validated.
+    Any other exception aborts validation; reset() the profiler before
+    using it again.
+    """
+
+    def __init__(self, timer=default_timer):
+        self.timer = timer
+        self.tags = {}
+        self.validators = {}
+        self._stack = []
+
+    def start(self):
+        self._stack.append([self.timer(), 0.0, 0])
+
+    def stop(self, stats, name, values=1, error=False):
+        end = self.timer()
+        start, nested, errors = self._stack.pop()
+        elapsed = end - start
+        if self._stack:
+            parent = self._stack[-1]
+            parent[1] += elapsed
+            if error:
+                parent[2] += int(error)
+        try:
+            stat = stats[name]
+        except KeyError:
+            stat = stats[name] = ProfileStat(name)
+        stat.calls += 1
+        stat.values += values
+        stat.errors += errors + int(error)
+        stat.total += elapsed
+        stat.own += elapsed - nested
+
+    def stop_tag(self, tag, values=1):
+        self.stop(self.tags, tag, values)
+
+    def stop_validator(self, validator, error=False, values=1):
+        """
+        error is True or, for a list of values, the number of values which
+        failed.
+        """
+        self.stop(self.validators, validator.__class__.__name__, values, error)
+
+    def reset(self):
+        self.tags.clear()
+        self.validators.clear()
+        del self._stack[:]
+
+    @staticmethod
+    def _sorted(stats, sort, limit):
+        assert sort in SORT_KEYS, 'sort must be one of %s' % ', '.join(SORT_KEYS)
+        result = sorted(stats.values(), key=lambda stat: (-getattr(stat, sort), stat.name))
+        return result[:limit] if limit else result
+
+    def as_dict(self, sort='own', limit=None):
+        return OrderedDict([
+            ('tags', [stat.as_dict() for stat in self._sorted(self.tags, sort, limit)]),
+            ('validators', [stat.as_dict()
+                            for stat in self._sorted(self.validators, sort, limit)]),
+        ])
+
+    def to_json(self, sort='own', limit=None, **kwargs):
+        return json.dumps(self.as_dict(sort, limit), **kwargs)
+
+    def report(self, sort='own', limit=None):
+        """
+        Returns the hot spots as text, most expensive first.
+        """
+        lines = []
+        for title, stats in (('tag', self.tags), ('validator', self.validators)):
+            lines.append('%-24s %10s %10s %8s %12s %12s %14s' % (
+                title, 'calls', 'values', 'errors', 'total [s]', 'own [s]',
+                'values/s'))
+            for stat in self._sorted(stats, sort, limit):
+                lines.append('%-24s %10d %10d %8d %12.6f %12.6f %14.1f' % (
+                    stat.name, stat.calls, stat.values, stat.errors, stat.total,
+                    stat.own, stat.values_per_second or 0))
+            lines.append('')
+        return '\n'.join(lines).rstrip('\n')
@@ -0,0 +1,119 @@
+from __future__ import unicode_literals
+
+from xvalidator.caching import CachedValidator
+from xvalidator.schemas import ElementSchema, SequenceSchema, Choice
+from xvalidator.validators import Validator
+
+
+__author__ = 'bernd'
+
+
+def _flatten(items):
+    for item in items or []:
+        if isinstance(item, list):
+            for sub_item in _flatten(item):
+                yield sub_item
+        else:
+            yield item
+
+
+def schema_children(node):
+    """
+    Returns the schemas and validators validating an ElementSchema,
+    SequenceSchema, Choice or CachedValidator calls.
+    """
+    if isinstance(node, ElementSchema):
+        children = [node.validator] if node.validator is not None else []
+        return children + list(_flatten(node.attributes)) + list(_flatten(node.constraints))
+    if isinstance(node, SequenceSchema):
+        children = [node.initial] if node.initial is not None else []
+        return children + list(_flatten(node.sequence))
+    if isinstance(node, Choice):
+        return list(_flatten(node.options))
+    if isinstance(node, CachedValidator):
+        return [node.validator]
+    return []
+
+
+class SchemaPurity(object):
+    """
+    Classifies every schema and validator reachable from schema as pure or
+    store-mutating, without validating anything. A validator with
+    has_side_effects mutates the stores, and so does every ElementSchema,
+    SequenceSchema and Choice from which one can be reached. Recursive
+    schemas are handled. Everything else is pure: its result depends only
+    on the element validated, so it may be cached, memoized or validated in
+    parallel.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._nodes = {}
+        self._parents = {}
+        impure = []
+        stack = [schema]
+        while stack:
+            node = stack.pop()
+            if id(node) in self._nodes:
+                continue
+            self._nodes[id(node)] = node
+            if getattr(node, 'has_side_effects', False):
+                impure.append(node)
+            for child in schema_children(node):
+                self._parents.setdefault(id(child), []).append(node)
+                stack.append(child)
+        self._impure = set()
+        while impure:
+            node = impure.pop()
+            if id(node) in self._impure:
+                continue
+            self._impure.add(id(node))
+            impure.extend(self._parents.get(id(node), []))
+
+    def __contains__(self, node):
+        return id(node) in self._nodes
+
+    def is_pure(self, node):
+        assert node in self, '%s is not part of %s' % (node, self.schema)
+        return id(node) not in self._impure
+
+    @property
+    def nodes(self):
+        return list(self._nodes.values())
+
+    def element_schemas(self, pure=True):
+        """
+        Returns the ElementSchemas which are pure, or with pure=False those
+        mutating the stores.
+        """
+        return [node for node in self._nodes.values()
+                if isinstance(node, ElementSchema) and self.is_pure(node) == pure]
+
+
+def is_pure(schema):
+    return SchemaPurity(schema).is_pure(schema)
+
+
+def cache_pure_validators(schema, maxsize=1024):
+    """
+    Wraps the validators of the ElementSchemas of schema, attributes
+    included, in CachedValidators where SchemaPurity finds them pure.
+    Lists of values of unbounded elements are already validated in bulk,
+    so their validators are left alone. The schema is changed in place;
+    returns the CachedValidators.
+    """
+    purity = SchemaPurity(schema)
+    cached = {}
+
+    def wrap(validator):
+        if (validator is None or isinstance(validator, (SequenceSchema, CachedValidator))
+                or not isinstance(validator, Validator) or not purity.is_pure(validator)):
+            return validator
+        if id(validator) not in cached:
+            cached[id(validator)] = CachedValidator(validator, maxsize)
+        return cached[id(validator)]
+
+    for node in purity.nodes:
+        if isinstance(node, ElementSchema) and not node.unbounded:
+            node.validator = wrap(node.validator)
+    return list(cached.values())
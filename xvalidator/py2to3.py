@@ -17,4 +17,25 @@ else:
     binary_type = str # pragma: no cover
 
 
+def casefold(value):
+    """
+    str.casefold where it exists, str.lower on Python 2.
+    """
+    try:
+        return value.casefold()
+    except AttributeError:  # pragma: no cover
+        return value.lower()
 
+
+def _isascii(value):  # pragma: no cover
+    """
+    str.isascii before Python 3.7.
+    """
+    try:
+        value.encode('ascii')
+    except UnicodeError:
+        return False
+    return True
+
+
+isascii = getattr(text_type, 'isascii', _isascii)
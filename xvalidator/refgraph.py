@@ -0,0 +1,193 @@
+from __future__ import unicode_literals
+from collections import OrderedDict, deque
+import logging
+
+from xvalidator.constraints import ancestor_path
+
+
+__author__ = 'bernd'
+
+logger = logging.getLogger(__name__)
+
+
+def owner_path(level=0):
+    """
+    Returns a node_key function mapping a reference or key path to the
+    path of the element owning it: the attribute part is dropped and the
+    path is shortened by level elements. owner_path(1) maps
+    '/component-0,c/memoryMap-0,mm/name-0,' to '/component-0,c/memoryMap-0,mm'.
+    """
+
+    def node_key(path):
+        path = path.split('@', 1)[0]
+        if level:
+            return ancestor_path(path, level)
+        return path
+
+    return node_key
+
+
+class ReferenceGraph(object):
+    """
+    Directed graph of resolved references. Every edge leads from the path of
+    a reference to the path of the key or ID it was matched with. Key and ID
+    paths are added as nodes even if nothing refers to them.
+
+    node_key maps paths to graph nodes, e.g. owner_path(1) to look at the
+    elements holding keys and references instead of the individual fields.
+    Successors and predecessors are indexed in both directions and all
+    traversals are iterative, so the depth of the graph is not limited by
+    the recursion limit.
+    """
+
+    def __init__(self, node_key=None):
+        self.node_key = node_key
+        self._nodes = OrderedDict()
+        self._keys = OrderedDict()
+        self._successors = {}
+        self._predecessors = {}
+        self.edge_count = 0
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, path):
+        return self._node(path) in self._nodes
+
+    def _node(self, path):
+        if self.node_key is None:
+            return path
+        return self.node_key(path)
+
+    @property
+    def nodes(self):
+        return list(self._nodes.keys())
+
+    def add_key(self, key_path):
+        node = self._node(key_path)
+        self._nodes[node] = None
+        self._keys[node] = None
+
+    def add_edge(self, ref_path, target_path):
+        source = self._node(ref_path)
+        target = self._node(target_path)
+        self._nodes[source] = None
+        self._nodes[target] = None
+        successors = self._successors.setdefault(source, set())
+        if target not in successors:
+            successors.add(target)
+            self._predecessors.setdefault(target, set()).add(source)
+            self.edge_count += 1
+
+    def add_stores(self, stores):
+        """
+        Adds the keys, IDs and the targets found by match_refs of stores.
+        """
+        for store in (stores.keyStore, stores.idStore):
+            for key_name, target_path, values in store.key_targets():
+                for key_path in values.values():
+                    self.add_key(key_path)
+        for store in (stores.refStore, stores.idrefStore):
+            for ref_path, target_path in store.targets.items():
+                self.add_edge(ref_path, target_path)
+
+    @classmethod
+    def from_stores(cls, stores, node_key=None):
+        graph = cls(node_key)
+        graph.add_stores(stores)
+        return graph
+
+    def referrers(self, path):
+        """
+        Nodes with a reference to path.
+        """
+        return sorted(self._predecessors.get(self._node(path), ()))
+
+    def references(self, path):
+        """
+        Nodes path refers to.
+        """
+        return sorted(self._successors.get(self._node(path), ()))
+
+    def unreferenced_keys(self):
+        return [node for node in self._keys if not self._predecessors.get(node)]
+
+    def strongly_connected_components(self):
+        """
+        Tarjan's algorithm with an explicit stack.
+        """
+        index = {}
+        low_link = {}
+        stack = []
+        on_stack = set()
+        result = []
+        counter = 0
+        for root in self._nodes:
+            if root in index:
+                continue
+            index[root] = low_link[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._successors.get(root, ())))]
+            while work:
+                node, successors = work[-1]
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = low_link[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor,
+                                     iter(self._successors.get(successor, ()))))
+                        break
+                    elif successor in on_stack:
+                        low_link[node] = min(low_link[node], index[successor])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low_link[parent] = min(low_link[parent], low_link[node])
+                    if low_link[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        result.append(sorted(component))
+        return result
+
+    def cycles(self):
+        """
+        Groups of nodes referring to each other, directly or indirectly.
+        """
+        return [component for component in self.strongly_connected_components()
+                if len(component) > 1 or
+                component[0] in self._successors.get(component[0], ())]
+
+    def components(self):
+        """
+        Weakly connected components, i.e. groups of nodes linked by
+        references regardless of their direction.
+        """
+        seen = set()
+        result = []
+        for root in self._nodes:
+            if root in seen:
+                continue
+            seen.add(root)
+            component = [root]
+            queue = deque([root])
+            while queue:
+                node = queue.popleft()
+                for neighbours in (self._successors.get(node, ()),
+                                   self._predecessors.get(node, ())):
+                    for neighbour in neighbours:
+                        if neighbour not in seen:
+                            seen.add(neighbour)
+                            component.append(neighbour)
+                            queue.append(neighbour)
+            result.append(sorted(component))
+        return result
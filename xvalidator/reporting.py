@@ -0,0 +1,284 @@
+from __future__ import unicode_literals
+from collections import OrderedDict
+import io
+import json
+import logging
+import re
+
+from xvalidator.py2to3 import string_types
+
+
+__author__ = 'bernd'
+
+ERROR = 'error'
+WARNING = 'warning'
+
+_INSTANCE = re.compile(r'-\d+,[^/@]*')
+
+
+def schema_node(path):
+    """
+    Returns path without instance indices and names, the path of the schema
+    node: '/component-0,c/memoryMap-1,mm/name-0,' gives
+    '/component/memoryMap/name'.
+    """
+    if not path:
+        return path
+    return _INSTANCE.sub('', path)
+
+
+class ErrorRecord(object):
+    """
+    One validation error or warning. code is the message kind, e.g.
+    'invalid_value' or 'missing_element', template and args give the
+    message text, which is only formatted when it is needed.
+    """
+    __slots__ = ('code', 'path', 'value', 'template', 'args', 'severity')
+
+    def __init__(self, code, path, value, template, args=(), severity=ERROR):
+        self.code = code
+        self.path = path
+        self.value = value
+        self.template = template
+        self.args = args
+        self.severity = severity
+
+    def __repr__(self):
+        return 'ErrorRecord(code=%r, path=%r, value=%r)' % (self.code, self.path,
+                                                            self.value)
+
+    def __eq__(self, other):
+        return isinstance(other, ErrorRecord) and self.as_tuple() == other.as_tuple()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.code, self.path, self.template))
+
+    def as_tuple(self):
+        return (self.code, self.path, self.value, self.template, tuple(self.args),
+                self.severity)
+
+    @property
+    def message(self):
+        return self.template % tuple(self.args)
+
+    def as_dict(self):
+        return OrderedDict([
+            ('severity', self.severity),
+            ('code', self.code),
+            ('path', self.path),
+            ('value', self.value),
+            ('message', self.message),
+            ('template', self.template),
+            ('args', list(self.args)),
+        ])
+
+
+class Reporter(object):
+    """
+    Receives the ErrorRecords of a validation, passed as the reporter
+    keyword argument. Records sent to a reporter are counted in
+    utils.msg_counter but neither printed nor logged.
+    """
+
+    def report(self, record):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CollectingReporter(Reporter):
+    """
+    Keeps all records in a list.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def report(self, record):
+        self.records.append(record)
+
+
+class LoggingReporter(Reporter):
+    """
+    Logs the message of every record with the level of its severity.
+    """
+
+    def __init__(self, log=None):
+        self.log = log or logging.getLogger('xvalidator')
+
+    def report(self, record):
+        level = logging.WARNING if record.severity == WARNING else logging.ERROR
+        if self.log.isEnabledFor(level):
+            self.log.log(level, record.message)
+
+
+class ErrorGroup(object):
+    """
+    Records of one schema node with the same message template: the first
+    record, the number of records and up to sample_size (path, value)
+    pairs.
+    """
+
+    def __init__(self, node, record):
+        self.node = node
+        self.first = record
+        self.count = 0
+        self.sample = []
+
+    @property
+    def code(self):
+        return self.first.code
+
+    @property
+    def severity(self):
+        return self.first.severity
+
+    def as_dict(self):
+        return OrderedDict([
+            ('severity', self.severity),
+            ('code', self.code),
+            ('node', self.node),
+            ('template', self.first.template),
+            ('message', self.first.message),
+            ('count', self.count),
+            ('sample', [OrderedDict([('path', path), ('value', value)])
+                        for path, value in self.sample]),
+        ])
+
+
+class AggregatingReporter(Reporter):
+    """
+    Groups records by schema node and message template, keeping a count and
+    a sample of sample_size paths per group, so memory stays bounded however
+    often the same error repeats. The first forward_per_group records of
+    every group are passed on to reporter, e.g. a JsonLinesReporter, and the
+    rest are only counted. Once max_groups groups exist further new groups
+    are only counted in dropped.
+    """
+
+    def __init__(self, sample_size=10, reporter=None, forward_per_group=1,
+                 max_groups=None):
+        self.sample_size = sample_size
+        self.reporter = reporter
+        self.forward_per_group = forward_per_group
+        self.max_groups = max_groups
+        self.groups = OrderedDict()
+        self.dropped = 0
+
+    def report(self, record):
+        node = schema_node(record.path)
+        key = (node, record.template)
+        try:
+            group = self.groups[key]
+        except KeyError:
+            if self.max_groups is not None and len(self.groups) >= self.max_groups:
+                self.dropped += 1
+                return
+            group = self.groups[key] = ErrorGroup(node, record)
+        group.count += 1
+        if len(group.sample) < self.sample_size:
+            group.sample.append((record.path, record.value))
+        if self.reporter is not None and group.count <= self.forward_per_group:
+            self.reporter.report(record)
+
+    @property
+    def count(self):
+        return sum(group.count for group in self.groups.values()) + self.dropped
+
+    def summary(self):
+        """
+        Returns the groups, largest first.
+        """
+        return sorted(self.groups.values(), key=lambda group: -group.count)
+
+    def as_dict(self):
+        return OrderedDict([
+            ('count', self.count),
+            ('dropped', self.dropped),
+            ('groups', [group.as_dict() for group in self.summary()]),
+        ])
+
+    def report_text(self, limit=None):
+        lines = []
+        for group in self.summary()[:limit]:
+            lines.append('%8d x %s %s in %s: %s' % (group.count, group.severity,
+                                                  group.code, group.node,
+                                                  group.first.message))
+        if self.dropped:
+            lines.append('%8d x not grouped, more than %d groups' % (self.dropped,
+                                                                     self.max_groups))
+        return '\n'.join(lines)
+
+    def flush(self):
+        if self.reporter is not None:
+            self.reporter.flush()
+
+    def close(self):
+        if self.reporter is not None:
+            self.reporter.close()
+
+
+def _json_default(value):
+    return repr(value)
+
+
+class JsonLinesReporter(Reporter):
+    """
+    Writes one JSON object per record to target, a file name or a text
+    file. Records are buffered and written buffer_size at a time. With a
+    log the records are also logged, see LoggingReporter.
+    """
+
+    def __init__(self, target, buffer_size=1000, log=None):
+        if isinstance(target, string_types):
+            self._file = io.open(target, 'w', encoding='utf-8')
+            self._owns_file = True
+        else:
+            self._file = target
+            self._owns_file = False
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._bridge = LoggingReporter(log) if log else None
+        self.count = 0
+
+    def report(self, record):
+        self._buffer.append(record)
+        self.count += 1
+        if self._bridge is not None:
+            self._bridge.report(record)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(''.join(
+                '%s\n' % json.dumps(record.as_dict(), default=_json_default)
+                for record in self._buffer))
+            self._file.flush()
+            del self._buffer[:]
+
+    def close(self):
+        self.flush()
+        if self._owns_file:
+            self._file.close()
+
+
+def read_json_lines(file_name):
+    """
+    Returns the records written by a JsonLinesReporter as dicts.
+    """
+    with io.open(file_name, encoding='utf-8') as input_file:
+        return [json.loads(line) for line in input_file if line.strip()]
@@ -5,6 +5,7 @@ import random
 
 from xvalidator.element import Element
 from xvalidator import utils
+from xvalidator.reporting import ErrorRecord
 from xvalidator.validators import Validator, ValidationException
 
 
@@ -25,6 +26,7 @@ class ElementSchema(Validator):
     unbounded = False
     default = None
     attributes = None
+    constraints = None
 
     messages = dict(
         extraArg='Found unexpected argument %s',
@@ -37,7 +39,7 @@ class ElementSchema(Validator):
     def __init__(self, tag, **kwargs):
         super(ElementSchema, self).__init__(**kwargs)
         expected_attrs = {"_tag", "validator", "minOccurs", "unbounded",
-                          "default", "attributes"}
+                          "default", "attributes", "constraints"}
         for attrName in kwargs.keys():
             assert attrName in expected_attrs, self.messages['extraArg'] % attrName
         self._tag = tag
@@ -45,6 +47,7 @@ class ElementSchema(Validator):
             msg = 'validator:%r must be an instance of xvalidator.Validator' % self.validator
             assert isinstance(self.validator, Validator), msg
         self.attributes = self.__check_schema_args__('attributes', kwargs)
+        self.constraints = self.__check_schema_args__('constraints', kwargs)
 
     def __check_schema_args__(self, arg_name, new_attrs):
         result = []
@@ -64,17 +67,48 @@ class ElementSchema(Validator):
     def _validate(self, validator, value, value_type, **kwargs):
         if validator is None:
             return value
+        profiler = kwargs.get('profiler')
+        if profiler is not None:
+            profiler.start()
+        error = None
         try:
             result = validator.to_python(value, **kwargs)
         except ValidationException as e:
+            error = e
+        finally:
+            if profiler is not None:
+                profiler.stop_validator(validator, error=error is not None)
+        if error is not None:
             path = kwargs['path']
-            msg = 'Error validating %s in "%s": %s got: %r' % (
-                value_type, path, e._msg, value)
-            utils.error(logger, msg)
-        else:
-            logger.debug('Successfully validated "%s", got: %r'
-                         % (value_type, result))
-            return result
+            utils.report(logger, ErrorRecord(
+                'invalid_value', path, value, 'Error validating %s in "%s": %s got: %r',
+                (value_type, path, error._msg, value)), kwargs.get('reporter'),
+                kwargs.get('budget'))
+            return None
+        logger.debug('Successfully validated "%s", got: %r', value_type, result)
+        return result
+
+    def _validate_many(self, validator, values, value_type, **kwargs):
+        if validator is None:
+            return values
+        profiler = kwargs.get('profiler')
+        if profiler is not None:
+            profiler.start()
+        errors = ()
+        try:
+            results, errors = validator.to_python_many(values, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.stop_validator(validator, error=len(errors), values=len(values))
+        path = kwargs['path']
+        for index, e in errors:
+            value = values[index]
+            utils.report(logger, ErrorRecord(
+                'invalid_value', path, value, 'Error validating %s in "%s": %s got: %r',
+                (value_type, path, e._msg, value)), kwargs.get('reporter'), kwargs.get('budget'))
+        logger.debug('Validated %d values of "%s" with %d error(s).',
+                     len(values), value_type, len(errors))
+        return results
 
     def _validate_attributes(self, element, **kwargs):
         validated_attributes = OrderedDict()
@@ -95,8 +129,11 @@ class ElementSchema(Validator):
                     for extra_attribute_name in extra_attribute_keys:
                         validated_attributes[extra_attribute_name] = attributes[extra_attribute_name]
                 else:
-                    utils.error(logger, 'Found unexpected attributes: "%s" in "%s".' % (
-                        ', '.join(extra_attribute_keys), element.path))
+                    utils.report(logger, ErrorRecord(
+                        'unexpected_attribute', element.path, sorted(extra_attribute_keys),
+                        'Found unexpected attributes: "%s" in "%s".',
+                        (', '.join(extra_attribute_keys), element.path)),
+                        kwargs.get('reporter'), kwargs.get('budget'))
             for tag in validators.keys():
                 if tag in expected_attributes:
                     if validators[tag].validator is None:
@@ -115,15 +152,34 @@ class ElementSchema(Validator):
 
     def to_python(self, element, **kwargs):
         assert isinstance(element, Element), 'Argument element should be of type Element, got %r' % element
+        memo = kwargs.get('memo')
+        if memo is not None:
+            return memo.to_python(self, element, **kwargs)
+        return self._profiled_to_python(element, **kwargs)
+
+    def _profiled_to_python(self, element, **kwargs):
+        profiler = kwargs.get('profiler')
+        if profiler is None:
+            return self._to_python(element, **kwargs)
+        profiler.start()
+        try:
+            return self._to_python(element, **kwargs)
+        finally:
+            values = element.value
+            profiler.stop_tag(self.tag, len(values) if isinstance(values, list) and
+                              values and not isinstance(values[0], Element) else 1)
+
+    def _to_python(self, element, **kwargs):
         kwargs.update(path=element.path)
         if isinstance(element.value, list):
             if element.value and isinstance(element.value[0], Element):
                 element.value = self._validate(self.validator, element.value,
                                                'Element %s' % element.tag, **kwargs)
+            elif kwargs.get('budget') is not None:
+                element.value = self._validate_values_budget(element, **kwargs)
             else:
-                element.value = [self._validate(self.validator, item,
-                                                'Element %s' % element.tag, **kwargs)
-                                 for item in element.value]
+                element.value = self._validate_many(self.validator, element.value,
+                                                    'Element %s' % element.tag, **kwargs)
         elif self.validator:
             if element.value is None and self.minOccurs == 0:
                 logger.debug('Ignoring empty element "%s".' % element.tag)
@@ -131,9 +187,40 @@ class ElementSchema(Validator):
                 element.value = self._validate(self.validator, element.value,
                                                'Element %s' % element.tag, **kwargs)
         element.attributes = self._validate_attributes(element, **kwargs)
+        for constraint in self.constraints:
+            self._validate_constraint(constraint, element, **kwargs)
         element.isValidated = True
         return element
 
+    def _validate_values_budget(self, element, **kwargs):
+        budget = kwargs['budget']
+        result = []
+        for index, item in enumerate(element.value):
+            if budget.check(element.path):
+                return result + element.value[index:]
+            result.append(self._validate(self.validator, item,
+                                         'Element %s' % element.tag, **kwargs))
+        return result
+
+    def _validate_constraint(self, constraint, element, **kwargs):
+        profiler = kwargs.get('profiler')
+        if profiler is not None:
+            profiler.start()
+        error = None
+        try:
+            constraint.to_python(element, **kwargs)
+        except ValidationException as e:
+            error = e
+        finally:
+            if profiler is not None:
+                profiler.stop_validator(constraint, error=error is not None)
+        if error is not None:
+            utils.report(logger, ErrorRecord(
+                'constraint', element.path, error._value,
+                'Error validating %s of %s in "%s": %s got: %r',
+                ('%s' % constraint, element.tag, element.path, error._msg, error._value)),
+                kwargs.get('reporter'), kwargs.get('budget'))
+
     def build(self, *args, **kwargs):
         path = kwargs.get('path', '')
         if self.minOccurs > 1:
@@ -208,9 +295,7 @@ class Choice(utils.CommonEqualityMixin):
                  if (field.minOccurs > 0) == required]
         return key_sets
 
-    def match_choice_keys(self, value_key_set):
-        no_match_msg = "Could not match keys: %s with: choices: %s" % (
-            ', '.join(value_key_set), self.choice_keys_str())
+    def match_choice_keys(self, value_key_set, path=None, reporter=None, budget=None):
         if value_key_set == set([]) and not self.required:
             return []
         max_key_sets = [self.required_keys_sets[i] | self.optional_keys_sets[i]
@@ -219,10 +304,12 @@ class Choice(utils.CommonEqualityMixin):
                            for min_keys in self.required_keys_sets]
         max_key_matches = [value_key_set <= max_keys
                            for max_keys in max_key_sets]
-        if not any(min_key_matches):
-            utils.error(logger, no_match_msg)
-        if not any(max_key_matches):
-            utils.error(logger, no_match_msg)
+        for key_matches in (min_key_matches, max_key_matches):
+            if not any(key_matches):
+                utils.report(logger, ErrorRecord(
+                    'choice_mismatch', path, sorted(value_key_set),
+                    "Could not match keys: %s with: choices: %s",
+                    (', '.join(value_key_set), self.choice_keys_str())), reporter, budget)
         if any(min_key_matches) and any(max_key_matches):
             matches = [i for i in range(len(self.options))
                        if min_key_matches[i] and max_key_matches[i]]
@@ -265,16 +352,17 @@ class SequenceSchema(Validator):
         emptyChild='The field: %s should not be empty!',
     )
 
-    def check_key_order(self, value_tags, sequence, parent_path):
+    def check_key_order(self, value_tags, sequence, parent_path, reporter=None, budget=None):
         validator_keys = [field.tag for field in sequence]
-        if value_tags != validator_keys:
-            utils.warning(logger, "The order of the keys in %s ( %s ) does "
-                                  "not match the expected order { %s )." %
-                                  (parent_path,
-                                   ', '.join(value_tags),
-                                   ', '.join(validator_keys)))
-
-    def match_sequence(self, value_tags, parent_path):
+        if list(value_tags) != validator_keys:
+            utils.report(logger, ErrorRecord(
+                'key_order', parent_path, list(value_tags),
+                "The order of the keys in %s ( %s ) does "
+                "not match the expected order { %s ).",
+                (parent_path, ', '.join(value_tags), ', '.join(validator_keys)),
+                'warning'), reporter, budget)
+
+    def match_sequence(self, value_tags, parent_path, reporter=None, budget=None):
         result_sequence = []
         covered_tags_set = set([])
         failed = False
@@ -283,22 +371,24 @@ class SequenceSchema(Validator):
                 if field.tag in value_tags:
                     result_sequence.append(field)
                 elif field.minOccurs > 0:
-                    msg = "Missing required key: %s" % field.tag
-                    utils.error(logger, msg)
+                    utils.report(logger, ErrorRecord(
+                        'missing_element', parent_path, field.tag,
+                        "Missing required key: %s", (field.tag,)), reporter, budget)
                     failed = True
                 covered_tags_set.add(field.tag)
             elif isinstance(field, Choice):
                 choice_keys_sey = set(value_tags) & field.all_keys_set
-                cs = field.match_choice_keys(choice_keys_sey)
+                cs = field.match_choice_keys(choice_keys_sey, parent_path, reporter, budget)
                 covered_tags_set = covered_tags_set | field.all_keys_set
                 if cs:
                     result_sequence.extend(cs)
         extra_tags = set(value_tags) - covered_tags_set
         if extra_tags:
-            msg = "Could not match tag(s): %s" % ', '.join(extra_tags)
-            utils.error(logger, msg)
+            utils.report(logger, ErrorRecord(
+                'unexpected_element', parent_path, sorted(extra_tags),
+                "Could not match tag(s): %s", (', '.join(extra_tags),)), reporter, budget)
         elif not failed:
-            self.check_key_order(value_tags, result_sequence, parent_path)
+            self.check_key_order(value_tags, result_sequence, parent_path, reporter, budget)
         return result_sequence
 
     def to_python(self, elements_list, **kwargs):
@@ -307,6 +397,8 @@ class SequenceSchema(Validator):
         else:
             if not isinstance(elements_list, list):
                 raise ValidationException('Expected child elements.', elements_list)
+            if 'path' in kwargs:
+                kwargs['ancestors'] = (kwargs['path'], kwargs.get('ancestors'))
             if self.initial:
                 self.initial.to_python(None, **kwargs)
             for element in elements_list:
@@ -328,7 +420,12 @@ class SequenceSchema(Validator):
             msg = 'Validating: %s for element <%s%s> with keys: %s' % (
                 parent_path, self.tag, tag, ', '.join(el_dict.keys()))
             utils.debug(logger, msg)
-            sequence = self.match_sequence(el_dict.keys(), parent_path)
+            sequence = self.match_sequence(el_dict.keys(), parent_path,
+                                           kwargs.get('reporter'), kwargs.get('budget'))
+            budget = kwargs.get('budget')
+            if budget is not None:
+                return self._to_python_budget(elements_list, el_dict, sequence,
+                                              **kwargs)
             result = []
             if sequence:
                 for element_schema in sequence:
@@ -342,6 +439,29 @@ class SequenceSchema(Validator):
                         result.append(validated_element)
             return result
 
+    @staticmethod
+    def _to_python_budget(elements_list, el_dict, sequence, **kwargs):
+        """
+        Like the loop of to_python, but checks budget before every element.
+        Once it stops, the matched elements not validated yet are appended
+        as they are.
+        """
+        budget = kwargs['budget']
+        result = []
+        for element_schema in sequence:
+            field_element = el_dict[element_schema.tag]
+            if not isinstance(field_element, list):
+                field_element = [field_element]
+            for item in field_element:
+                if budget.check(item.path):
+                    validated = set(id(element) for element in result)
+                    tags = set(field.tag for field in sequence)
+                    result.extend(element for element in elements_list
+                                  if element.tag in tags and id(element) not in validated)
+                    return result
+                result.append(element_schema.to_python(item, **kwargs))
+        return result
+
     def build(self, *args, **kwargs):
         result = []
         for item in self.sequence:
@@ -0,0 +1,310 @@
+from __future__ import unicode_literals
+from contextlib import contextmanager
+import json
+import logging
+import sqlite3
+
+from xvalidator.constraints import KeyStore, IDStore, Stores
+from xvalidator.py2to3 import string_types
+from xvalidator.validators import ValidationException
+
+
+__author__ = 'bernd'
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS xv_key ('
+    ' id INTEGER PRIMARY KEY,'
+    ' store TEXT NOT NULL,'
+    ' key_name TEXT NOT NULL,'
+    ' target_path TEXT NOT NULL,'
+    ' UNIQUE (store, key_name, target_path))',
+    'CREATE TABLE IF NOT EXISTS xv_key_value ('
+    ' key_id INTEGER NOT NULL REFERENCES xv_key (id),'
+    ' key_value NOT NULL,'
+    ' key_path TEXT NOT NULL,'
+    ' PRIMARY KEY (key_id, key_value))',
+    'CREATE INDEX IF NOT EXISTS xv_key_value_lookup'
+    ' ON xv_key_value (key_value, key_id)',
+)
+
+# Only needed by retract, which creates them, so bulk loads without
+# retracting do not maintain them.
+_PATH_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS xv_key_target ON xv_key (target_path)',
+    'CREATE INDEX IF NOT EXISTS xv_key_value_path ON xv_key_value (key_path)',
+)
+
+_TUPLE_PREFIX = '\x1e'
+
+
+def _encode(key_value):
+    """
+    Composite key values are tuples, which SQLite can not store. They are
+    kept as a JSON list behind a prefix no XML value can start with.
+    """
+    if isinstance(key_value, tuple):
+        return _TUPLE_PREFIX + json.dumps(list(key_value))
+    return key_value
+
+
+def _decode(key_value):
+    if isinstance(key_value, string_types) and key_value[:1] == _TUPLE_PREFIX:
+        return tuple(json.loads(key_value[1:]))
+    return key_value
+
+
+def connect(database=':memory:'):
+    """
+    Opens database and makes sure the key store tables exist. Inserts are
+    not committed until commit() is called on the connection or one of the
+    stores sharing it, so bulk loads run inside a single transaction.
+    """
+    connection = sqlite3.connect(database)
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    for statement in _SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    return connection
+
+
+class SqliteKeyStore(KeyStore):
+    """
+    KeyStore keeping key targets and key values in a SQLite database instead
+    of in memory. Several stores can share one connection; they are kept
+    apart by store_name. Lookups by key value use an index, so match_ref
+    does not scan all values of a key.
+    """
+
+    def __init__(self, connection, store_name='keyStore'):
+        self._connection = connection
+        self._store = store_name
+        self._key_ids = {}
+
+    def _key_id(self, key_name, target_path):
+        key = (key_name, target_path)
+        if key in self._key_ids:
+            return self._key_ids[key]
+        row = self._connection.execute(
+            'SELECT id FROM xv_key WHERE store = ? AND key_name = ?'
+            ' AND target_path = ?', (self._store, key_name, target_path)).fetchone()
+        if row is None:
+            return None
+        self._key_ids[key] = row[0]
+        return row[0]
+
+    def add_key(self, key_names, target_path):
+        if isinstance(key_names, list):
+            key_names_list = key_names
+        else:
+            key_names_list = [key_names]
+        for key_name in key_names_list:
+            if self._key_id(key_name, target_path) is not None:
+                key = '%s:%s' % (key_name, target_path)
+                raise ValidationException('Key %s does already exist.' % key,
+                                          target_path)
+            cursor = self._connection.execute(
+                'INSERT INTO xv_key (store, key_name, target_path)'
+                ' VALUES (?, ?, ?)', (self._store, key_name, target_path))
+            self._key_ids[(key_name, target_path)] = cursor.lastrowid
+
+    def in_keys(self, key_name, target_path):
+        return self._key_id(key_name, target_path) is not None
+
+    def _find_key_id(self, key_names, target_path, key_value):
+        if isinstance(key_names, list):
+            key_names_list = key_names
+        else:
+            key_names_list = [key_names]
+        for key_name in key_names_list:
+            key_id = self._key_id(key_name, target_path)
+            if key_id is not None:
+                return key_name, key_id
+        msg = 'Could not find target path %s for key name(s) %s' % (target_path,
+                                                                    ', '.join(key_names_list))
+        raise ValidationException(msg, key_value)
+
+    def add_value(self, key_names, target_path, key_value, key_path):
+        key_name, key_id = self._find_key_id(key_names, target_path, key_value)
+        try:
+            self._connection.execute(
+                'INSERT INTO xv_key_value (key_id, key_value, key_path)'
+                ' VALUES (?, ?, ?)', (key_id, _encode(key_value), key_path))
+        except sqlite3.IntegrityError:
+            msg = 'Duplicate key value %s for %s at %s' % (key_value,
+                                                           key_name,
+                                                           key_path)
+            raise ValidationException(msg, key_value)
+        return True
+
+    def add_values(self, key_names, target_path, values):
+        """
+        Bulk version of add_value. values is an iterable of
+        (key_value, key_path) pairs which are inserted with a single
+        executemany. As with repeated add_value calls, the values preceding
+        a duplicate remain in the store.
+        """
+        values = list(values)
+        if not values:
+            return 0
+        key_name, key_id = self._find_key_id(key_names, target_path,
+                                             values[0][0])
+        changes = self._connection.total_changes
+        try:
+            self._connection.executemany(
+                'INSERT INTO xv_key_value (key_id, key_value, key_path)'
+                ' VALUES (?, ?, ?)',
+                ((key_id, _encode(key_value), key_path)
+                 for key_value, key_path in values))
+        except sqlite3.IntegrityError:
+            key_value, key_path = values[self._connection.total_changes - changes]
+            msg = 'Duplicate key value %s for %s at %s' % (key_value,
+                                                           key_name,
+                                                           key_path)
+            raise ValidationException(msg, key_value)
+        return len(values)
+
+    def match_ref(self, key_name, ref_key_value, prefix=None):
+        condition, args = '', ()
+        if prefix is not None:
+            condition, args = self._subtree('v.key_path', prefix)
+            condition = ' AND ' + condition
+        row = self._connection.execute(
+            'SELECT v.key_path FROM xv_key_value v JOIN xv_key k'
+            ' ON v.key_id = k.id WHERE v.key_value = ? AND k.store = ?'
+            ' AND k.key_name = ?%s ORDER BY k.id, v.rowid LIMIT 1' % condition,
+            (_encode(ref_key_value), self._store, key_name) + args).fetchone()
+        if row is not None:
+            return row[0]
+        row = self._connection.execute(
+            'SELECT 1 FROM xv_key WHERE store = ? AND key_name = ? LIMIT 1',
+            (self._store, key_name)).fetchone()
+        if row is None:
+            raise ValidationException('No key for %s exists' % key_name,
+                                      key_name)
+        raise ValidationException('Could not match ref %s for %s' % (
+            ref_key_value, key_name), ref_key_value)
+
+    def key_value_count(self, key_name, target_path):
+        key_id = self._key_id(key_name, target_path)
+        if key_id is None:
+            return 0
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM xv_key_value WHERE key_id = ?',
+            (key_id,)).fetchone()[0]
+
+    def target_count(self):
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM xv_key WHERE store = ?', (self._store,)).fetchone()[0]
+
+    def total_value_count(self):
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM xv_key_value v JOIN xv_key k ON v.key_id = k.id'
+            ' WHERE k.store = ?', (self._store,)).fetchone()[0]
+
+    @staticmethod
+    def _subtree(column, prefix):
+        """
+        Condition for column being in the subtree at prefix, written as
+        ranges so the path indexes can be used: '0' and 'A' follow '/' and
+        '@'.
+        """
+        return ('(%s = ? OR %s >= ? AND %s < ? OR %s >= ? AND %s < ?)'
+                % ((column,) * 5),
+                (prefix, prefix + '/', prefix + '0', prefix + '@', prefix + 'A'))
+
+    def retract(self, prefix):
+        # The unary + keeps SQLite from using the store indexes, which
+        # match all rows of a store, instead of the path indexes.
+        for statement in _PATH_INDEXES:
+            self._connection.execute(statement)
+        targets, target_args = self._subtree('k.target_path', prefix)
+        paths, path_args = self._subtree('v.key_path', prefix)
+        select = ('SELECT k.key_name, v.key_value, v.key_path FROM xv_key k'
+                  ' JOIN xv_key_value v ON v.key_id = k.id WHERE +k.store = ? AND ')
+        removed = [(key_name, _decode(key_value), key_path)
+                   for key_name, key_value, key_path in self._connection.execute(
+                       select + targets + ' UNION ALL ' + select + paths +
+                       ' AND NOT ' + targets,
+                       (self._store,) + target_args +
+                       (self._store,) + path_args + target_args)]
+        targets, target_args = self._subtree('target_path', prefix)
+        paths, path_args = self._subtree('key_path', prefix)
+        key_ids = 'SELECT id FROM xv_key WHERE +store = ?'
+        self._connection.execute(
+            'DELETE FROM xv_key_value WHERE key_id IN (%s AND %s)' % (key_ids, targets),
+            (self._store,) + target_args)
+        self._connection.execute(
+            'DELETE FROM xv_key_value WHERE %s AND'
+            ' (SELECT store FROM xv_key WHERE id = key_id) = ?' % paths,
+            path_args + (self._store,))
+        self._connection.execute('DELETE FROM xv_key WHERE +store = ? AND %s' % targets,
+                                 (self._store,) + target_args)
+        self._key_ids = {}
+        return removed
+
+    def key_targets(self):
+        for key_id, key_name, target_path in self._connection.execute(
+                'SELECT id, key_name, target_path FROM xv_key'
+                ' WHERE store = ? ORDER BY id', (self._store,)).fetchall():
+            yield key_name, target_path, dict(
+                (_decode(key_value), key_path)
+                for key_value, key_path in self._connection.execute(
+                    'SELECT key_value, key_path FROM xv_key_value'
+                    ' WHERE key_id = ? ORDER BY rowid', (key_id,)))
+
+    @property
+    def keys(self):
+        return {'%s:%s' % (key_name, target_path): values
+                for key_name, target_path, values in self.key_targets()}
+
+    def commit(self):
+        self._connection.commit()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Commits all inserts made inside the with block at once, or rolls
+        them back if the block raises.
+        """
+        try:
+            yield self
+        except Exception:
+            self._connection.rollback()
+            self._key_ids = {}
+            raise
+        else:
+            self._connection.commit()
+
+
+class SqliteIDStore(SqliteKeyStore, IDStore):
+    def __init__(self, connection, store_name='idStore'):
+        SqliteKeyStore.__init__(self, connection, store_name)
+        if not self.in_keys(self.key_name, self.path):
+            self.add_key(self.key_name, self.path)
+
+
+class SqliteStores(Stores):
+    """
+    Stores with the key, unique and ID stores kept in one SQLite database.
+    Passing a file name instead of ':memory:' makes the keys and IDs survive
+    between runs, so references can be resolved across many documents
+    without keeping them all in memory. Reference stores stay in memory.
+    """
+
+    def __init__(self, database=':memory:'):
+        super(SqliteStores, self).__init__()
+        self.connection = connect(database)
+        self.keyStore = SqliteKeyStore(self.connection, 'keyStore')
+        self.uniquesStore = SqliteKeyStore(self.connection, 'uniquesStore')
+        self.idStore = SqliteIDStore(self.connection, 'idStore')
+        self.connection.commit()
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
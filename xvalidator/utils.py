@@ -29,6 +29,10 @@ class MessageCounter(object):
     def reset(self):
         self.errors = 0
         self.warnings = 0
+        self.kinds = {}
+
+    def count_kind(self, kind):
+        self.kinds[kind] = self.kinds.get(kind, 0) + 1
 
     errors = property(get_errors, set_errors)
     warnings = property(get_warnings, set_warnings)
@@ -54,21 +58,49 @@ def debug(log, msg):
         log.debug(msg)
 
 
-def warning(log, msg):
+def warning(log, msg, kind='warning'):
     global warning_count, warning_counter, msg_counter
     msg_counter.warnings += 1
+    msg_counter.count_kind(kind)
     warning_count = next(warning_counter)
     log.warning(msg)
 
 
-def error(log, msg):
+def error(log, msg, kind='error'):
     global error_count, error_counter, msg_counter
     msg_counter.errors += 1
+    msg_counter.count_kind(kind)
     error_count = next(error_counter)
     print('utils: error_count', msg_counter.errors)
     log.error(msg)
 
 
+def report(log, record, reporter=None, budget=None):
+    """
+    Counts an ErrorRecord like error() and warning() do, and with a
+    ValidationBudget on the budget too. Without a reporter its message is
+    printed and logged by them, otherwise the record is only passed on to
+    reporter.report.
+    """
+    if budget is not None:
+        budget.count(record)
+    if reporter is None:
+        if record.severity == 'warning':
+            warning(log, record.message, record.code)
+        else:
+            error(log, record.message, record.code)
+        return
+    global error_count, warning_count
+    if record.severity == 'warning':
+        msg_counter.warnings += 1
+        warning_count = next(warning_counter)
+    else:
+        msg_counter.errors += 1
+        error_count = next(error_counter)
+    msg_counter.count_kind(record.code)
+    reporter.report(record)
+
+
 # class CallCounted(object):
 #     """Decorator to determine number of calls for a method"""
 #
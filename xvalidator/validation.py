@@ -0,0 +1,355 @@
+from __future__ import unicode_literals
+from contextlib import contextmanager
+import logging
+import re
+from timeit import default_timer
+
+from xvalidator import utils
+from xvalidator.constraints import Stores, in_subtree
+from xvalidator.element import Document, count_elements
+from xvalidator.metrics import timed, record_messages, record_store_sizes
+from xvalidator.reporting import ErrorRecord
+from xvalidator.schemas import ElementSchema, SequenceSchema, Choice
+from xvalidator.validators import ValidationException
+
+
+__author__ = 'bernd'
+
+logger = logging.getLogger(__name__)
+
+
+class ValidationCancelled(Exception):
+    """
+    Raised when a ValidationBudget runs out of time. path is the element or
+    reference reached, checked the number of elements and references
+    checked so far; validate() also sets report to the partial
+    ValidationReport.
+    """
+
+    def __init__(self, path, elapsed, checked, errors):
+        super(ValidationCancelled, self).__init__(
+            'Validation cancelled at "%s" after %.3f s, %d checks and %d error(s).'
+            % (path, elapsed, checked, errors))
+        self.path = path
+        self.elapsed = elapsed
+        self.checked = checked
+        self.errors = errors
+        self.report = None
+
+
+class ValidationBudget(object):
+    """
+    Limits the errors and the time of a validation, passed as the budget
+    keyword argument. SequenceSchema and ElementSchema call check() before
+    every child element and list value, match_refs every interval
+    references.
+
+    Errors are counted on the budget when utils.report gets it, so every
+    validation counts only its own errors, independent of other
+    validations and of utils.msg_counter. Once max_errors errors were
+    reported validation stops and the
+    remaining elements are left unvalidated; stopped_at is the path where
+    it stopped, None if it ran to the end. max_errors=1 stops at the first
+    error.
+
+    timeout is in seconds from the creation of the budget, deadline an
+    absolute time of timer; the earlier one counts. The clock is read at the
+    first and then every interval checks, and ValidationCancelled is raised
+    once it is past the deadline.
+    """
+
+    def __init__(self, max_errors=None, timeout=None, deadline=None, interval=16,
+                 timer=default_timer):
+        assert max_errors is None or max_errors > 0, 'max_errors must be positive'
+        self.max_errors = max_errors
+        self.errors = 0
+        self.warnings = 0
+        self.stopped_at = None
+        self.timer = timer
+        self.started = timer()
+        if timeout is not None:
+            deadline = min(deadline, self.started + timeout) if deadline is not None \
+                else self.started + timeout
+        self.deadline = deadline
+        self.interval = interval
+        self.checked = 0
+
+    def count(self, record):
+        """
+        Called by utils.report for every ErrorRecord of this validation.
+        """
+        if record.severity == 'warning':
+            self.warnings += 1
+        else:
+            self.errors += 1
+
+    @property
+    def exhausted(self):
+        return self.max_errors is not None and self.errors >= self.max_errors
+
+    @property
+    def stopped(self):
+        return self.stopped_at is not None
+
+    @property
+    def elapsed(self):
+        return self.timer() - self.started
+
+    def check_deadline(self, path):
+        """
+        Raises ValidationCancelled if the deadline has passed.
+        """
+        if self.deadline is not None and self.timer() > self.deadline:
+            raise ValidationCancelled(path, self.elapsed, self.checked, self.errors)
+
+    def check(self, path):
+        """
+        Returns True if validation has to stop before path.
+        """
+        self.checked += 1
+        if self.deadline is not None and not (self.checked - 1) % self.interval:
+            self.check_deadline(path)
+        if self.stopped_at is not None:
+            return True
+        if self.exhausted:
+            self.stopped_at = path
+            logger.debug('Stopped validation at "%s" after %d error(s).'
+                         % (path, self.errors))
+            return True
+        return False
+
+
+class ValidationReport(object):
+    """
+    Outcome of validate(). complete is False if the budget stopped the
+    validation, in which case errors only counts the errors found so far.
+    cancelled is the ValidationCancelled of a validation out of time.
+    """
+
+    def __init__(self, element, stores, budget):
+        self.element = element
+        self.stores = stores
+        self.budget = budget
+        self.cancelled = None
+        self.errors = 0
+        self.warnings = 0
+        self.unresolved = []
+
+    def __repr__(self):
+        return 'ValidationReport(errors=%d, warnings=%d, complete=%r)' % (
+            self.errors, self.warnings, self.complete)
+
+    @property
+    def complete(self):
+        return not (self.budget.stopped or self.cancelled)
+
+    @property
+    def stopped_at(self):
+        return self.budget.stopped_at
+
+    @property
+    def valid(self):
+        return self.complete and not self.errors
+
+
+def resolve_refs(stores, reporter=None, budget=None, pending_only=False):
+    """
+    Matches the references of stores like match_refs, but reports every
+    reference without a key or ID instead of raising at the first one.
+    With pending_only references which already have a target are skipped.
+    Returns the unresolved KeyRefs.
+    """
+    unresolved = []
+    for key_store, ref_store in ((stores.keyStore, stores.refStore),
+                                 (stores.idStore, stores.idrefStore)):
+        for ref in ref_store.refs:
+            if pending_only and ref_store.has_target(ref.ref_path):
+                continue
+            if budget is not None and budget.check(ref.ref_path):
+                return unresolved
+            try:
+                ref_store.set_target(ref.ref_path,
+                                     key_store.match_ref(ref.key_name, ref.key_value))
+            except ValidationException as e:
+                unresolved.append(ref)
+                utils.report(logger, ErrorRecord(
+                    'unresolved_ref', ref.ref_path, ref.key_value,
+                    'Could not resolve %s "%s" in "%s": %s',
+                    (ref.key_name, ref.key_value, ref.ref_path, e._msg)), reporter, budget)
+    return unresolved
+
+
+@contextmanager
+def _measured(metrics, stage, stores):
+    """
+    Observes the time of the with block as stage and records the messages
+    reported in it and the sizes of stores on metrics, if it is not None.
+    """
+    if metrics is None:
+        yield
+        return
+    kinds = dict(utils.msg_counter.kinds)
+    try:
+        with timed(metrics, stage):
+            yield
+    finally:
+        record_messages(metrics, dict((kind, count - kinds.get(kind, 0))
+                                      for kind, count in utils.msg_counter.kinds.items()
+                                      if count != kinds.get(kind, 0)))
+        record_store_sizes(metrics, stores)
+
+
+def validate(schema, element, stores=None, max_errors=None, reporter=None,
+             budget=None, timeout=None, metrics=None, **kwargs):
+    """
+    Validates element, or the root element of a Document, with schema and
+    resolves its references. With max_errors, or a ValidationBudget, the
+    validation stops early and the report is not complete. A validation
+    taking longer than timeout seconds raises ValidationCancelled with the
+    partial report. metrics is a MetricsSink receiving the document,
+    element and message counts, the time and the sizes of stores, like
+    Corpus does.
+    """
+    if isinstance(element, Document):
+        element = element.root_element
+    if stores is None:
+        stores = Stores()
+    if budget is None:
+        budget = ValidationBudget(max_errors, timeout)
+    errors = budget.errors
+    warnings = budget.warnings
+    report = ValidationReport(element, stores, budget)
+    with _measured(metrics, 'validate', stores):
+        try:
+            schema.to_python(element, stores=stores, reporter=reporter, budget=budget,
+                             **kwargs)
+            if not budget.check(element.path):
+                report.unresolved = resolve_refs(stores, reporter, budget)
+        except ValidationCancelled as e:
+            report.cancelled = e
+            e.report = report
+            raise
+        finally:
+            report.errors = budget.errors - errors
+            report.warnings = budget.warnings - warnings
+    if metrics is not None:
+        metrics.increment('documents_validated_total')
+        metrics.increment('nodes_validated_total', count_elements(element))
+        metrics.increment('refs_unresolved_total', len(report.unresolved))
+    return report
+
+
+_SEGMENT = re.compile(r'^(.*?)-\d+,')
+
+
+def child_schema(schema, tag):
+    """
+    Returns the ElementSchema for child elements tag of elements of schema,
+    None if there is none.
+    """
+    validator = schema.validator
+    if not isinstance(validator, SequenceSchema):
+        return None
+    for field in validator.sequence:
+        if isinstance(field, ElementSchema):
+            if field.tag == tag:
+                return field
+        elif isinstance(field, Choice) and tag in field._flat_options:
+            return field._flat_options[tag]
+    return None
+
+
+def locate(schema, root, path):
+    """
+    Follows path from root and returns the ElementSchema and the Element at
+    path together with the ancestors chain SequenceSchema would pass to it.
+    Raises ValidationException if there is no element or schema for path.
+    """
+    element = root
+    ancestors = None
+    if path != root.path:
+        if not path.startswith(root.path + '/'):
+            raise ValidationException('Path is not below the root element.', path)
+        current_path = root.path
+        for segment in path[len(root.path) + 1:].split('/'):
+            match = _SEGMENT.match(segment)
+            current_path += '/' + segment
+            ancestors = (element.path, ancestors)
+            schema = child_schema(schema, match.group(1)) if match else None
+            element = next((child for child in element.children
+                            if child.path == current_path), None)
+            if schema is None or element is None:
+                raise ValidationException('No element or schema for path.', current_path)
+    return schema, element, ancestors
+
+
+def changed_elements(root):
+    """
+    Returns the elements below root marked as changed, see
+    Element.mark_changed, without their descendants.
+    """
+    result = []
+    stack = [root]
+    while stack:
+        element = stack.pop()
+        if not element.isValidated:
+            result.append(element)
+        else:
+            stack.extend(reversed(element.children))
+    return result
+
+
+def _topmost(paths):
+    result = []
+    for path in sorted(set(paths)):
+        if not (result and in_subtree(path, result[-1])):
+            result.append(path)
+    return result
+
+
+def revalidate(schema, document, stores, changed=None, reporter=None, budget=None,
+               metrics=None):
+    """
+    Validates the changed elements of a document validated before with
+    stores again, instead of the whole document. changed defaults to the
+    elements marked with Element.mark_changed. What the changed subtrees
+    added to stores is removed and added again, references to their keys
+    and IDs and references which were not resolved are matched again.
+
+    Changing the number or order of the children of an element requires
+    the element itself to be passed as changed. Returns a ValidationReport
+    in which unresolved are all references still without a key or ID.
+    metrics receives the elements validated again, like for validate.
+    """
+    root = document.root_element if isinstance(document, Document) else document
+    if changed is None:
+        changed = changed_elements(root)
+    paths = _topmost(element.path for element in changed)
+    located = [locate(schema, root, path) for path in paths]
+    if budget is None:
+        budget = ValidationBudget()
+    errors = budget.errors
+    warnings = budget.warnings
+    report = ValidationReport(root, stores, budget)
+    with _measured(metrics, 'revalidate', stores):
+        for path in paths:
+            stores.retract(path)
+        try:
+            for element_schema, element, ancestors in located:
+                kwargs = dict(ancestors=ancestors) if ancestors is not None else {}
+                element_schema.to_python(element, stores=stores, reporter=reporter,
+                                         budget=budget, **kwargs)
+            if not budget.check(root.path):
+                report.unresolved = resolve_refs(stores, reporter, budget,
+                                                 pending_only=True)
+        except ValidationCancelled as e:
+            report.cancelled = e
+            e.report = report
+            raise
+        finally:
+            report.errors = budget.errors - errors
+            report.warnings = budget.warnings - warnings
+    if metrics is not None:
+        metrics.increment('nodes_validated_total', sum(
+            count_elements(element) for element_schema, element, ancestors in located))
+    return report
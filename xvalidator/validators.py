@@ -1,11 +1,14 @@
 from abc import ABCMeta, abstractmethod
 from copy import copy
+import decimal
+import io
 import logging
 import random
 import re
 
-import utils
-from py2to3 import string_types
+from xvalidator import utils, vectorized
+from py2to3 import string_types, integer_types, casefold, isascii
+from xvalidator.reporting import ErrorRecord
 
 __author__ = 'bernd'
 
@@ -25,9 +28,28 @@ class ValidationException(Exception):
         return '%s, value:%r' % (self._msg, self._value)
 
 
+def adopt(value):
+    """
+    Returns a keyword argument of Validator as it is kept by the instance.
+    Lists, dicts and sets get a shallow copy of their own, so the caller
+    can not change the instance through them. Everything else, validators
+    included, is shared with the caller: validators keep no state that
+    depends on where they are used, build() included, and copy() of an
+    instance is far slower than the shallow copy of a list.
+    """
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, (dict, set)):
+        return copy(value)
+    return value
+
+
 class Validator:
     __metaclass__ = ABCMeta
     default_build_value = None
+    # True for validators adding to or reading from the stores, their
+    # results can not be cached.
+    has_side_effects = False
 
     # def __unicode__(self):
     # return self.__class__.__name__
@@ -37,7 +59,7 @@ class Validator:
 
     def __init__(self, **kwargs):
         for name, value in kwargs.items():
-            setattr(self, name, copy(value))
+            setattr(self, name, adopt(value))
 
     @abstractmethod
     def to_python(self, value, **kwargs):
@@ -54,6 +76,31 @@ class Validator:
                 value = self.__class__.__name__
         return self.to_python(value, **kwargs)
 
+    def to_python_many(self, values, **kwargs):
+        """
+        Validates a list of values with the same kwargs. Returns the list of
+        results, None for values which failed, and the (index,
+        ValidationException) pairs of the failed values. Subclasses override
+        it with bulk conversions, which fall back to this loop when a value
+        fails, so the errors are the same as those of to_python.
+        """
+        results = []
+        errors = []
+        for index, value in enumerate(values):
+            try:
+                results.append(self.to_python(value, **kwargs))
+            except ValidationException as e:
+                results.append(None)
+                errors.append((index, e))
+        return results, errors
+
+    def _inherits_to_python(self, cls):
+        """
+        True if to_python is the one of cls, so a bulk version written for
+        cls may be used instead.
+        """
+        return type(self).to_python == cls.to_python
+
 
 class RangeValidator(Validator):
     min = None
@@ -70,16 +117,104 @@ class RangeValidator(Validator):
                 raise ValidationException(msg, value)
         return value
 
+    def in_range(self, values):
+        """
+        True if all of the converted values are within min and max.
+        """
+        if not values:
+            return True
+        return ((self.min is None or min(values) >= self.min) and
+                (self.max is None or max(values) <= self.max))
+
+    def _to_python_many_vectorized(self, values, dtype):
+        """
+        to_python_many with NumPy for long lists, see vectorized. The values
+        are converted to one array and compared with min and max at once.
+        Returns None if a value can not be converted.
+        """
+        array = vectorized.parse(values, dtype)
+        if array is None:
+            return None
+        results = array.tolist()
+        errors = []
+        for index in vectorized.out_of_range(array, self.min, self.max):
+            try:
+                RangeValidator.to_python(self, results[index])
+            except ValidationException as e:
+                errors.append((index, e))
+            results[index] = None
+        return results, errors
+
     def build(self, *args, **kwargs):
         return super(RangeValidator, self).build(*args, **kwargs)
 
 
+_string_facets = {}
+
+
+def string_facets(min_length=None, max_length=None, regex=None, collapse=False):
+    """
+    Returns one predicate checking all facets of a string value at once:
+    the type, the length bounds, a regex searched in the value and, with
+    collapse, whether its whitespace is collapsed. The predicates are
+    shared by all validators with the same facets.
+    """
+    key = (min_length, max_length, regex, collapse)
+    try:
+        return _string_facets[key]
+    except KeyError:
+        pass
+    bounded = min_length is not None or max_length is not None
+    shortest = min_length or 0
+    longest = float('inf') if max_length is None else max_length
+    search = re.compile(regex).search if regex else None
+
+    def check(value):
+        return (isinstance(value, string_types) and
+                (not bounded or shortest <= len(value) <= longest) and
+                (search is None or search(value) is not None) and
+                (not collapse or whitespace_collapsed(value)))
+
+    _string_facets[key] = check
+    return check
+
+
 class BaseStringValidator(Validator):
+    """
+    Validates the facets returned by facets() with one predicate built by
+    string_facets in __init__. Only values failing it are checked facet by
+    facet to raise the ValidationException.
+    """
     minLength = None
     maxLength = None
 
+    def __init__(self, **kwargs):
+        super(BaseStringValidator, self).__init__(**kwargs)
+        self._check = string_facets(*self.facets())
+
+    def __getstate__(self):
+        # The predicate is a closure, it is built again after unpickling.
+        state = self.__dict__.copy()
+        del state['_check']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._check = string_facets(*self.facets())
+
+    def facets(self):
+        """
+        Returns minLength, maxLength, the regex searched in the value and
+        whether its whitespace has to be collapsed.
+        """
+        return self.minLength, self.maxLength, None, False
+
     def to_python(self, value, **kwargs):
-        value = super(BaseStringValidator, self).to_python(value, **kwargs)
+        if self._check(value):
+            return value
+        return self._check_facets(value)
+
+    def _check_facets(self, value):
         if not isinstance(value, string_types):
             raise ValidationException('Expecting value of type six.string_types.', value)
         if self.minLength is not None:
@@ -90,8 +225,20 @@ class BaseStringValidator(Validator):
             if len(value) > self.maxLength:
                 msg = 'Expecting value less than %d', self.maxLength
                 raise ValidationException(msg, value)
+        regex, collapse = self.facets()[2:]
+        if regex and not re.search(regex, value):
+            raise ValidationException(self.messages['invalid'], value)
+        if collapse and not whitespace_collapsed(value):
+            raise ValidationException(self.messages['invalid'], value)
         return value
 
+    def to_python_many(self, values, **kwargs):
+        if self._inherits_to_python(BaseStringValidator):
+            check = self._check
+            if all(check(value) for value in values):
+                return list(values), []
+        return super(BaseStringValidator, self).to_python_many(values, **kwargs)
+
     def build(self, *args, **kwargs):
         return super(BaseStringValidator, self).build(*args, **kwargs)
 
@@ -102,12 +249,8 @@ class RegexValidator(BaseStringValidator):
     messages = dict(
         invalid='The input is not valid')
 
-    def to_python(self, value, **kwargs):
-        string_value = super(RegexValidator, self).to_python(value)
-        regex = re.compile(self.regex)
-        if not regex.search(string_value):
-            raise ValidationException(self.messages['invalid'], value)
-        return string_value
+    def facets(self):
+        return self.minLength, self.maxLength, self.regex or None, False
 
 
 class StringValidator(BaseStringValidator):
@@ -115,6 +258,24 @@ class StringValidator(BaseStringValidator):
     maxLength = None
 
 
+def whitespace_collapsed(value):
+    """
+    True if all whitespace in value, apart from leading and trailing
+    whitespace, are single spaces. Without leading or trailing whitespace
+    this is checked with two scans of value and no copies: a printable
+    string contains no whitespace but spaces, so it only has to be free of
+    double spaces. Other strings are split and joined.
+    """
+    if value[:1].isspace() or value[-1:].isspace():
+        value = value.strip()
+    try:
+        if value.isprintable() and '  ' not in value:
+            return True
+    except AttributeError:  # pragma: no cover, Python 2
+        pass
+    return ' '.join(value.split()) == value
+
+
 class Token(StringValidator):
     """
     Tokens are strings without leading and trailing whitespaces. All other
@@ -125,11 +286,8 @@ class Token(StringValidator):
         invalid="""Whitespaces should be collapsed in a token."""
     )
 
-    def to_python(self, value, **kwargs):
-        string_value = super(Token, self).to_python(value)
-        if ' '.join(string_value.split()) != string_value.strip():
-            raise ValidationException(self.messages['invalid'], value)
-        return string_value
+    def facets(self):
+        return self.minLength, self.maxLength, None, True
 
 
 class Name(RegexValidator):
@@ -224,17 +382,127 @@ class NMTOKEN(RegexValidator):
     not_empty = True
 
 
+# Lexical forms of the XSD numeric types. XML whitespace around them is
+# collapsed, so it is allowed; other whitespace, underscores and non-ASCII
+# digits accepted by int() and float() are not.
+_integer_lexical = re.compile(r'[ \t\n\r]*([+-]?[0-9]+)[ \t\n\r]*\Z')
+_hexadecimal_lexical = re.compile(r'[ \t\n\r]*([+-]?)0[xX]([0-9a-fA-F]+)[ \t\n\r]*\Z')
+_decimal_lexical = re.compile(
+    r'[ \t\n\r]*([+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+))[ \t\n\r]*\Z')
+_float_lexical = re.compile(
+    r'[ \t\n\r]*([+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?|[+-]?INF|NaN)'
+    r'[ \t\n\r]*\Z')
+
+
+def parse_integer(value, hexadecimal=True):
+    """
+    Returns the int of an xs:integer string and, with hexadecimal, of a
+    0x prefixed hexadecimal string like those of register descriptions.
+    Returns None if value is neither, without raising an exception.
+    """
+    if value.isdigit() and isascii(value):
+        return int(value)
+    match = _integer_lexical.match(value)
+    if match is not None:
+        return int(match.group(1))
+    if hexadecimal:
+        match = _hexadecimal_lexical.match(value)
+        if match is not None:
+            sign, digits = match.groups()
+            return -int(digits, 16) if sign == '-' else int(digits, 16)
+    return None
+
+
+def parse_decimal(value):
+    """
+    Returns the decimal.Decimal of an xs:decimal string, None if value is
+    not one.
+    """
+    match = _decimal_lexical.match(value)
+    if match is None:
+        return None
+    return decimal.Decimal(match.group(1))
+
+
+def parse_float(value):
+    """
+    Returns the float of an xs:float or xs:double string, INF, -INF and
+    NaN included, None if value is not one.
+    """
+    if value.replace('.', '', 1).isdigit() and isascii(value):
+        return float(value)
+    match = _float_lexical.match(value)
+    if match is None:
+        return None
+    return float(match.group(1))
+
+
+def lexical_forms(values, lexical):
+    """
+    True if all strings in values match the compiled lexical form.
+    """
+    match = lexical.match
+    return all(match(value) for value in values if isinstance(value, string_types))
+
+
+def _digits(values):
+    """
+    True if values are strings of ASCII digits only, checked on all of
+    them joined.
+    """
+    try:
+        joined = ''.join(values)
+    except TypeError:
+        return False
+    return all(values) and joined.isdigit() and isascii(joined)
+
+
 class IntegerValidator(RangeValidator):
+    """
+    Converts xs:integer strings and, unless hexadecimal is False, 0x
+    prefixed hexadecimal strings with parse_integer. Other values are
+    converted with int().
+    """
     default_build_value = 0
+    hexadecimal = True
     messages = dict(
         integer='Please enter an integer value.')
 
-    def to_python(self, value, **kwargs):
+    def _parse(self, value):
         try:
-            result = int(value)
-            return super(IntegerValidator, self).to_python(result)
-        except ValueError:
+            if isinstance(value, string_types):
+                return parse_integer(value, self.hexadecimal)
+            return int(value)
+        except (ValueError, TypeError):
+            # int() refuses strings of more digits than
+            # sys.get_int_max_str_digits().
+            return None
+
+    def to_python(self, value, **kwargs):
+        result = self._parse(value)
+        if result is None:
             raise ValidationException('Expecting int', value)
+        return super(IntegerValidator, self).to_python(result)
+
+    def to_python_many(self, values, **kwargs):
+        if self._inherits_to_python(IntegerValidator):
+            if vectorized.available(values) and (
+                    _digits(values) or lexical_forms(values, _integer_lexical)):
+                result = self._to_python_many_vectorized(values, 'int64')
+                if result is not None:
+                    return result
+            if _digits(values):
+                try:
+                    results = list(map(int, values))
+                except ValueError:
+                    results = None
+            else:
+                results = [self._parse(value) for value in values]
+                if None in results:
+                    results = None
+            if results is not None and self.in_range(results):
+                return results, []
+        return super(IntegerValidator, self).to_python_many(values, **kwargs)
 
 
 class NonNegativeInteger(IntegerValidator):
@@ -262,18 +530,40 @@ class NegativeInteger(IntegerValidator):
 
 
 class FloatValidator(RangeValidator):
+    """
+    Converts xs:float and xs:double strings with parse_float, other values
+    with float().
+    """
     default_build_value = 3.14
     messages = dict(
         number='Please enter a float Number.')
     not_empty = True
 
-    def to_python(self, value, **kwargs):
+    def _parse(self, value):
+        if isinstance(value, string_types):
+            return parse_float(value)
         try:
-            float_value = float(value)
-            super(FloatValidator, self).to_python(float_value)
-            return float_value
+            return float(value)
         except (ValueError, TypeError):
+            return None
+
+    def to_python(self, value, **kwargs):
+        float_value = self._parse(value)
+        if float_value is None:
             raise ValidationException(self.messages['number'], value)
+        super(FloatValidator, self).to_python(float_value)
+        return float_value
+
+    def to_python_many(self, values, **kwargs):
+        if self._inherits_to_python(FloatValidator):
+            if vectorized.available(values) and lexical_forms(values, _float_lexical):
+                result = self._to_python_many_vectorized(values, 'float64')
+                if result is not None:
+                    return result
+            results = [self._parse(value) for value in values]
+            if None not in results and self.in_range(results):
+                return results, []
+        return super(FloatValidator, self).to_python_many(values, **kwargs)
 
 
 class NonNegativeFloat(FloatValidator):
@@ -284,6 +574,34 @@ class NonNegativeFloat(FloatValidator):
     not_empty = True
 
 
+class DecimalValidator(RangeValidator):
+    """
+    Converts xs:decimal strings with parse_decimal to decimal.Decimal,
+    keeping all of their digits. Integers and finite floats are converted
+    too, floats by their shortest repr.
+    """
+    default_build_value = 0
+    messages = dict(
+        number='Please enter a decimal number.')
+
+    def _parse(self, value):
+        if isinstance(value, string_types):
+            return parse_decimal(value)
+        if isinstance(value, decimal.Decimal):
+            return value if value.is_finite() else None
+        if isinstance(value, integer_types):
+            return decimal.Decimal(value)
+        if isinstance(value, float) and value - value == 0:
+            return decimal.Decimal(repr(value))
+        return None
+
+    def to_python(self, value, **kwargs):
+        result = self._parse(value)
+        if result is None:
+            raise ValidationException(self.messages['number'], value)
+        return super(DecimalValidator, self).to_python(result)
+
+
 class BooleanValidator(BaseStringValidator):
     """
     Converts a string to a boolean.
@@ -303,7 +621,8 @@ class BooleanValidator(BaseStringValidator):
         raise ValidationException('Could not recognize boolean.', value)
 
     def build(self, *args, **kwargs):
-        self.default_build_value = random.choice(self.true_values+self.false_values)
+        if not args:
+            args = (random.choice(self.true_values + self.false_values),)
         return super(BooleanValidator, self).build(*args, **kwargs)
 
 
@@ -312,12 +631,16 @@ class EnumValidator(BaseStringValidator):
     Tests that the value is one of the members of a given list (options). There
     can be no empty strings in options. value has to be a string.
 
-    If matchLower is True it will also compare value.lower() with the lower case
-    version of all strings in options.
+    If matchLower is True it will also compare the case folded value with the
+    case folded versions of all strings in options, and warn about the
+    spelling. The lookup tables are built once in __init__, for options
+    defined on the class once per class. Large vocabularies can be read from
+    a file with from_file.
     """
 
     options = ['']
     matchLower = True
+    max_items_shown = 20
 
     messages = dict(
         invalid='Invalid value',
@@ -326,35 +649,68 @@ class EnumValidator(BaseStringValidator):
     def __init__(self, **kwargs):
         super(EnumValidator, self).__init__(**kwargs)
         assert isinstance(self.options, list), 'options need to be a list of strings.'
-        all_members_strings = True
-        for item in self.options:
-            all_members_strings = all_members_strings and isinstance(item,
-                string_types)
-        assert all_members_strings, 'options need to be a list of strings.'
-        self.lookup = None
-        self.lookup_lower = None
+        cls = type(self)
+        if 'options' not in kwargs and '_tables' in cls.__dict__:
+            self.lookup, self.lookup_lower = cls._tables
+        else:
+            assert all(isinstance(item, string_types) for item in self.options), \
+                'options need to be a list of strings.'
+            self.lookup = frozenset(self.options)
+            self.lookup_lower = {}
+            for item in self.options:
+                self.lookup_lower.setdefault(casefold(item), item)
+            if 'options' not in kwargs:
+                cls._tables = (self.lookup, self.lookup_lower)
+        self._items = None
+
+    @classmethod
+    def from_file(cls, file_name, encoding='utf-8', **kwargs):
+        """
+        Returns an instance with the options read from file_name, one per
+        line. Empty lines and lines starting with # are skipped.
+        """
+        with io.open(file_name, encoding=encoding) as options_file:
+            options = [line.strip() for line in options_file]
+        return cls(options=[option for option in options
+                            if option and not option.startswith('#')], **kwargs)
 
     def to_python(self, value, **kwargs):
         string_value = super(EnumValidator, self).to_python(value)
-        if not self.lookup:
-            self.lookup = {item for item in self.options}
-        if not self.lookup_lower:
-            self.lookup_lower = {item.lower(): item for item in self.options}
         if string_value in self.lookup:
             return string_value
-        lower_case_value = string_value.lower()
-        if lower_case_value in self.lookup_lower:
-            correct_value = self.lookup_lower[lower_case_value]
-            utils.warning(logger, 'Found incorrect spelling of option "%s" instead of "%s" in field "%s".'
-                          % (string_value, correct_value, self.__class__.__name__))
-            return correct_value
+        if self.matchLower:
+            correct_value = self.lookup_lower.get(casefold(string_value))
+            if correct_value is not None:
+                utils.report(logger, ErrorRecord(
+                    'enum_spelling', kwargs.get('path'), string_value,
+                    'Found incorrect spelling of option "%s" instead of "%s" in field "%s".',
+                    (string_value, correct_value, self.__class__.__name__), 'warning'),
+                    kwargs.get('reporter'), kwargs.get('budget'))
+                return correct_value
         raise ValidationException(self.messages['notIn'] % dict(items=self.items,
                                                                 value=value), value)
 
+    def to_python_many(self, values, **kwargs):
+        if self._inherits_to_python(EnumValidator):
+            if all(isinstance(value, string_types) for value in values) and \
+                    self.lookup.issuperset(values):
+                return list(values), []
+        return super(EnumValidator, self).to_python_many(values, **kwargs)
+
     def build(self, *args, **kwargs):
-        self.default_build_value = random.choice(self.options)
+        if not args:
+            args = (random.choice(self.options),)
         return super(EnumValidator, self).build(*args, **kwargs)
 
     @property
     def items(self):
-        return '; '.join(map(str, self.options))
+        """
+        The options as shown in error messages, rendered on the first error.
+        Only the first max_items_shown options of large enums are listed.
+        """
+        if self._items is None:
+            shown = self.options[:self.max_items_shown]
+            self._items = '; '.join('%s' % item for item in shown)
+            if len(self.options) > len(shown):
+                self._items += '; ... (%d more)' % (len(self.options) - len(shown))
+        return self._items
@@ -0,0 +1,48 @@
+from __future__ import unicode_literals
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+__author__ = 'bernd'
+
+# Lists shorter than this are validated without NumPy, for them building
+# the array costs more than it saves.
+MIN_VALUES = 1000
+
+
+def available(values):
+    return numpy is not None and len(values) >= MIN_VALUES
+
+
+def parse(values, dtype):
+    """
+    Converts values to an array of dtype, 'int64' or 'float64'. Returns
+    None if any value can not be converted, the caller then validates the
+    values one by one to report them.
+    """
+    try:
+        array = numpy.array(values, dtype=dtype)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    if array.dtype.kind == 'f':
+        # NumPy turns None into NaN where float() raises.
+        for index in numpy.flatnonzero(numpy.isnan(array)).tolist():
+            if values[index] is None:
+                return None
+    return array
+
+
+def out_of_range(array, minimum=None, maximum=None):
+    """
+    Returns the indices of the values of array less than minimum or
+    greater than maximum.
+    """
+    mask = numpy.zeros(len(array), dtype=bool)
+    if minimum is not None:
+        mask |= array < minimum
+    if maximum is not None:
+        mask |= array > maximum
+    return numpy.flatnonzero(mask).tolist()